@@ -1,8 +1,8 @@
-from z3 import Int, And, If, Not, Or, PbEq, Solver, is_true
-from lib import set_problem, parse_int_grid, at, inds, look, neighbors, shaded_vars
-import time
+from z3 import Int, And, If, Not, Or, PbEq, is_true
+from lib import set_problem, parse_int_grid, at, inds, look, neighbors, run, shaded_vars, orth_dir, plus
+from deduce import Count
 
-g = parse_int_grid('''
+example = '''
 X....1......1....1
 ...1....XX....1...
 ......1....1......
@@ -13,35 +13,60 @@ X....1......1....1
 ......X....X......
 ...X....11....X...
 1....1......1....1
-''', exc={'X': -1})
+'''
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+def parse(x):
+    return parse_int_grid(x, exc={'X': -1})
 
-cons = []
+def build(g):
+    set_problem(g)
 
-lights = shaded_vars('l')
+    cons = []
 
-# lights can only go on cells with no clues
-cons += [Not(at(lights, i)) for i in inds() if at(g, i) != None]
+    lights = shaded_vars('l')
 
-# Look for a light in given direction (indeed, count lights before black cell)
-c, vis = look((lambda pos, d, edge, n, v: False if at(g, pos) != None else If(edge, 0, v) + If(at(lights, pos), 1, 0)), Int, 'v')
-cons += c
+    # lights can only go on cells with no clues
+    cons += [Not(at(lights, i)) for i in inds() if at(g, i) != None]
 
-# add the constraints that every cell is either unlit in a direction or once-lit, and that every cell must be lit in at least one direction
-cons += [And(And(*[Or(at(lit, i) == 0, at(lit, i) == 1) for lit in vis]), Or(*[at(lit, i) == 1 for lit in vis])) for i in inds() if at(g, i) == None]
+    # Look for a light in given direction (indeed, count lights before black cell)
+    c, vis = look((lambda pos, d, edge, n, v: False if at(g, pos) != None else If(edge, 0, v) + If(at(lights, pos), 1, 0)), Int, 'v')
+    cons += c
 
-# add the constraints that the number of lights around each clue is as indicated
-cons += [PbEq([(at(lights, j), 1) for j in neighbors(i)], at(g, i)) for i in inds() if at(g, i) != None and at(g, i) >= 0]
+    # add the constraints that every cell is either unlit in a direction or once-lit, and that every cell must be lit in at least one direction
+    cons += [And(And(*[Or(at(lit, i) == 0, at(lit, i) == 1) for lit in vis]), Or(*[at(lit, i) == 1 for lit in vis])) for i in inds() if at(g, i) == None]
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join('#' if j != None else '.*'[is_true(m[k])] for (j, k) in zip(*i)) for i in zip(g, lights)))
+    # add the constraints that the number of lights around each clue is as indicated
+    cons += [PbEq([(at(lights, j), 1) for j in neighbors(i)], at(g, i)) for i in inds() if at(g, i) != None and at(g, i) >= 0]
+
+    def show(m):
+        return '\n'.join(''.join('#' if j != None else '.*'[is_true(m[k])] for (j, k) in zip(*i)) for i in zip(g, lights))
+
+    return cons, lights, show
+
+# Deduction rules (see deduce.py): the lights around each clue, at most one light in each stretch
+# of a row or column between black cells, and a light somewhere in every white cell's two stretches.
+# So a 4 lights all its neighbours, a 0 rules them out, and a cell only one light can see gets one.
+# The cells are the white ones (the black ones never have lights).
+def rules(g):
+    height, width = len(g), len(g[0])
+    cells = [(i, j) for i in range(height) for j in range(width)]
+    white = lambda x: 0 <= x[0] < height and 0 <= x[1] < width and at(g, x) == None
+    # The stretches each white cell is in (the rows' first, then the columns').
+    stretches = {i: [] for i in cells if white(i)}
+    for line in [[(i, j) for j in range(width)] for i in range(height)] + [[(i, j) for i in range(height)] for j in range(width)]:
+        stretch = []
+        for i in line + [None]:
+            if i is not None and white(i):
+                stretch.append(i)
+            elif stretch:
+                for j in stretch:
+                    stretches[j].append(stretch)
+                stretch = []
+    r = [Count(k, 0, 1) for (i, (k, _)) in stretches.items() if k[0] == i]
+    r += [Count(k, 0, 1) for (i, (_, k)) in stretches.items() if k[0] == i]
+    r += [Count(sorted(set(k + l)), 1, len(k + l)) for (k, l) in stretches.values()]
+    r += [Count([plus(i, d) for d in orth_dir if white(plus(i, d))], at(g, i)) for i in cells if not white(i) and at(g, i) >= 0]
+    return list(stretches), r
+
+if __name__ == '__main__':
+    run(build, parse(example))
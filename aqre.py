@@ -1,9 +1,9 @@
-from z3 import Int, And, If, Not, Or, Solver, is_true
-from lib import set_problem, parse_regions, parse_clues, at, connected, eq, \
-get_rtable, in_bounds, inds, plus, shaded_vars, times
-import time
+from z3 import Int, And, If, Not, Or, is_true
+from lib import set_problem, blocks, parse_regions, relabel, parse_clues, at, connected, eq, \
+get_rtable, in_bounds, inds, plus, run, shaded_vars, times
 
-regions, g = parse_regions('''
+# Regions, then clues.
+example = '''
 AAAABCCCCCDDDDDDEE
 AAFFBGGCCCDHHHHDEE
 AAFFBGGCCCDHHHHDEE
@@ -16,9 +16,7 @@ OOOMPPPQHHHHHNNNEE
 MMMMPPPQQQQQHNEEEE
 PPPPPPPPPPPQHNERRR
 PPPPPPPPPPPQHNERRR
-''')
 
-clues = parse_clues('''
 ....2.....3.......
 ..2..2............
 ..................
@@ -31,44 +29,51 @@ clues = parse_clues('''
 ..................
 ...............3..
 ..................
-''', regions)
+'''
 
+def parse(x):
+    r, c = blocks(x)
+    regions, g = parse_regions(r)
+    return regions, parse_clues(c, regions), g
 
-rtable = get_rtable(regions)
+# The region letters don't matter (see cache.puzzle_key).
+def canonical(puzzle):
+    regions, clues, g = puzzle
+    return regions, clues, relabel(g)
 
-same_region = lambda i, j: rtable[i] == rtable[j]
+def build(puzzle):
+    regions, clues, g = puzzle
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+    rtable = get_rtable(regions)
 
-# Make a list of all runs of four (horizontally or vertically) adjacent positions
-# (with the first and last positions, and thus all four, in bounds).
-fours = [(i, plus(i, j), plus(i, times(j, 2)), plus(i, times(j, 3)))
-for i in inds() for j in ((1, 0), (0, 1)) if in_bounds(plus(i, times(j, 3)))]
+    same_region = lambda i, j: rtable[i] == rtable[j]
 
-cons = []
+    set_problem(g)
 
-shaded = shaded_vars('s')
+    # Make a list of all runs of four (horizontally or vertically) adjacent positions
+    # (with the first and last positions, and thus all four, in bounds).
+    fours = [(i, plus(i, j), plus(i, times(j, 2)), plus(i, times(j, 3)))
+    for i in inds() for j in ((1, 0), (0, 1)) if in_bounds(plus(i, times(j, 3)))]
 
-# root of the shaded cells (which must be connected)
-root = Int('r1'), Int('r2')
+    cons = []
 
-cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: eq(root, x)), 'uc')[0]
+    shaded = shaded_vars('s')
 
-# all four-cell runs must have at least one shaded cell, and must have at least one non-shaded cell
-cons += [And(Or(*[at(shaded, i) for i in a]), Or(*[Not(at(shaded, i)) for i in a])) for a in fours]
+    # root of the shaded cells (which must be connected)
+    root = Int('r1'), Int('r2')
 
-# all clues must be satisfied
-cons += [sum(If(at(shaded, j), 1, 0) for j in regions[i]) == v for (i, v) in clues]
+    cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: eq(root, x)), 'uc')[0]
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded))
+    # all four-cell runs must have at least one shaded cell, and must have at least one non-shaded cell
+    cons += [And(Or(*[at(shaded, i) for i in a]), Or(*[Not(at(shaded, i)) for i in a])) for a in fours]
 
+    # all clues must be satisfied
+    cons += [sum(If(at(shaded, j), 1, 0) for j in regions[i]) == v for (i, v) in clues]
+
+    def show(m):
+        return '\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded)
+
+    return cons, shaded, show
+
+if __name__ == '__main__':
+    run(build, parse(example))
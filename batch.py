@@ -0,0 +1,70 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+
+from lib import solve
+
+# Solve many puzzles of one genre. Each puzzle is a file in the genre's text format
+# (the same one as the example in the genre module); a directory means all the files in it.
+# Puzzles are spread over a pool of worker processes, each of which has its own z3 context,
+# and a JSON line is printed for each puzzle as it's solved. With --unique, puzzles are also
+# checked to have only one solution (see lib.uniqueness), and with --template, genres that can
+# build the constraints common to every puzzle of a size once per worker do so (see lib.Template).
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# Set in each worker by init.
+genre = None
+unique = False
+template = False
+
+def init(name, check_unique, use_template):
+    global genre, unique, template
+    sys.path.insert(0, here)
+    genre = importlib.import_module(name)
+    unique = check_unique
+    template = use_template
+
+def puzzle_files(paths):
+    r = []
+    for p in paths:
+        if os.path.isdir(p):
+            r += [os.path.join(p, i) for i in sorted(os.listdir(p)) if os.path.isfile(os.path.join(p, i))]
+        else:
+            r.append(p)
+    return r
+
+# Solve one puzzle file. A puzzle that can't be parsed or solved gets an error result
+# rather than stopping the batch.
+def work(path):
+    r = {'file': path, 'genre': genre.__name__}
+    try:
+        with open(path) as f:
+            r.update(solve(genre.build, genre.parse(f.read()), unique=unique, template=template))
+    except Exception as e:
+        r.update({'result': 'error', 'error': repr(e)})
+    return r
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('genre')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--unique', action='store_true', help='check that each puzzle has exactly one solution')
+    parser.add_argument('--template', action='store_true', help='reuse the clue-independent constraints between puzzles of the same size (see lib.Template)')
+    parser.add_argument('--cache', help='directory to keep a cache of solved puzzles in (see cache.py)')
+    args = parser.parse_args()
+    if args.cache:
+        # Workers open the cache themselves (see cache.default_cache).
+        os.environ['LOGIC_SOLVE_CACHE'] = args.cache
+    files = puzzle_files(args.paths)
+    with multiprocessing.Pool(args.workers, init, (args.genre, args.unique, args.template)) as pool:
+        # Results come out in the order the puzzles finish, not the order they were given.
+        for r in pool.imap_unordered(work, files):
+            print(json.dumps(r), flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+
+# Benchmark the genres. Every genre's example puzzle (and, with --instances, the puzzle files
+# in a directory named after the genre there) is solved under each encoding, --reps times,
+# with z3's random seeds fixed to --seed, --seed + 1, and so on. Each run is a fresh process
+# (so a fresh z3 context), which also reports its peak memory and z3's statistics.
+# Results are written as JSON to --output; with --baseline (an earlier output), times
+# that got worse by more than --threshold, and solutions that changed, are flagged,
+# as are solutions that differ between encodings.
+
+genres = [
+    'akari', 'aqre', 'cave', 'fillomino', 'heyawake', 'islands', 'lits', 'lohkous', 'masyu',
+    'nonogram', 'nurikabe', 'nurimaze', 'nurimisaki', 'shakashaka', 'sheep_and_wolves', 'shikaku',
+    'simple_loop', 'slitherlink', 'snake', 'star_battle', 'sudoku', 'tasquare', 'uso_one', 'yajilin',
+    'yajisan_kazusan', 'yinyang'
+]
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# Time differences smaller than this (in seconds) are never regressions; they're mostly noise.
+min_difference = 0.05
+
+# One run, in its own process. path is None for the genre's example.
+def run(genre, path, encoding, seed):
+    sys.path.insert(0, here)
+    import importlib
+    import z3
+    import lib
+    z3.set_param('smt.random_seed', seed, 'sat.random_seed', seed)
+    lib.default_encoding = encoding
+    module = importlib.import_module(genre)
+    if path is None:
+        text = module.example
+    else:
+        with open(path) as f:
+            text = f.read()
+    r = lib.solve(module.build, module.parse(text), stats=True)
+    # ru_maxrss is in kilobytes on Linux.
+    r['memory'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return r
+
+# Run in a separate process, giving up after timeout seconds.
+def run_isolated(args, timeout):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        try:
+            return pool.apply_async(run, args).get(timeout)
+        except multiprocessing.TimeoutError:
+            return {'result': 'timeout'}
+
+def instances(genre, directory):
+    r = [None]
+    d = directory and os.path.join(directory, genre)
+    if d and os.path.isdir(d):
+        r += [os.path.join(d, i) for i in sorted(os.listdir(d))]
+    return r
+
+# Summarize the runs of one instance: median times, largest memory use, and the result
+# and solution (which should be the same for every run).
+def summarize(runs):
+    finished = [i for i in runs if i['result'] != 'timeout']
+    r = {'result': runs[0]['result'], 'solution': runs[0].get('solution'),
+    'consistent': all(i['result'] == runs[0]['result'] and i.get('solution') == runs[0].get('solution') for i in runs)}
+    if finished:
+        r['constructed'] = statistics.median(i['constructed'] for i in finished)
+        r['solved'] = statistics.median(i['solved'] for i in finished)
+        r['memory'] = max(i['memory'] for i in finished)
+    return r
+
+def key(r):
+    return r['genre'], r['instance'], r['encoding']
+
+# Compare a result with its baseline; returns a list of problems (empty if none).
+def compare(r, b, threshold):
+    flags = []
+    if r['result'] != b['result'] or r['solution'] != b['solution']:
+        flags.append('different ' + ('solution' if r['result'] == b['result'] else 'result'))
+    for k in ('constructed', 'solved'):
+        if k in b and (k not in r or (r[k] > b[k] * (1 + threshold) and r[k] - b[k] > min_difference)):
+            flags.append(k + ' regressed')
+    return flags
+
+def fmt(t):
+    return '-' if t is None else '%.3f' % t
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('genres', nargs='*', default=genres)
+    parser.add_argument('--encodings', default='int')
+    parser.add_argument('--reps', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--instances', help='directory with a directory of puzzle files for each genre')
+    parser.add_argument('--output', default=os.path.join(here, 'bench_output.txt'))
+    parser.add_argument('--baseline', help='earlier output to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown counted as a regression')
+    args = parser.parse_args()
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {key(r): r for r in json.load(f)['results']}
+    print('genre'.ljust(18) + 'instance'.ljust(14) + 'encoding'.ljust(10) + 'constructed'.rjust(12)
+    + 'solved'.rjust(10) + 'memory'.rjust(10) + '  notes')
+    results = []
+    regressions = 0
+    for genre in args.genres:
+        for path in instances(genre, args.instances):
+            first = None
+            for encoding in args.encodings.split(','):
+                runs = [run_isolated((genre, path, encoding, args.seed + i), args.timeout) for i in range(args.reps)]
+                r = {'genre': genre, 'instance': 'example' if path is None else os.path.basename(path),
+                'encoding': encoding, **summarize(runs), 'runs': runs}
+                results.append(r)
+                notes = [r['result']] + ([] if r['consistent'] else ['inconsistent between runs'])
+                # Every encoding should give the same answer.
+                first = first or r
+                if 'timeout' not in (r['result'], first['result']) and r['solution'] != first['solution']:
+                    notes.append('different from ' + first['encoding'])
+                if key(r) in baseline:
+                    flags = compare(r, baseline[key(r)], args.threshold)
+                    regressions += bool(flags)
+                    notes += flags
+                print(genre.ljust(18) + r['instance'][:13].ljust(14) + encoding.ljust(10)
+                + fmt(r.get('constructed')).rjust(12) + fmt(r.get('solved')).rjust(10)
+                + ('%.0fM' % r['memory'] if 'memory' in r else '-').rjust(10) + '  ' + ', '.join(notes), flush=True)
+    with open(args.output, 'w') as f:
+        json.dump({'reps': args.reps, 'seed': args.seed, 'results': results}, f, indent=1)
+    if regressions:
+        print(regressions, 'regressions')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# A cache of solved puzzles on disk (an SQLite database), so a puzzle that's been solved before,
+# even from differently-formatted text, isn't solved again. Entries are keyed by a hash of the genre,
+# the parsed puzzle (see puzzle_key) and everything that affects the constraints built from it
+# (encoding_version, the encoding, and whether redundant constraints are added).
+# Once there are more than max_entries, the least recently used are dropped.
+# lib.solve consults the cache it's given, or default_cache() if there's one.
+
+# Bump this whenever a change to lib or a genre could change what's solved, so old entries are ignored.
+encoding_version = 1
+
+default_max_entries = int(os.environ.get('LOGIC_SOLVE_CACHE_SIZE', '10000'))
+
+# Turn parsed puzzle data into plain JSON data, so equal puzzles give equal text
+# (tuples become lists, and dicts and sets are sorted).
+def plain(x):
+    if type(x) == dict:
+        return sorted([plain(k), plain(v)] for (k, v) in x.items())
+    elif type(x) in (set, frozenset):
+        return sorted(plain(i) for i in x)
+    elif type(x) in (list, tuple):
+        return [plain(i) for i in x]
+    else:
+        return x
+
+# A genre module can define canonical, taking its parsed puzzle data to a form that's the same
+# for every way of writing the same puzzle (e.g. with a grid of region letters relabeled, see lib.relabel).
+# Whitespace is already gone once the puzzle is parsed.
+def puzzle_key(genre, puzzle, canonical=None, encoding='', redundant=False, unique=False):
+    data = [genre, encoding_version, encoding, redundant, unique, plain(canonical(puzzle) if canonical else puzzle)]
+    return hashlib.sha256(json.dumps(data, separators=(',', ':')).encode()).hexdigest()
+
+class SolutionCache:
+    def __init__(self, path, max_entries=None):
+        if os.path.isdir(path):
+            path = os.path.join(path, 'solutions.sqlite')
+        self.path = path
+        self.max_entries = default_max_entries if max_entries is None else max_entries
+        self.hits = 0
+        self.misses = 0
+        # The same cache can be used from several threads (e.g. the daemon's result thread).
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute('create table if not exists solutions (key text primary key, result text, used real)')
+        self.db.execute('create index if not exists solutions_used on solutions (used)')
+        self.db.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute('select result from solutions where key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute('update solutions set used = ? where key = ?', (time.time(), key))
+            self.db.commit()
+            return json.loads(row[0])
+
+    def put(self, key, result):
+        with self.lock:
+            self.db.execute('insert or replace into solutions values (?, ?, ?)', (key, json.dumps(result), time.time()))
+            self.db.execute('delete from solutions where key in (select key from solutions order by used desc limit -1 offset ?)',
+            (self.max_entries,))
+            self.db.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('select count(*) from solutions').fetchone()[0]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self)}
+
+    def close(self):
+        self.db.close()
+
+# The cache solve uses when not given one: in the directory LOGIC_SOLVE_CACHE names, if it's set.
+# It's opened on first use in each process, since an SQLite connection can't be shared with forked workers.
+_default = {}
+
+def default_cache():
+    d = os.environ.get('LOGIC_SOLVE_CACHE')
+    if not d:
+        return None
+    if os.getpid() not in _default:
+        os.makedirs(d, exist_ok=True)
+        _default[os.getpid()] = SolutionCache(d)
+    return _default[os.getpid()]
@@ -1,8 +1,7 @@
-from z3 import Int, And, If, Implies, Not, Solver, is_true
-from lib import set_problem, parse_int_grid, all_2x2, at, connected, eq, inds, is_perimeter, look, shaded_vars
-import time
+from z3 import Int, And, Implies, Not, is_true
+from lib import set_problem, parse_int_grid, all_2x2, at, connected, eq, give, inds, is_perimeter, ray_count, run, shaded_vars
 
-g = parse_int_grid('''
+example = '''
 ...3.6....
 .3..4.....
 5.4..3...4
@@ -13,44 +12,44 @@ g = parse_int_grid('''
 3...4..5.5
 .....4..5.
 ....5.5...
-''')
+'''
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+def parse(x):
+    return parse_int_grid(x)
 
-cons = []
+def build(g):
+    set_problem(g)
 
-shaded = shaded_vars('s')
+    cons = []
 
-# root of the unshaded cells (which must be connected)
-root = Int('r1'), Int('r2')
+    # Clues are known to be unshaded.
+    give('s', {i: False for i in inds() if at(g, i) != None})
 
-cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: eq(root, x)), 'uc')[0]
+    shaded = shaded_vars('s')
 
-# all shaded cells must be connected to the perimeter
-cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: is_perimeter(x)), 'c')[0]
+    # root of the unshaded cells (which must be connected)
+    root = Int('r1'), Int('r2')
 
-# no 2x2 checkerboards
-cons += all_2x2(lambda a, b, c, d: Implies(And(at(shaded, a) == at(shaded, d), at(shaded, b) == at(shaded, c)),
-at(shaded, a) == at(shaded, b)))
+    cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: eq(root, x)), 'uc')[0]
 
-# how many other cells are visible in a certain direction
-c, vis = look((lambda pos, d, edge, n, v: 0 if edge else If(at(shaded, n), 0, v + 1)), Int, 'v')
-cons += c
+    # all shaded cells must be connected to the perimeter
+    cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: is_perimeter(x)), 'c')[0]
 
-# add the constraints from clues
-cons += [sum(at(it, i) for it in vis) == at(g, i) - 1 for i in inds() if at(g, i) != None]
+    # no 2x2 checkerboards
+    cons += all_2x2(lambda a, b, c, d: Implies(And(at(shaded, a) == at(shaded, d), at(shaded, b) == at(shaded, c)),
+    at(shaded, a) == at(shaded, b)))
 
-# add the constraint that clues cannot be shaded
-cons += [Not(at(shaded, i)) for i in inds() if at(g, i) != None]
+    # add the constraints from clues: how many other cells are visible in all four directions
+    # (up to the first shaded cell in each)
+    cons += [ray_count(i, range(4), at(g, i) - 1, stop=lambda j: at(shaded, j)) for i in inds() if at(g, i) != None]
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded))
+    # add the constraint that clues cannot be shaded
+    cons += [Not(at(shaded, i)) for i in inds() if at(g, i) != None]
+
+    def show(m):
+        return '\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded)
+
+    return cons, shaded, show
+
+if __name__ == '__main__':
+    run(build, parse(example))
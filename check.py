@@ -0,0 +1,70 @@
+import argparse
+import importlib
+import multiprocessing
+import os
+import sys
+
+# Regression checks: puzzles that have been solved wrongly before, each of which has a solution
+# and must be found to have one. Each case is a genre, a puzzle (None for the genre's example)
+# and the encoding to solve it with; every case is run in a fresh process.
+# Run them all with python check.py, or only those of some genres with python check.py genre ...
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+cases = [
+    # z3 went wrong with the lazy connectivity check's equalities between Int region values
+    # (see lazy.Lazy); the small shikaku was unsat after a single conflict.
+    ('lohkous', None, 'lazy'),
+    ('shikaku', None, 'lazy'),
+    ('shikaku', '''
+.....3
+9....4
+....6.
+21....
+.1211.
+''', 'lazy'),
+    # Clues pointing straight off the grid have nothing to count.
+    ('yajilin', '''
+0^......0>
+..........
+..........
+..........
+0<........
+''', 'int'),
+]
+
+# One case, in its own process.
+def run(genre, text, encoding):
+    sys.path.insert(0, here)
+    import lib
+    lib.default_encoding = encoding
+    module = importlib.import_module(genre)
+    return lib.solve(module.build, module.parse(module.example if text is None else text))
+
+def run_isolated(args, timeout):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        try:
+            return pool.apply_async(run, args).get(timeout)
+        except multiprocessing.TimeoutError:
+            return {'result': 'timeout'}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('genres', nargs='*', help='only check these genres')
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+    failed = 0
+    for (genre, text, encoding) in cases:
+        if args.genres and genre not in args.genres:
+            continue
+        r = run_isolated((genre, text, encoding), args.timeout)
+        ok = r['result'] == 'sat'
+        failed += not ok
+        print(genre.ljust(18) + ('example' if text is None else text.strip().split('\n')[0][:13]).ljust(14)
+        + encoding.ljust(10) + ('ok' if ok else 'FAILED: ' + r['result']), flush=True)
+    if failed:
+        print(failed, 'failed')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from z3 import Not, is_bool, sat, unknown, unsat
+import lib
+
+# Cube-and-conquer: split one big puzzle into 2^k cubes (conjunctions of literals on the primary
+# variables a genre's build returns), then solve the cubes in a pool of worker processes,
+# each with the puzzle built once in its own z3 context and the cube given as assumptions.
+# Branching variables are picked by lookahead: each candidate is tried both ways with z3 allowed
+# no conflicts, and the one whose two sides propagate the most (the product of the numbers
+# of propagations) is picked. Literals that fail outright are added to the cube instead,
+# and a cube where some candidate fails both ways is dropped (it has no solutions).
+# Only Boolean primary variables are branched on; with none there's just one cube.
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def propagations(s):
+    st = s.statistics()
+    return st.get_key_value('propagations') if 'propagations' in st.keys() else 0
+
+# Probe each polarity of the candidates (under the cube so far). Returns the best candidate
+# (None if there is none), the literals that are forced, and whether the cube turned out unsatisfiable.
+def lookahead(s, candidates, cube, limit):
+    used = {str(i) for i in cube}
+    candidates = [i for i in candidates if str(i) not in used and str(Not(i)) not in used]
+    candidates = candidates[::max(1, len(candidates) // limit)]
+    best, best_score, forced = None, -1, []
+    for v in candidates:
+        counts = []
+        for lit in (v, Not(v)):
+            before = propagations(s)
+            r = s.check(*cube, *forced, lit)
+            counts.append(None if r == unsat else propagations(s) - before)
+        if counts == [None, None]:
+            return None, forced, True
+        elif None in counts:
+            forced.append(Not(v) if counts[0] is None else v)
+        elif (counts[0] + 1) * (counts[1] + 1) > best_score:
+            best, best_score = v, (counts[0] + 1) * (counts[1] + 1)
+    return best, forced, False
+
+def make_cubes(s, candidates, k, limit, cube=()):
+    if k == 0:
+        return [cube]
+    v, forced, failed = lookahead(s, candidates, cube, limit)
+    if failed:
+        return []
+    cube += tuple(forced)
+    if v is None:
+        return [cube]
+    return make_cubes(s, candidates, k - 1, limit, cube + (v,)) + make_cubes(s, candidates, k - 1, limit, cube + (Not(v),))
+
+# Literals are passed to workers as (variable name, polarity), since z3 terms can't be.
+def encode(lit):
+    return (str(lit.arg(0)), False) if lit.num_args() == 1 and lit.decl().name() == 'not' else (str(lit), True)
+
+# Set in each worker by init: the solver, the primary variables by name, and the display function.
+state = None
+
+def init(genre, text):
+    global state
+    sys.path.insert(0, here)
+    module = importlib.import_module(genre)
+    cons, primary, show = module.build(module.parse(text))
+    s = lib.solver()
+    s.add(*lib.current_problem().prune(cons))
+    state = s, {str(i): i for i in lib.variables(primary)}, primary, show
+
+# Solve one cube, looking for a second solution in it too if unique is set. Returns the solutions
+# and whether z3 gave up (unknown, from a timeout or some other limit) before the cube was done.
+def work(args):
+    cube, unique = args
+    s, names, primary, show = state
+    lits = [names[n] if p else Not(names[n]) for (n, p) in cube]
+    solutions = []
+    r = sat
+    while len(solutions) < 1 + unique:
+        r = s.check(*lits)
+        if r != sat:
+            break
+        m = s.model()
+        solutions.append(show(lib.current_problem().model(m)))
+        # Block this solution. It's in this cube and no other, so the clause can stay
+        # for the worker's later cubes.
+        s.add(lib.block(m, primary))
+    return solutions, r == unknown
+
+# Solve a puzzle (text in the format of the genre module's example) by splitting it into 2^k cubes.
+# Without unique, stops at the first solution found (sat) or reports unsat. With unique,
+# reports unique, multiple (with two solutions) or none, stopping as soon as there are two solutions.
+# If z3 gave up on any cube, and the cubes it did finish don't settle it (there's no solution,
+# or with unique, fewer than two), the result is unknown, and unknown is the number of such cubes.
+def solve(genre, text, k=3, workers=None, unique=False, limit=64):
+    module = importlib.import_module(genre)
+    tm = time.time()
+    cons, primary, show = module.build(module.parse(text))
+    s = lib.solver()
+    s.add(*lib.current_problem().prune(cons))
+    s.set('max_conflicts', 0)
+    t0 = time.time()
+    cubes = make_cubes(s, [i for i in lib.variables(primary) if is_bool(i) and not lib.given(i)], k, limit)
+    t1 = time.time()
+    solutions = []
+    unresolved = 0
+    with multiprocessing.get_context('spawn').Pool(workers, init, (genre, text)) as pool:
+        for (r, gave_up) in pool.imap_unordered(work, [([encode(i) for i in c], unique) for c in cubes]):
+            solutions += r
+            unresolved += gave_up
+            if len(solutions) >= 1 + unique:
+                break
+    if len(solutions) < 1 + unique and unresolved:
+        result = 'unknown'
+    elif unique:
+        result = ['none', 'unique', 'multiple'][min(len(solutions), 2)]
+    else:
+        result = 'sat' if solutions else 'unsat'
+    return {'result': result, 'cubes': len(cubes), 'unknown': unresolved, 'constructed': t0 - tm, 'lookahead': t1 - t0,
+    'solved': time.time() - t1, 'solutions': solutions[:2]}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('genre')
+    parser.add_argument('file', nargs='?', help='puzzle file (default: the genre\'s example)')
+    parser.add_argument('-k', type=int, default=3, help='number of branching variables (giving up to 2^k cubes)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--unique', action='store_true', help='check that there is exactly one solution')
+    args = parser.parse_args()
+    if args.file:
+        with open(args.file) as f:
+            text = f.read()
+    else:
+        text = importlib.import_module(args.genre).example
+    print(json.dumps(solve(args.genre, text, args.k, args.workers, args.unique)))
+
+if __name__ == '__main__':
+    main()
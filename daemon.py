@@ -0,0 +1,128 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import socketserver
+import sys
+import threading
+import time
+from bench import genres
+
+# Solve puzzles as they're asked for, in a long-running process, so each one doesn't pay
+# for starting Python, importing z3 and importing the genre module. Requests are JSON lines,
+# read from stdin or (with --socket) from connections to a Unix socket, and look like
+# {"id": 1, "genre": "sudoku", "puzzle": "...", "unique": false, "stats": false, "encoding": "int", "template": false, "deduce": false};
+# only genre and puzzle (text in the format of the genre module's example) are needed.
+# Each gets a JSON line back with the same id, holding what lib.solve returns plus total
+# (the time from the request being read to the answer being ready). Answers come back in the
+# order the puzzles finish, which needn't be the order they were asked for.
+# Puzzles are solved in a pool of worker processes, which live as long as the daemon does,
+# so everything a worker caches (genre modules, lib's grid topologies for each size it's seen,
+# and, for requests with template, the solvers holding each genre's constraints for a size; see lib.Template)
+# is kept between requests.
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# Genre modules each worker has imported so far. Only the genres bench.py knows are imported,
+# rather than any module a client names.
+modules = {}
+
+def init():
+    sys.path.insert(0, here)
+    import lib
+    # Warm up z3 itself, so the first request doesn't pay for it.
+    lib.Solver().check()
+
+def work(request, received):
+    import lib
+    r = {'id': request.get('id')}
+    encoding = lib.default_encoding
+    try:
+        name = request['genre']
+        if name not in genres:
+            raise ValueError('unknown genre: %r' % (name,))
+        if name not in modules:
+            modules[name] = importlib.import_module(name)
+        module = modules[name]
+        lib.default_encoding = request.get('encoding') or encoding
+        r.update(lib.solve(module.build, module.parse(request['puzzle']),
+        stats=request.get('stats', False), unique=request.get('unique', False), template=request.get('template', False), deduce=request.get('deduce')))
+    except Exception as e:
+        r.update({'result': 'error', 'error': repr(e)})
+    finally:
+        lib.default_encoding = encoding
+    r['total'] = time.time() - received
+    return r
+
+# Hand one line of input to the pool; respond is called with the answer, from the pool's result thread.
+# Returns the pool's handle on the request (None if it couldn't be read).
+def submit(pool, line, respond):
+    received = time.time()
+    try:
+        request = json.loads(line)
+        assert type(request) == dict, 'a request must be a JSON object'
+    except Exception as e:
+        respond({'id': None, 'result': 'error', 'error': repr(e)})
+        return None
+    return pool.apply_async(work, (request, received), callback=respond,
+    error_callback=lambda e: respond({'id': request.get('id'), 'result': 'error', 'error': repr(e)}))
+
+# Answers are written by the pool's result thread while requests are still being read,
+# so writing each one happens under a lock. f is stdout, or a socket connection (which takes bytes);
+# a client that's gone away just doesn't get its answers.
+def writer(f):
+    lock = threading.Lock()
+    def respond(r):
+        line = json.dumps(r) + '\n'
+        with lock:
+            try:
+                f.write(line if f is sys.stdout else line.encode())
+                f.flush()
+            except OSError:
+                pass
+    return respond
+
+def serve_stdin(pool):
+    respond = writer(sys.stdout)
+    for line in sys.stdin:
+        if line.strip():
+            submit(pool, line, respond)
+    pool.close()
+    pool.join()
+
+def serve_socket(pool, path):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            respond = writer(self.wfile)
+            pending = [submit(pool, line.decode(), respond) for line in self.rfile if line.strip()]
+            # Keep the connection until everything asked for on it is answered.
+            for a in pending:
+                if a is not None:
+                    a.wait()
+    if os.path.exists(path):
+        os.remove(path)
+    with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+        server.daemon_threads = True
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(path)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--socket', help='listen on this Unix socket rather than reading stdin')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--cache', help='directory to keep a cache of solved puzzles in (see cache.py)')
+    args = parser.parse_args()
+    if args.cache:
+        # Workers open the cache themselves (see cache.default_cache).
+        os.environ['LOGIC_SOLVE_CACHE'] = args.cache
+    with multiprocessing.Pool(args.workers, init) as pool:
+        if args.socket:
+            serve_socket(pool, args.socket)
+        else:
+            serve_stdin(pool)
+
+if __name__ == '__main__':
+    main()
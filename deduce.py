@@ -0,0 +1,221 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from array import array
+
+# Cheap deductions before solving. A genre module can define rules (puzzle data to its cells,
+# each of which is True or False, like the shaded cells of a shading genre, and a list of rules over them);
+# propagate applies the rules over and over until none of them settles anything more.
+# lib.solve (with deduce) adds the cells this settles to the z3 constraints as unit constraints,
+# which on easy puzzles is often most of them, and reports how many there were.
+# The rules here are the ones genres have in common; a genre can also write its own, as a Rule
+# with a function doing the deduction.
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+class Contradiction(Exception):
+    pass
+
+# The cells (any hashable keys, generally grid positions) and what's known about them,
+# in a compact array: -1 for unknown, and 0 or 1 for False or True.
+class State:
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.index = {k: n for (n, k) in enumerate(self.keys)}
+        self.values = array('b', [-1] * len(self.keys))
+        # Cells changed since the propagation loop last looked (by number).
+        self.changed = []
+
+    def get(self, n):
+        return self.values[n]
+
+    # Settle cell number n as value (0 or 1); returns whether that's new.
+    def set(self, n, value):
+        v = self.values[n]
+        if v == value:
+            return False
+        elif v != -1:
+            raise Contradiction(self.keys[n])
+        self.values[n] = value
+        self.changed.append(n)
+        return True
+
+    # The settled cells, as a dict from key to True or False.
+    def fixed(self):
+        return {k: bool(v) for (k, v) in zip(self.keys, self.values) if v != -1}
+
+# A rule is over some cells (given by key); apply looks at what's known and settles what it can
+# (through state.set, which raises Contradiction if something's settled both ways).
+# The cells are numbered once the state exists, by bind.
+class Rule:
+    def __init__(self, cells, f=None):
+        self.cells = list(cells)
+        self.f = f
+
+    def bind(self, state):
+        self.ns = [state.index[k] for k in self.cells]
+
+    def apply(self, state):
+        self.f(state, self.ns)
+
+# Between lo and hi (lo if not given) of the cells are True.
+class Count(Rule):
+    def __init__(self, cells, lo, hi=None):
+        Rule.__init__(self, cells)
+        self.lo = lo
+        self.hi = lo if hi is None else hi
+
+    def apply(self, state):
+        true = sum(1 for n in self.ns if state.get(n) == 1)
+        unknown = [n for n in self.ns if state.get(n) == -1]
+        if true > self.hi or true + len(unknown) < self.lo:
+            raise Contradiction(self.cells)
+        if true == self.hi:
+            for n in unknown:
+                state.set(n, 0)
+        elif true + len(unknown) == self.lo:
+            for n in unknown:
+                state.set(n, 1)
+
+# The cells whose value could be True all lie in outer, whose count (exactly k True) is the same
+# as this one's, so the cells of outer that aren't in this can't be True. For example
+# a star battle region confined to one row has all that row's stars.
+class Confined(Rule):
+    def __init__(self, inner, outer):
+        Rule.__init__(self, inner)
+        self.outer = [k for k in outer if k not in set(inner)]
+        self.inside = set(outer)
+
+    def bind(self, state):
+        Rule.bind(self, state)
+        self.outer_ns = [state.index[k] for k in self.outer]
+        self.inside_ns = {state.index[k] for k in self.inside}
+
+    def apply(self, state):
+        if all(n in self.inside_ns for n in self.ns if state.get(n) != 0):
+            for n in self.outer_ns:
+                if state.get(n) != 0:
+                    state.set(n, 0)
+
+# A nonogram line: the cells in order, holding blocks of True cells of the lengths in clue,
+# in that order, with at least one False cell between blocks. Every placement of the blocks that
+# fits what's known is considered (by dynamic programming, both ways along the line),
+# and cells that are the same in all of them are settled.
+class Line(Rule):
+    def __init__(self, cells, clue):
+        Rule.__init__(self, cells)
+        self.clue = list(clue)
+
+    def apply(self, state):
+        v = [state.get(n) for n in self.ns]
+        size, blocks = len(v), self.clue
+        k = len(blocks)
+        # white[i]: the number of cells before i known to be False (so a block can't cover them).
+        white = [0]
+        for x in v:
+            white.append(white[-1] + (x == 0))
+        fits = lambda s, length: s + length <= size and white[s + length] == white[s]
+        # before[i][j]: the first i cells can hold the first j blocks (and are False elsewhere).
+        before = [[False] * (k + 1) for _ in range(size + 1)]
+        before[0][0] = True
+        for i in range(1, size + 1):
+            for j in range(k + 1):
+                r = v[i - 1] != 1 and before[i - 1][j]
+                if not r and j > 0:
+                    s = i - blocks[j - 1]
+                    if s >= 0 and fits(s, blocks[j - 1]):
+                        r = before[0][j - 1] if s == 0 else (v[s - 1] != 1 and before[s - 1][j - 1])
+                before[i][j] = r
+        # after[i][j]: the cells from i on can hold blocks j onwards.
+        after = [[False] * (k + 1) for _ in range(size + 2)]
+        after[size][k] = True
+        after[size + 1][k] = True
+        for i in range(size - 1, -1, -1):
+            for j in range(k, -1, -1):
+                r = v[i] != 1 and after[i + 1][j]
+                if not r and j < k and fits(i, blocks[j]):
+                    e = i + blocks[j]
+                    r = after[size][j + 1] if e == size else (v[e] != 1 and after[e + 1][j + 1])
+                after[i][j] = r
+        if not before[size][k]:
+            raise Contradiction(self.cells)
+        can_white = [any(before[i][j] and after[i + 1][j] for j in range(k + 1)) if v[i] != 1 else False for i in range(size)]
+        can_black = [False] * size
+        for j in range(k):
+            length = blocks[j]
+            for s in range(size - length + 1):
+                if not fits(s, length):
+                    continue
+                left = (j == 0) if s == 0 else (v[s - 1] != 1 and before[s - 1][j])
+                e = s + length
+                right = (j == k - 1) if e == size else (v[e] != 1 and after[e + 1][j + 1])
+                if left and right:
+                    for i in range(s, e):
+                        can_black[i] = True
+        for (i, n) in enumerate(self.ns):
+            if v[i] == -1:
+                if not can_black[i]:
+                    state.set(n, 0)
+                elif not can_white[i]:
+                    state.set(n, 1)
+
+# Apply the rules to the cells until nothing more is settled. Each rule is applied once,
+# then again whenever one of its cells is settled. Returns the state (and raises Contradiction
+# if the rules can't all hold).
+def propagate(keys, rules):
+    state = State(keys)
+    watching = [[] for _ in state.keys]
+    for r in rules:
+        r.bind(state)
+        for n in r.ns:
+            watching[n].append(r)
+    queue = list(rules)
+    queued = set(map(id, rules))
+    while queue:
+        r = queue.pop()
+        queued.discard(id(r))
+        r.apply(state)
+        for n in state.changed:
+            for r2 in watching[n]:
+                if id(r2) not in queued:
+                    queued.add(id(r2))
+                    queue.append(r2)
+        state.changed = []
+    return state
+
+# The cells a genre's rules settle for a puzzle (a dict from key to value; empty if the genre
+# has no rules), or None if the rules find the puzzle has no solution.
+def settled(module, puzzle):
+    if not hasattr(module, 'rules'):
+        return {}
+    keys, rules = module.rules(puzzle)
+    try:
+        return propagate(keys, rules).fixed()
+    except Contradiction:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('genre')
+    parser.add_argument('file', nargs='?', help='puzzle file (default: the genre\'s example)')
+    args = parser.parse_args()
+    sys.path.insert(0, here)
+    module = importlib.import_module(args.genre)
+    # Genres' rules are from the deduce module, rather than this script's copy of it.
+    deduce = importlib.import_module('deduce')
+    if args.file:
+        with open(args.file) as f:
+            text = f.read()
+    else:
+        text = module.example
+    puzzle = module.parse(text)
+    tm = time.time()
+    keys, rules = module.rules(puzzle)
+    fixed = deduce.settled(module, puzzle)
+    print(json.dumps({'cells': len(keys), 'deduced': None if fixed is None else len(fixed), 'time': time.time() - tm}))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import importlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from z3 import Bool, Goal, Not, Probe, Solver, Then, sat
+import lib
+
+# Solve a puzzle with an external SAT solver. Once a genre's constraints are all Boolean
+# (star_battle, akari, or yinyang with the 'bv' or 'order' encoding for connectivity, ...), z3's tactics
+# turn them into CNF (cardinality constraints and bit-vectors included), which is written out
+# in DIMACS format for a SAT solver like kissat or cadical. Its answer is turned back into
+# a model of the genre's own variables, which the genre's show displays as usual.
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# Solvers to look for on PATH when none is given. Any solver that takes a DIMACS file as its
+# argument and prints its answer in the SAT competition format will do (e.g. 'z3 -dimacs').
+solvers = ['kissat', 'cadical', 'cryptominisat5']
+
+# Integers are only dealt with if they can be solved for and eliminated (like the roots in yinyang);
+# anything else that isn't Boolean or a bit-vector makes the result not CNF, and NotBoolean is raised.
+cnf_tactic = Then('simplify', 'propagate-values', 'solve-eqs', 'card2bv', 'simplify', 'bit-blast', 'tseitin-cnf')
+
+class NotBoolean(Exception):
+    pass
+
+# Turn constraints into CNF: returns the goal holding the clauses (which also knows how to turn
+# a model of them back into a model of the original variables; see from_assignment).
+def to_cnf(cons):
+    g = Goal()
+    g.add(*cons)
+    r = cnf_tactic(g)
+    assert len(r) == 1
+    if not Probe('is-propositional')(r[0]):
+        raise NotBoolean('constraints aren\'t all Boolean after bit-blasting')
+    return r[0]
+
+# Write the CNF goal g in DIMACS format to file f. Returns the named variables, by their number
+# in the file; comment lines give these too, so variables from shaded_vars or construct_edge_vars
+# can be found in the file. (The others are ones the tactics made up.)
+def write(g, f):
+    text = g.dimacs()
+    f.write(text + '\n')
+    names = {}
+    for line in text.split('\n'):
+        if line.startswith('c '):
+            k, name = line[2:].split(' ', 1)
+            names[int(k)] = Bool(name)
+    return names
+
+# Read a SAT solver's output: returns 'sat' with the true literals, or 'unsat' or 'unknown' (with none).
+def read_answer(out):
+    result = 'unknown'
+    lits = set()
+    for line in out.split('\n'):
+        if line.startswith('s '):
+            result = {'SATISFIABLE': 'sat', 'UNSATISFIABLE': 'unsat'}.get(line[2:].strip(), 'unknown')
+        elif line.startswith('v '):
+            lits.update(int(i) for i in line[2:].split())
+    return result, lits - {0}
+
+# Turn an assignment to the CNF's variables into a model of the original constraints' variables.
+# The named variables' values are given to z3 along with the clauses, which fills in the rest
+# (by propagation, usually), and the tactics' record of what they did gives the original variables.
+def from_assignment(g, names, lits):
+    s = Solver()
+    s.add(*g)
+    s.add(*[v if k in lits else Not(v) for (k, v) in names.items()])
+    assert s.check() == sat
+    return g.convert_model(s.model())
+
+def find_solver():
+    for i in solvers:
+        if shutil.which(i):
+            return i
+    return None
+
+# Solve a genre's puzzle with the SAT solver command (a string; by default the first of solvers on PATH).
+# Returns the same kind of result as lib.solve, with converted (the time taken to make the CNF)
+# and the number of clauses in the CNF too. Raises NotBoolean if the constraints can't be CNF,
+# which includes any lazy ones.
+def solve(module, puzzle, command=None, keep=None):
+    command = command or find_solver()
+    assert command, 'no SAT solver found (tried %s)' % ', '.join(solvers)
+    tm = time.time()
+    cons, primary, show = module.build(puzzle)
+    # The problem's solver has any constraints the helpers streamed into it (see lib.Problem.emit).
+    problem = lib.current_problem()
+    # Lazy constraints (see lazy.py) are only in z3's propagator, so they'd be missing from the CNF.
+    if problem.lazy.constraints:
+        raise NotBoolean('lazy constraints can\'t be written as CNF (use another encoding)')
+    s = lib.solver()
+    s.add(*problem.prune(cons))
+    t0 = time.time()
+    g = to_cnf(s.assertions())
+    path = keep or tempfile.mkstemp(suffix='.cnf')[1]
+    try:
+        with open(path, 'w') as f:
+            names = write(g, f)
+        t1 = time.time()
+        p = subprocess.run(shlex.split(command) + [path], capture_output=True, text=True)
+    finally:
+        if not keep:
+            os.remove(path)
+    t2 = time.time()
+    r, lits = read_answer(p.stdout)
+    out = {'result': r, 'constructed': t0 - tm, 'converted': t1 - t0, 'solved': t2 - t1,
+    'clauses': len(g), 'solution': show(problem.model(from_assignment(g, names, lits))) if r == 'sat' else None}
+    return out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('genre')
+    parser.add_argument('file', nargs='?', help='puzzle file (default: the genre\'s example)')
+    parser.add_argument('--solver', help='SAT solver command (default: the first of %s on PATH)' % ', '.join(solvers))
+    parser.add_argument('--output', help='keep the DIMACS file here')
+    args = parser.parse_args()
+    sys.path.insert(0, here)
+    module = importlib.import_module(args.genre)
+    if args.file:
+        with open(args.file) as f:
+            text = f.read()
+    else:
+        text = module.example
+    print(json.dumps(solve(module, module.parse(text), args.solver, args.output)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from z3 import sat, unsat
+import lib
+
+# Solve placement genres as exact cover problems, with dancing links (Knuth's Algorithm X).
+# A genre module with a cover function lists the options (placing a star, a rectangle, a digit, ...)
+# and the items each covers, and ExactCover finds the sets of options covering every primary item
+# the number of times it needs (once, usually) and every secondary item at most as many times
+# as it allows (again once, usually); secondary items are how "at most" rules like stars not touching go in.
+# Whatever rules don't fit (like LITS's shaded cells being connected) are left to z3: each cover
+# is checked against the genre's whole set of constraints, with the primary variables fixed to it.
+# Genres with no such rules don't need z3 at all.
+# Run one puzzle with python dlx.py genre [file] [--unique].
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# The matrix, as dancing links: node 0 is the root, nodes 1 to the number of items are the items'
+# headers, and every other node is one (option, item) entry. Each node is in a vertical list
+# (U, D) of its item's entries, and entries are in horizontal lists (L, R) of their option's entries;
+# the headers of the primary items still needing cover are in the root's horizontal list.
+# need is how many more options each item must (primary) or can (secondary) have, and size how many
+# options it still has to choose from. Rather than only covering items, search also picks an option
+# for a primary item and then either takes it or leaves it out, which is the same as Algorithm X
+# for items needed once and also handles items needed several times (without finding each cover
+# once for each order its options can be taken in). An option can cover a secondary item more than once
+# (a LITS shape covering two cells of a 2x2 block, say), which counts against what that item allows.
+# feasible, if given, is a function taking the options taken so far and those still available (by name)
+# and saying whether a cover might still be found from there (or, once there's a cover, whether it's
+# a solution); it's how rules that aren't about covering, like connectivity, can cut the search short
+# rather than being checked on every cover at the end.
+class ExactCover:
+    def __init__(self, primary, secondary=(), feasible=None):
+        self.feasible = feasible
+        # Items are given as lists of names, or dicts from names to how many times they're needed
+        # (primary) or allowed (secondary).
+        primary = primary if type(primary) == dict else dict.fromkeys(primary, 1)
+        secondary = secondary if type(secondary) == dict else dict.fromkeys(secondary, 1)
+        self.items = {k: n + 1 for (n, k) in enumerate(list(primary) + list(secondary))}
+        self.primary = len(primary)
+        count = len(self.items) + 1
+        self.L = [(i - 1) % (self.primary + 1) for i in range(self.primary + 1)] + list(range(self.primary + 1, count))
+        self.R = [(i + 1) % (self.primary + 1) for i in range(self.primary + 1)] + list(range(self.primary + 1, count))
+        self.U = list(range(count))
+        self.D = list(range(count))
+        self.C = list(range(count))
+        # How many times each entry's option covers its item.
+        self.W = [0] * count
+        self.need = [0] + list(primary.values()) + list(secondary.values())
+        self.size = [0] * count
+        # The options (by name), and the first node of each.
+        self.options = []
+        self.first = []
+        self.option_of = [None] * count
+
+    # Add an option covering items (names of items given to the constructor; secondary ones can be repeated).
+    def add(self, name, items):
+        n = len(self.options)
+        self.options.append(name)
+        start = len(self.C)
+        self.first.append(start)
+        weights = {}
+        for k in items:
+            weights[self.items[k]] = weights.get(self.items[k], 0) + 1
+        assert all(w == 1 for (c, w) in weights.items() if c <= self.primary), 'primary items can only be covered once by an option'
+        items = list(weights)
+        for (k, c) in enumerate(items):
+            x = start + k
+            self.L.append(start + (k - 1) % len(items))
+            self.R.append(start + (k + 1) % len(items))
+            self.U.append(self.U[c])
+            self.D.append(c)
+            self.D[self.U[c]] = x
+            self.U[c] = x
+            self.C.append(c)
+            self.W.append(weights[c])
+            self.option_of.append(n)
+            self.size[c] += 1
+
+    def nodes(self, n):
+        x = self.first[n]
+        yield x
+        y = self.R[x]
+        while y != x:
+            yield y
+            y = self.R[y]
+
+    # Take option n out of the items' lists.
+    def hide(self, n, trail):
+        U, D = self.U, self.D
+        for x in self.nodes(n):
+            D[U[x]] = D[x]
+            U[D[x]] = U[x]
+            self.size[self.C[x]] -= 1
+        trail.append(('hide', n))
+
+    # Take option n: it's hidden (so isn't taken again), the items it covers need fewer,
+    # and the other options that would now cover an item too many times are hidden too.
+    def take(self, n, trail):
+        trail.append(('take', n))
+        self.hide(n, trail)
+        for x in self.nodes(n):
+            c = self.C[x]
+            self.need[c] -= self.W[x]
+            trail.append(('need', x))
+            y = self.D[c]
+            while y != c:
+                if self.W[y] > self.need[c]:
+                    self.hide(self.option_of[y], trail)
+                y = self.D[y]
+            if self.need[c] == 0:
+                if c <= self.primary:
+                    self.R[self.L[c]] = self.R[c]
+                    self.L[self.R[c]] = self.L[c]
+                    trail.append(('unlink', c))
+
+    # Undo everything done since the trail was length k (in reverse, which puts the links back).
+    def undo(self, trail, k):
+        U, D, L, R = self.U, self.D, self.L, self.R
+        while len(trail) > k:
+            (op, n) = trail.pop()
+            if op == 'hide':
+                for x in reversed(list(self.nodes(n))):
+                    D[U[x]] = x
+                    U[D[x]] = x
+                    self.size[self.C[x]] += 1
+            elif op == 'need':
+                self.need[self.C[n]] += self.W[n]
+            elif op == 'unlink':
+                R[L[n]] = n
+                L[R[n]] = n
+
+    # The primary item with the least room to spare (options it could have, less options it needs),
+    # or 0 if none are left; a negative spare means there's no cover from here.
+    def choose(self):
+        best, spare = 0, None
+        c = self.R[0]
+        while c != 0:
+            s = self.size[c] - self.need[c]
+            if spare is None or s < spare:
+                best, spare = c, s
+                if s <= 0:
+                    break
+            c = self.R[c]
+        return best, spare
+
+    # The options still available (by name): those in the lists of primary items still needing cover.
+    def available(self):
+        r = set()
+        c = self.R[0]
+        while c != 0:
+            x = self.D[c]
+            while x != c:
+                r.add(self.option_of[x])
+                x = self.D[x]
+            c = self.R[c]
+        return [self.options[n] for n in sorted(r)]
+
+    # Generate the covers (each as a list of option names), up to limit of them.
+    def solutions(self, limit=None):
+        trail = []
+        # The choices made, each with the trail length before it, so the other branch can be tried.
+        stack = []
+        found = 0
+        try:
+            while limit is None or found < limit:
+                c, spare = self.choose()
+                dead = (c != 0 and spare < 0) or (self.feasible is not None and
+                not self.feasible([self.options[n] for (op, n) in trail if op == 'take'], self.available()))
+                if c == 0 or dead:
+                    if not dead:
+                        yield [self.options[n] for (op, n) in trail if op == 'take']
+                        found += 1
+                    # Back up to the last option taken, and leave it out instead.
+                    if not stack:
+                        return
+                    (k, n) = stack.pop()
+                    self.undo(trail, k)
+                    self.hide(n, trail)
+                else:
+                    n = self.option_of[self.D[c]]
+                    stack.append((len(trail), n))
+                    self.take(n, trail)
+        finally:
+            # Put the matrix back as it was (also when whatever's taking the covers stops early).
+            self.undo(trail, 0)
+
+# The variable for k in primary (a dict, or a grid or other nested list indexed by the parts of k).
+def lookup(primary, k):
+    if type(primary) not in (list, tuple):
+        return primary[k]
+    for i in k:
+        primary = primary[i]
+    return primary
+
+# Constraints fixing the primary variables to values (a dict from cells to values).
+def fixing(primary, values):
+    return [lookup(primary, k) == v for (k, v) in values.items()]
+
+# Solve a genre's puzzle as an exact cover problem. The genre's cover function returns the ExactCover,
+# a function turning a cover into values of the primary variables (a dict from cells to values),
+# whether there are other rules z3 has to check covers against, and a function showing values
+# (as the genre's build's show would the model). Only if there are is the genre's build run
+# (which for some genres takes far longer than the search); cover can't count on it having been.
+# Returns the same kind of result as lib.solve (with unique, checked covers the whole search
+# for a second solution), plus covers, the number of covers tried. If z3 can't say whether
+# a cover fits the other rules (a timeout, say), the search stops there and the result is unknown.
+def solve(module, puzzle, unique=False):
+    tm = time.time()
+    ec, values, side, show = module.cover(puzzle)
+    if side:
+        cons, primary, _ = module.build(puzzle)
+        problem = lib.current_problem()
+        s = lib.solver()
+        s.add(*problem.prune(cons))
+    t0 = time.time()
+    found = []
+    covers = 0
+    gave_up = False
+    for i in ec.solutions():
+        covers += 1
+        v = values(i)
+        if side:
+            s.push()
+            s.add(*problem.prune(fixing(primary, v)))
+            r = s.check()
+            s.pop()
+            if r == unsat:
+                continue
+            elif r != sat:
+                gave_up = True
+                break
+        found.append(v)
+        if len(found) == 1:
+            t1 = time.time()
+        if len(found) == (2 if unique else 1):
+            break
+    t2 = time.time()
+    out = {'result': 'sat' if found else 'unsat', 'constructed': t0 - tm, 'solved': (t1 if found else t2) - t0,
+    'solution': show(found[0]) if found else None, 'covers': covers}
+    if unique:
+        out['result'] = 'none' if not found else ('unique' if len(found) == 1 else 'multiple')
+        out['checked'] = t2 - (t1 if found else t2)
+        if len(found) > 1:
+            out['second'] = show(found[1])
+    if gave_up:
+        out['result'] = 'unknown'
+    return out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('genre')
+    parser.add_argument('file', nargs='?', help='puzzle file (default: the genre\'s example)')
+    parser.add_argument('--unique', action='store_true', help='check the solution is the only one')
+    args = parser.parse_args()
+    sys.path.insert(0, here)
+    module = importlib.import_module(args.genre)
+    if args.file:
+        with open(args.file) as f:
+            text = f.read()
+    else:
+        text = module.example
+    print(json.dumps(solve(module, module.parse(text), args.unique)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+from z3 import FreshBool, Not, UserPropagateBase, is_const, is_false, is_not, is_true, simplify, Z3_OP_UNINTERPRETED
+
+# Constraints that are checked lazily during search (through a z3 user propagator)
+# rather than written out as formulas up front. Each constraint watches some Boolean literals,
+# and whenever the current (partial) assignment already rules it out, it reports a conflict
+# (or forces some literals) using only the literals responsible, which z3 then learns as clauses.
+# The constraints here don't know about the rest of lib; they work on Topology cell numbers.
+
+# Checks during search (as opposed to the final check) only look for pockets up to this many cells.
+# Small pockets are the ones worth finding early, and bigger searches on every assignment
+# cost more than they save.
+pocket_limit = 32
+
+# The lazy constraints of one problem, together with the literals they watch.
+# Literals are numbered so that the propagator can look their values up in a flat list:
+# the atom in slot s is 2 * s as a positive literal and 2 * s + 1 as a negative one.
+# Slot 0 is the constant True, so 0 and 1 stand for True and False.
+# Atoms are Bool variables. Anything else (like an equality between two Int region values) gets
+# a fresh Bool standing for it, defined by a constraint in definitions: z3 didn't learn conflicts
+# over registered equalities between Ints as the clauses they were, and went on to unsat
+# (on lohkous and shikaku puzzles with solutions).
+class Lazy:
+    def __init__(self):
+        self.atoms = [None]
+        self.slots = {}
+        self.definitions = []
+        self.constraints = []
+
+    # Number a z3 Bool (or python bool) as a literal, stripping negations so that e.g. x and Not(x)
+    # share an atom. Constants (including things like And(True, False) that eq builds from
+    # python values) become 0 or 1.
+    def literal(self, x):
+        if type(x) != bool:
+            x = simplify(x)
+            if is_true(x) or is_false(x):
+                x = is_true(x)
+        if type(x) == bool:
+            return 0 if x else 1
+        negated = 0
+        while is_not(x):
+            x = x.arg(0)
+            negated ^= 1
+        i = x.get_id()
+        if i not in self.slots:
+            self.slots[i] = len(self.atoms)
+            if not (is_const(x) and x.decl().kind() == Z3_OP_UNINTERPRETED):
+                b = FreshBool('lazy', x.ctx)
+                self.definitions.append(b == x)
+                self.slots[b.get_id()] = self.slots[i]
+                x = b
+            self.atoms.append(x)
+        return 2 * self.slots[i] + negated
+
+    def add(self, c):
+        self.constraints.append(c)
+
+# Every included cell must reach some base cell through a chain of adjacent included cells
+# in the same region. included and base are literals per cell number, link is a literal
+# ("same region") per position in topo.targets.
+class Connectivity:
+    def __init__(self, topo, included, base, link):
+        self.topo = topo
+        self.included = included
+        self.base = base
+        self.link = link
+
+    def literals(self):
+        for (k, i) in enumerate(self.included):
+            yield i, ('included', k)
+        for (k, i) in enumerate(self.base):
+            yield i, ('base', k)
+        for (p, i) in enumerate(self.link):
+            yield i, ('link', p)
+
+    # Find cells that might have just been walled in: closing a boundary (excluding a cell
+    # or cutting a link) might wall in the cells next to it, and a newly included cell
+    # might be somewhere that's walled in already.
+    def seeds(self, key, value):
+        role, n = key
+        off, tg = self.topo.offsets, self.topo.targets
+        if role == 'included':
+            return [n] if value else [tg[p] for p in range(off[n], off[n + 1])]
+        elif role == 'link' and not value:
+            return [self.topo.sources[n], tg[n]]
+        return []
+
+    # Cells walled in away from every possible base can't be included, so either exclude them
+    # or, if one of them is already included, report a conflict.
+    def on_fixed(self, prop, key, value):
+        done = set()
+        for k in self.seeds(key, value):
+            if k in done or prop.val[self.included[k]] is False:
+                continue
+            cells, deps = self.walled(prop, k, done, limit=pocket_limit)
+            if deps is None:
+                continue
+            bad = [i for i in cells if prop.val[self.included[i]]]
+            if bad:
+                return prop.report(deps + [self.included[bad[0]]])
+            for i in cells:
+                prop.imply(self.included[i] ^ 1, deps)
+        return False
+
+    # Every component of included cells must have a base.
+    def on_final(self, prop):
+        done = set()
+        for k in range(len(self.included)):
+            if k not in done and prop.val[self.included[k]]:
+                cells, deps = self.walled(prop, k, done, full=True)
+                if deps is not None:
+                    return prop.report(deps + [self.included[k]])
+        return False
+
+    # Explore everything reachable from seed without crossing a closed boundary (an excluded cell
+    # or a cut link), adding it to done. Returns the cells explored and, if none of them can be
+    # a base, the literals that wall them in (otherwise None in place of those).
+    # Cells already in done belong to earlier searches that weren't walled in, so reaching one
+    # means this one isn't either. During search this gives up as soon as it finds a possible base
+    # or explores more than limit cells; the final check (full) explores whole components.
+    def walled(self, prop, seed, done, limit=None, full=False):
+        val = prop.val
+        off, tg = self.topo.offsets, self.topo.targets
+        included, base, link = self.included, self.base, self.link
+        mine = {seed}
+        done.add(seed)
+        stack = [seed]
+        cells = []
+        deps = []
+        found = False
+        while stack:
+            k = stack.pop()
+            cells.append(k)
+            if limit is not None and len(cells) > limit:
+                return cells, None
+            if val[base[k]] is not False:
+                if not full:
+                    return cells, None
+                found = True
+            deps.append(base[k])
+            for p in range(off[k], off[k + 1]):
+                j = tg[p]
+                if j in mine:
+                    continue
+                if val[link[p]] is False:
+                    deps.append(link[p])
+                elif val[included[j]] is False:
+                    deps.append(included[j])
+                elif j in done:
+                    return cells, None
+                else:
+                    mine.add(j)
+                    done.add(j)
+                    stack.append(j)
+        return cells, (None if found else deps)
+
+# The used edges (a literal per position in topo.targets, the same for both directions of an edge)
+# form a single path: no used edges go around a cycle, except (if circ) one cycle using every used edge.
+# Degree constraints are left to the caller; this only rules out separate subtours.
+# Cells are kept in a union-find (without path compression, so that unions can be undone)
+# over the used edges, which finds cycles as they close.
+class Loop:
+    def __init__(self, topo, used, circ):
+        self.topo = topo
+        self.used = used
+        self.circ = circ
+        self.parent = list(range(len(topo.cells)))
+        self.size = [1] * len(topo.cells)
+        # The edges around the cycle closed so far (if circ), if any.
+        self.cycle = None
+
+    def literals(self):
+        for (p, i) in enumerate(self.used):
+            if self.topo.sources[p] < self.topo.targets[p]:
+                yield i, p
+
+    def find(self, k):
+        while self.parent[k] != k:
+            k = self.parent[k]
+        return k
+
+    def on_fixed(self, prop, p, value):
+        if not value:
+            return False
+        if self.cycle is not None:
+            return prop.report([self.used[q] for q in self.cycle + [p]])
+        ra, rb = self.find(self.topo.sources[p]), self.find(self.topo.targets[p])
+        if ra != rb:
+            if self.size[ra] < self.size[rb]:
+                ra, rb = rb, ra
+            self.parent[rb] = ra
+            self.size[ra] += self.size[rb]
+            prop.on_pop(lambda: self.split(ra, rb))
+            return False
+        return self.closed(prop, p)
+
+    def split(self, ra, rb):
+        self.parent[rb] = rb
+        self.size[ra] -= self.size[rb]
+
+    # Edge p has just closed a cycle. That's only fine in a loop, if nothing else is used.
+    def closed(self, prop, p):
+        cycle = self.cycle_through(prop, p)
+        if self.circ:
+            on = {k for q in cycle for k in (self.topo.sources[q], self.topo.targets[q])}
+            other = [q for (q, i) in enumerate(self.used) if prop.val[i] and self.topo.sources[q] not in on]
+            if not other:
+                self.cycle = cycle
+                prop.on_pop(lambda: setattr(self, 'cycle', None))
+                return False
+            cycle.append(other[0])
+        return prop.report([self.used[q] for q in cycle])
+
+    # The edges around the cycle that edge p (between cells that were already connected) closes:
+    # p and a path of used edges between its ends.
+    def cycle_through(self, prop, p):
+        off, tg, used = self.topo.offsets, self.topo.targets, self.used
+        a, b = self.topo.sources[p], tg[p]
+        came = {a: None}
+        stack = [a]
+        while stack and b not in came:
+            k = stack.pop()
+            for q in range(off[k], off[k + 1]):
+                if tg[q] not in came and used[q] != used[p] and prop.val[used[q]]:
+                    came[tg[q]] = q
+                    stack.append(tg[q])
+        cycle = [p]
+        k = b
+        while came[k] is not None:
+            cycle.append(came[k])
+            k = self.topo.sources[came[k]]
+        return cycle
+
+    # Everything is checked as edges get used, so there's nothing left to check here.
+    def on_final(self, prop):
+        return False
+
+# The user propagator that runs the lazy constraints of a problem on one solver.
+# There can only be one propagator per solver, so this dispatches to all of them.
+# val holds the current value (True, False or None if not fixed yet) of every literal.
+class LazyPropagator(UserPropagateBase):
+    def __init__(self, s, lazy):
+        super().__init__(s)
+        self.lazy = lazy
+        self.val = [True, False] + [None] * (2 * len(lazy.atoms) - 2)
+        self.trail = []
+        self.levels = []
+        self.watches = [[] for _ in lazy.atoms]
+        self.conflicts = 0
+        for c in lazy.constraints:
+            for (lit, key) in c.literals():
+                if lit > 1:
+                    self.watches[lit >> 1].append((c, key, lit))
+        s.add(*lazy.definitions)
+        for (slot, atom) in enumerate(lazy.atoms):
+            if self.watches[slot]:
+                self.add(atom)
+        self.add_fixed(self._fixed)
+        self.add_final(self._final)
+
+    def push(self):
+        self.levels.append(len(self.trail))
+
+    def pop(self, num_scopes):
+        n = self.levels[-num_scopes]
+        del self.levels[-num_scopes:]
+        while len(self.trail) > n:
+            x = self.trail.pop()
+            if type(x) == int:
+                self.val[2 * x] = self.val[2 * x + 1] = None
+            else:
+                x()
+
+    # Record something to undo when backtracking past the current level.
+    def on_pop(self, f):
+        self.trail.append(f)
+
+    def expr(self, lit):
+        atom = self.lazy.atoms[lit >> 1]
+        return Not(atom) if lit & 1 else atom
+
+    # Report that the literals in deps (all currently true) can't all hold. Returns True, so that
+    # constraints can return this straight from on_fixed/on_final to say they found a conflict.
+    def report(self, deps):
+        self.conflicts += 1
+        self.conflict([self.lazy.atoms[i >> 1] for i in set(deps) if i > 1])
+        return True
+
+    # Tell z3 that the literals in deps (all currently true) force lit.
+    def imply(self, lit, deps):
+        if self.val[lit] is None:
+            self.propagate(self.expr(lit), [self.lazy.atoms[i >> 1] for i in set(deps) if i > 1])
+
+    def _fixed(self, atom, value):
+        slot = self.lazy.slots[atom.get_id()]
+        v = is_true(value)
+        self.val[2 * slot] = v
+        self.val[2 * slot + 1] = not v
+        self.trail.append(slot)
+        for (c, key, lit) in self.watches[slot]:
+            if c.on_fixed(self, key, self.val[lit]):
+                return
+
+    def _final(self):
+        for c in self.lazy.constraints:
+            if c.on_final(self):
+                return
@@ -1,18 +1,18 @@
-from z3 import Int, Bool, And, Or, If, Not, AtLeast, BoolRef, ArithRef, Solver, is_true, Implies, PbEq, Distinct
-#  This doesn't work great if you want to solve nested puzzles, but otherwise it's good.
-
-grid = None
-height = None
-width = None
-
-# Initializes problem global data so functions from this file can use it
-def set_problem(g):
-    global grid
-    global height
-    global width
-    grid = g
-    height = len(g)
-    width = len(g[0])
+from z3 import Int, Bool, BitVec, And, Or, If, Not, AtLeast, AtMost, BoolRef, ArithRef, Solver, ULT, is_bool, is_true, Implies, PbEq, Distinct, sat, unsat
+from z3 import BoolVal, IntVal, ModelRef, is_const, is_false, simplify
+import z3
+from lazy import Connectivity, Lazy, LazyPropagator, Loop
+from cache import default_cache, puzzle_key
+from deduce import settled
+from array import array
+from functools import lru_cache
+from itertools import chain
+import contextlib
+import multiprocessing
+import os
+import sys
+import threading
+import time
 
 generator_type = type(i for i in range(10))
 
@@ -35,49 +35,6 @@ def Min(x, y):
 def to_dir(x, num=False):
     return '^>v<'.index(x) if num else orth_dir['^>v<'.index(x)]
 
-# Get list of positions in the puzzle as tuples (the standard form of positions used by this library).
-def inds(flat=True):
-    if flat:
-        return [(i, j) for i in range(height) for j in range(width)]
-    else:
-        return [[(i, j) for j in range(width)] for i in range(height)]
-
-# Get the grid position opposite a given position (under 180-degree rotation).
-def sym_op(x):
-    return (height - x[0] - 1, width - x[1] - 1)
-
-def column(x):
-    if type(x) == tuple:
-        return column(x[1])
-    return [(i, x) for i in range(height)]
-
-def row(x):
-    if type(x) == tuple:
-        return row(x[0])
-    return [(x, j) for j in range(width)]
-
-def rows():
-    return [row(i) for i in range(height)]
-
-def columns():
-    return [column(i) for i in range(width)]
-
-# Utility function to e.g. read a row or column from a given cell outside the grid.
-def row_or_column(start, pos=None):
-    if pos == None:
-        pos = only([i for (i, j) in zip(start, (height, width)) if 0 <= i < j])
-    opts = [start[0] < 0, start[1] >= width, start[0] >= height, start[1] < 0]
-    d = opts.index(True) if True in opts else orth_dir.index(start)
-    return (rows() if d % 2 else columns())[pos][::(-1 if d in (1, 2) else 1)]
-
-# Get all edges (as 2-tuples of positions)
-def edges(diag=False):
-    return [(i, j) for i in inds() for j in neighbors(i, diag)]
-
-# Get all edges with a given cell
-def edges_around(x, diag=False):
-    return [(x, j) for j in neighbors(x, diag)]
-
 def at(x, i):
     return x[i[0]][i[1]]
 
@@ -157,6 +114,8 @@ def read_model_raw(m, x):
         return {i: read_model_raw(m, x[i]) for i in x}
     elif type(x) in (list, tuple):
         return type(x)(read_model_raw(m, i) for i in x)
+    elif given(x):
+        return is_true(x) if is_bool(x) else x.as_long()
     elif type(x) == BoolRef:
         return is_true(m[x])
     elif type(x) == ArithRef:
@@ -164,19 +123,37 @@ def read_model_raw(m, x):
     else:
         raise Exception('Mysterious type passed into read_model_raw')
 
-def neighbors(x, diag=False):
-    r = [plus(x, d) for d in (diag_dir if diag else orth_dir)]
-    return [i for i in r if in_bounds(i)]
-
-def in_bounds(x):
-    return 0 <= x[0] < height and 0 <= x[1] < width
-
-# Unlike the above in_bounds, this returns a z3 constraint.
-def InBounds(x):
-    return And(0 <= x[0], x[0] < height, 0 <= x[1], x[1] < width)
-
-def is_perimeter(x):
-    return 0 == x[0] or height - 1 == x[0] or 0 == x[1] or width - 1 == x[1]
+# Is x a z3 constant value (like True or 3) rather than a variable or a formula?
+# Variables that a problem has been given values for (see Problem.give) are these.
+def given(x):
+    return is_const(x) and x.decl().kind() != z3.Z3_OP_UNINTERPRETED
+
+# A model that also gives the values of given variables (which are values already, so z3 doesn't
+# have them in its models), so genres' show functions can read them like any other.
+class GivenModel(ModelRef):
+    def __init__(self, m):
+        ModelRef.__init__(self, m.model, m.ctx)
+
+    def __getitem__(self, x):
+        return x if given(x) else ModelRef.__getitem__(self, x)
+
+# Is the constraint c decided by the constants in it (which once some variables are given,
+# see Problem.give, it often is)? Returns True or False if so, and c if not. z3's simplifier
+# does the work, but c itself is kept when it isn't decided, since z3 simplifies what it's given anyway.
+def fold(c):
+    if type(c) == bool:
+        return c
+    r = simplify(c)
+    return True if is_true(r) else (False if is_false(r) else c)
+
+# List the variables in a collection of them (of the kind read_model takes).
+def variables(x):
+    if type(x) == dict:
+        return [j for i in x.values() for j in variables(i)]
+    elif type(x) in (list, tuple):
+        return [j for i in x for j in variables(i)]
+    else:
+        return [x]
 
 # This is a display function to show paths,
 # given that they're represented at each cell by four values saying in which directions paths go.
@@ -184,22 +161,31 @@ def show_path(x, blank=' '):
     v = 8 * x[0] + 4 * x[1] + 2 * x[2] + x[3]
     return (blank + '╴╷┐╶─┌┬╵┘│┤└┴├┼')[v]
 
-# And this shows the full path given an edge-to-bool dictionary
-def show_full_path(edges, blank=' '):
-    return '\n'.join(''.join(show_path([edges[(j, plus(j, k))] if in_bounds(plus(j, k)) else False for k in orth_dir], blank)
-    for j in i) for i in inds(flat=False))
-
 # Get an array of z3 variables. Useful for giving a number for each cell, for example.
-def construct_vars(f, prefix, shape, so_far=()):
+# Variables that have been given values (see Problem.give) are those values: givens maps their names
+# to the values, and defaults to the current problem's.
+def construct_vars(f, prefix, shape, so_far=(), givens=None):
+    if not so_far:
+        f = with_givens(f, givens)
     if type(shape) == int:
-        return construct_vars(f, prefix, (shape,), so_far)
+        return construct_vars(f, prefix, (shape,), so_far, givens)
     elif not shape:
         return f(prefix + '-'.join(str(i) for i in so_far))
     else:
         return [construct_vars(f, prefix, shape[1:], so_far + (i,)) for i in range(shape[0])]
 
+# Wrap a variable constructor so that it gives the values of given variables (givens, as above).
+def with_givens(f, givens=None):
+    if givens is None:
+        problem = getattr(_local, 'problem', None)
+        givens = {} if problem is None else problem.givens
+    if not givens:
+        return f
+    return lambda name: givens[name] if name in givens else f(name)
+
 # Same as above, except one z3 variable per edge.
-def construct_edge_vars(f, prefix, edges):
+def construct_edge_vars(f, prefix, edges, givens=None):
+    f = with_givens(f, givens)
     return {(i, j): f(prefix + 'e' + '-' + '-'.join(str(k) for k in i + j)) for (i, j) in edges}
 
 # Some more python utilities
@@ -249,6 +235,12 @@ def parse_regions(x, periods=False, grid=True):
     b = [[(i, j)] for i in range(len(t)) for j in range(len(t[i])) if t[i][j] == '.'] if periods else []
     return (sorted(a + b), t) if grid else sorted(a + b)
 
+# Rename the letters in a grid of them (like the one parse_regions gives) in order of first appearance,
+# so grids with the same regions but different letters for them come out the same.
+def relabel(t):
+    names = {}
+    return [[names.setdefault(j, '.' if j == '.' else str(len(names))) for j in i] for i in t]
+
 # Given a string-format grid with integer clues and a list of regions,
 # return a list of (region index, clue value) pairs. Clues are expected to be
 # in the first cell of each region (in top-bottom, left-right order).
@@ -259,6 +251,17 @@ def parse_clues(c, r):
     r = [(ind, parse_int(t[i][j])) for (ind, (i, j)) in enumerate(firsts)]
     return [i for i in r if i[1] != None]
 
+# Split puzzle text made of several grids (e.g. regions, then clues) into the grids,
+# which are separated by blank lines.
+def blocks(x):
+    r = [[]]
+    for i in x.strip().split('\n'):
+        if i.strip():
+            r[-1].append(i)
+        elif r[-1]:
+            r.append([])
+    return ['\n'.join(i) for i in r]
+
 # Parse a string-format grid of integers (using . for cells without integers).
 def parse_int_grid(g, exc={}):
     return deep_map(lambda x: parse_int(x, exc), to_grid(g), depth=2)
@@ -281,138 +284,883 @@ def refl_locs(locs):
 def normalize_locs(x):
     return tuple(sorted(minus(i, min(x)) for i in x))
 
+# Precomputed geometry for a grid shape: cells, neighbor lists, edges and 2x2 windows.
+# Cells are numbered row by row (cell (i, j) is i * width + j), and neighbors are stored
+# CSR-style: the neighbors of cell k are targets[offsets[k]:offsets[k + 1]]
+# (and sources gives the cell each of those entries comes from, so position p is the edge
+# from sources[p] to targets[p], in the same order as edges).
+# The tuple-based lists that the helpers below hand out are built once here as well,
+# so building constraints doesn't spend time redoing this geometry.
+class Topology:
+    def __init__(self, height, width, diag=False):
+        self.height = height
+        self.width = width
+        self.diag = diag
+        self.cells = tuple((i, j) for i in range(height) for j in range(width))
+        self.rows = tuple(self.cells[i * width:(i + 1) * width] for i in range(height))
+        self.offsets = array('i', [0])
+        self.sources = array('i')
+        self.targets = array('i')
+        adjacent = []
+        for x in self.cells:
+            r = tuple(i for i in (plus(x, d) for d in (diag_dir if diag else orth_dir))
+            if 0 <= i[0] < height and 0 <= i[1] < width)
+            adjacent.append(r)
+            self.sources.extend([self.index(x)] * len(r))
+            self.targets.extend(self.index(i) for i in r)
+            self.offsets.append(len(self.targets))
+        self.adjacent = tuple(adjacent)
+        self.edges = tuple((i, j) for (i, r) in zip(self.cells, self.adjacent) for j in r)
+        self.windows = tuple((x, plus(x, (0, 1)), plus(x, (1, 0)), plus(x, (1, 1)))
+        for x in self.cells if x[0] < height - 1 and x[1] < width - 1)
+        self.rays = {}
+
+    def index(self, x):
+        return x[0] * self.width + x[1]
+
+    # Neighbors of cell number k, as cell numbers.
+    def neighbor_indices(self, k):
+        return self.targets[self.offsets[k]:self.offsets[k + 1]]
+
+    def neighbors(self, x):
+        if 0 <= x[0] < self.height and 0 <= x[1] < self.width:
+            return self.adjacent[x[0] * self.width + x[1]]
+        r = [plus(x, d) for d in (diag_dir if self.diag else orth_dir)]
+        return tuple(i for i in r if 0 <= i[0] < self.height and 0 <= i[1] < self.width)
+
+    # The cells in a straight line from x (not including x itself) in direction orth_dir[d],
+    # out to the edge of the grid. Each is worked out once, the first time it's asked for.
+    def ray(self, x, d):
+        if (x, d) not in self.rays:
+            r = []
+            i = plus(x, orth_dir[d])
+            while 0 <= i[0] < self.height and 0 <= i[1] < self.width:
+                r.append(i)
+                i = plus(i, orth_dir[d])
+            self.rays[(x, d)] = tuple(r)
+        return self.rays[(x, d)]
+
+# Topologies are shared between all problems with the same shape.
+@lru_cache(maxsize=None)
+def topology(height, width, diag=False):
+    return Topology(height, width, diag)
+
+# Which encoding helpers like connected use when not told otherwise:
+# 'int' (integer distances), 'bv' (bit-vector distances), 'tree' (parent pointers with bit-vector depths),
+# 'order' (distances as order literals; see distances below) or 'lazy' (checked during search
+# by a user propagator; see lazy.py). This covers connectivity in connected, ruling out
+# separate loops in path and the region trees in get_sizes.
+default_encoding = os.environ.get('LOGIC_SOLVE_ENCODING', 'int')
+
+# The most cells a grid can have for the order encoding to be used without a bound (see Problem.distances);
+# a distance per cell up to the number of cells is quadratic in the number of cells (the 14x24 nurikabe
+# example already takes 1.6 GB), and the 40x40 yajilin one doesn't fit in memory.
+order_cells = 256
+
+# Whether helpers add constraints that follow from their others but can help z3 propagate
+# (see connected, get_sizes and path). Whether they help depends on the puzzle.
+default_redundant = os.environ.get('LOGIC_SOLVE_REDUNDANT', '') not in ('', '0')
+
+# How genres that can do either build their constraints: 'z3' (through z3's Python API)
+# or 'text' (as SMT-LIB2 text that z3 parses all at once; see smt2.py), which is quicker to build on big grids.
+default_backend = os.environ.get('LOGIC_SOLVE_BACKEND', 'z3')
+
+# Whether problems stream the helpers' constraints straight into their solver (see Problem.emit)
+# rather than returning them, which keeps peak memory down on big grids.
+default_stream = os.environ.get('LOGIC_SOLVE_STREAM', '') not in ('', '0')
+
+# Whether solve runs a genre's deduction rules first (see deduce.py), adding the cells they settle as unit constraints.
+default_deduce = os.environ.get('LOGIC_SOLVE_DEDUCE', '') not in ('', '0')
+
+# All the state that used to live in module globals (the puzzle grid and its dimensions),
+# together with every helper that depends on it. Each puzzle gets its own Problem, so several
+# puzzles can be built side by side in one process. prefix is prepended to the names of all
+# variables the Problem creates (so two puzzles can share a solver without name clashes),
+# and ctx is the z3 context to create them in (needed when building puzzles in several threads,
+# since a z3 context can't be shared between threads). encoding is the default encoding
+# for helpers that have a choice of them, redundant is whether they add redundant constraints,
+# backend is how genres that have a choice build their constraints, sink is where helpers put their
+# constraints (see emit), and lazy holds the constraints that those helpers leave to be checked during search, which solver() hooks up.
+class Problem:
+    def __init__(self, g, prefix='', ctx=None, encoding=None, redundant=None, backend=None, stream=None):
+        self.grid = g
+        self.height = len(g)
+        self.width = len(g[0])
+        self.prefix = prefix
+        self.ctx = ctx
+        self.encoding = encoding or default_encoding
+        self.redundant = default_redundant if redundant is None else redundant
+        self.backend = backend or default_backend
+        self.lazy = Lazy()
+        # With stream, the helpers add their constraints straight to the problem's solver.
+        self.sink = Solver(ctx=ctx) if (default_stream if stream is None else stream) else None
+        # Values of variables known from the clues, by name (see give).
+        self.givens = {}
+
+    # Say that some variables, not made yet, have values known from the clues: values maps the cells
+    # (for construct_vars or shaded_vars with this prefix) or edges (for construct_edge_vars) to them.
+    # Those variables are then made as the values themselves, so constraints come out with constants
+    # in, and prune folds those away. Call this before the variables are made.
+    def give(self, prefix, values):
+        for (x, v) in values.items():
+            if type(x[0]) == tuple:
+                name = prefix + 'e-' + '-'.join(str(k) for k in x[0] + x[1])
+            else:
+                name = prefix + '-'.join(str(k) for k in x)
+            self.givens[self.prefix + name] = BoolVal(v, self.ctx) if type(v) == bool else IntVal(v, self.ctx)
+
+    # Constraints without those that given variables' values make always true (see fold).
+    # Every constraint is folded: z3's simplifier is no slower than walking a constraint from Python
+    # to find whether a given value is in it, and doesn't run out of stack on long sums.
+    # Without givens, this is just cons.
+    def prune(self, cons):
+        if not self.givens:
+            return cons
+        return (BoolVal(False, self.ctx) if c is False else c for c in map(fold, cons) if c is not True)
+
+    # A model that can be read for given variables as well.
+    def model(self, m):
+        return GivenModel(m) if self.givens else m
+
+    # Hand constraints (any iterable of them, e.g. a generator) to sink one at a time, and return
+    # an empty list; or without a sink, return them as a list. sink can be a solver (or anything with add)
+    # or a function, and defaults to the problem's own. Helpers that make constraints take a sink
+    # and do this, so with one, the constraints never all sit in a Python list at once.
+    def emit(self, cons, sink=None):
+        if sink is None:
+            sink = self.sink
+        cons = self.prune(cons)
+        if sink is None:
+            return list(cons)
+        add = sink.add if hasattr(sink, 'add') else sink
+        for i in cons:
+            add(i)
+        return []
+
+    # Make a solver for this problem. Use this rather than z3's Solver directly, since
+    # any lazily-checked constraints need to be attached to the solver.
+    # With stream, this is the solver the helpers' constraints are already in (so there's only one).
+    def solver(self):
+        s = Solver(ctx=self.ctx) if self.sink is None else self.sink
+        if self.lazy.constraints and getattr(s, 'propagator', None) is None:
+            s.propagator = LazyPropagator(s, self.lazy)
+        return s
+
+    def topology(self, diag=False):
+        return topology(self.height, self.width, bool(diag))
+
+    # Get list of positions in the puzzle as tuples (the standard form of positions used by this library).
+    def inds(self, flat=True):
+        if flat:
+            return list(self.topology().cells)
+        else:
+            return [list(i) for i in self.topology().rows]
+
+    # Get the grid position opposite a given position (under 180-degree rotation).
+    def sym_op(self, x):
+        return (self.height - x[0] - 1, self.width - x[1] - 1)
+
+    def column(self, x):
+        if type(x) == tuple:
+            return self.column(x[1])
+        return [(i, x) for i in range(self.height)]
+
+    def row(self, x):
+        if type(x) == tuple:
+            return self.row(x[0])
+        return [(x, j) for j in range(self.width)]
+
+    def rows(self):
+        return [self.row(i) for i in range(self.height)]
+
+    def columns(self):
+        return [self.column(i) for i in range(self.width)]
+
+    # Utility function to e.g. read a row or column from a given cell outside the grid.
+    def row_or_column(self, start, pos=None):
+        if pos == None:
+            pos = only([i for (i, j) in zip(start, (self.height, self.width)) if 0 <= i < j])
+        opts = [start[0] < 0, start[1] >= self.width, start[0] >= self.height, start[1] < 0]
+        d = opts.index(True) if True in opts else orth_dir.index(start)
+        return (self.rows() if d % 2 else self.columns())[pos][::(-1 if d in (1, 2) else 1)]
+
+    # Get all edges (as 2-tuples of positions)
+    def edges(self, diag=False):
+        return list(self.topology(diag).edges)
+
+    # Get all edges with a given cell
+    def edges_around(self, x, diag=False):
+        return [(x, j) for j in self.neighbors(x, diag)]
+
+    def neighbors(self, x, diag=False):
+        return list(self.topology(diag).neighbors(x))
+
+    def in_bounds(self, x):
+        return 0 <= x[0] < self.height and 0 <= x[1] < self.width
+
+    # Unlike the above in_bounds, this returns a z3 constraint.
+    def InBounds(self, x):
+        return And(0 <= x[0], x[0] < self.height, 0 <= x[1], x[1] < self.width)
+
+    def is_perimeter(self, x):
+        return 0 == x[0] or self.height - 1 == x[0] or 0 == x[1] or self.width - 1 == x[1]
+
+    # And this shows the full path given an edge-to-bool dictionary
+    def show_full_path(self, edges, blank=' '):
+        return '\n'.join(''.join(show_path([edges[(j, plus(j, k))] if self.in_bounds(plus(j, k)) else False for k in orth_dir], blank)
+        for j in i) for i in self.inds(flat=False))
+
+    # Wrap a z3 variable constructor (Int, Bool, ...) so it makes variables in this problem's context.
+    def var_maker(self, f):
+        return f if self.ctx is None else (lambda name: f(name, self.ctx))
+
+    # Like the module-level construct_vars, but with this problem's prefix and context.
+    def construct_vars(self, f, prefix, shape):
+        return construct_vars(self.var_maker(f), self.prefix + prefix, shape, givens=self.givens)
+
+    # Like the module-level construct_edge_vars, but with this problem's prefix and context.
+    def construct_edge_vars(self, f, prefix, edges):
+        return construct_edge_vars(self.var_maker(f), self.prefix + prefix, edges, givens=self.givens)
+
+    # A single z3 variable, with this problem's prefix and context.
+    def var(self, f, name):
+        return self.var_maker(f)(self.prefix + name)
+
+    def positioning(self, locs, refl=True):
+        pos = [locs, rot_locs(locs), rot_locs(rot_locs(locs)),
+        rot_locs(rot_locs(rot_locs(locs)))]
+        if refl:
+            pos += [refl_locs(i) for i in pos]
+        r = [tuple(plus(j, k) for k in i) for i in pos for j in self.inds()]
+        return sorted(set(i for i in r if all(self.in_bounds(j) for j in i)))
+
+    # A special case of construct_vars, typically used when certain cells are shaded.
+    def shaded_vars(self, s):
+        return self.construct_vars(Bool, s, (self.height, self.width))
+
+    # Distances for the eager encodings of connected, path and get_sizes: returns a table
+    # of distance variables, less (where less(i, j) says cell i's distance is less than cell j's)
+    # and any constraints the distances need (an iterable of them). 'int' and anything unknown give Ints;
+    # 'bv' and 'tree' give bit-vectors just wide enough to number every cell (which z3 turns
+    # into Booleans); 'order' gives each cell a list of Bools saying its distance is at least
+    # 1, 2, ..., bound. That's a Bool for every cell and distance, and as many implications for
+    # every pair of neighbors, so it needs a bound: one small enough to build, and big enough
+    # for every distance (a smaller one rules out anything needing longer distances).
+    # Without one, the bound is the number of cells, which is always enough, but only on grids
+    # of up to order_cells cells; on bigger ones, this raises ValueError.
+    def distances(self, cs, encoding, bound=None):
+        shape = (self.height, self.width)
+        if encoding in ('bv', 'tree'):
+            bits = (self.height * self.width).bit_length()
+            dist = self.construct_vars(lambda name, *ctx: BitVec(name, bits, *ctx), cs, shape)
+            return dist, (lambda i, j: ULT(at(dist, i), at(dist, j))), ()
+        elif encoding == 'order':
+            if bound is None and self.height * self.width > order_cells:
+                raise ValueError('the order encoding needs a bound on grids of over %d cells' % order_cells)
+            bound = bound or self.height * self.width
+            dist = self.construct_vars(Bool, cs + 'o', shape + (bound,))
+            cons = (Implies(at(dist, i)[k], at(dist, i)[k - 1]) for i in self.inds() for k in range(1, bound))
+            # i's distance is less than j's iff j's is at least 1, and at least k + 1 whenever i's is at least k.
+            less = lambda i, j: And(at(dist, j)[0], Not(at(dist, i)[-1]),
+            *[Implies(at(dist, i)[k - 1], at(dist, j)[k]) for k in range(1, bound)])
+            return dist, less, cons
+        dist = self.construct_vars(Int, cs, shape)
+        return dist, (lambda i, j: at(dist, i) < at(dist, j)), ()
+
+    # checks that regions are connected.
+    # rv: table of regions (generally for genres like fillomino,
+    # where this is computed by z3).
+    # included: is this cell in a region at all, or is it somehow not in any regions?
+    # base: is this cell a "region base"? Generally you want to somehow make sure each region
+    # has only one base.
+    # cs: string to name z3 variables using.
+    # diag: are diagonal connections allowed?
+    # rect: must regions be rectangles? (like in shikaku)
+    # encoding: 'int', 'bv' and 'order' give every cell a distance (see distances above)
+    # that must increase along some neighbor until a base; 'tree' instead has every included cell
+    # that isn't a base pick a parent among its neighbors, with a greater depth; 'lazy' instead checks
+    # connectivity during search (there's then no dist to return).
+    # bound: for 'order', the bound on distances.
+    # sink: where the constraints go (see emit); the ones returned are any that didn't go there.
+    # With redundant constraints, every included cell other than a base has an included neighbor
+    # in its region (which the distances or the lazy check imply, but only indirectly).
+    def connected(self, rv, included, base, cs, **kwargs):
+        diag = bool(kwargs.get('diag'))
+        rect = bool(kwargs.get('rect'))
+        encoding = kwargs.get('encoding') or self.encoding
+        sink = kwargs.get('sink')
+        topo = self.topology(diag)
+        cons_rect = (self.rectangular_window(rv, included, a) for a in self.topology().windows) if rect else ()
+        cons_red = (Implies(included(i), Or(base(i), *[And(included(j), eq(at(rv, i), at(rv, j)))
+        for j in topo.neighbors(i)])) for i in topo.cells) if self.redundant else ()
+        if encoding == 'lazy':
+            literal = self.lazy.literal
+            inc = [literal(included(i)) for i in topo.cells]
+            # If being included is just a cell's (Bool) region value, or its negation,
+            # included neighbors are always in the same region, so the link needn't be watched.
+            own = [inc[k] ^ literal(at(rv, i)) if is_bool(at(rv, i)) else None for (k, i) in enumerate(topo.cells)]
+            link = {}
+            for (i, j) in topo.edges:
+                a, b = topo.index(i), topo.index(j)
+                if (j, i) in link:
+                    link[(i, j)] = link[(j, i)]
+                elif own[a] in (0, 1) and own[a] == own[b]:
+                    link[(i, j)] = 0
+                else:
+                    link[(i, j)] = literal(eq(at(rv, i), at(rv, j)))
+            self.lazy.add(Connectivity(topo, inc, [literal(base(i)) for i in topo.cells], [link[i] for i in topo.edges]))
+            return self.emit(chain(cons_rect, cons_red), sink), None
+        adj = topo.neighbors
+        dist, less, cons_dist = self.distances(cs, encoding, kwargs.get('bound'))
+        if encoding == 'tree':
+            parent = self.construct_edge_vars(Bool, cs + 'p', topo.edges)
+            cons = chain((Implies(included(i), Or(base(i), *[parent[(i, j)] for j in adj(i)])) for i in topo.cells),
+            (Implies(parent[(i, j)], And(included(j), eq(at(rv, i), at(rv, j)), less(i, j))) for (i, j) in topo.edges),
+            cons_rect, cons_red, (AtMost(*[parent[(i, j)] for j in adj(i)], 1) for i in topo.cells))
+        else:
+            cons = chain((Implies(included(i), Or(base(i), *[And(
+            included(j), eq(at(rv, i), at(rv, j)), less(i, j)
+            ) for j in adj(i)])) for i in topo.cells), cons_rect, cons_red)
+        return self.emit(chain(cons, cons_dist), sink), dist
+
+    # Do two z3 region grids agree about which regions everything is in, except for naming of course?
+    def same_regions(self, r1, r2):
+        return [eq(at(r1, i), at(r1, j)) == eq(at(r2, i), at(r2, j)) for (i, j) in self.edges()]
+
+    # Get sizes of regions (defined by rv).
+    # included, base: as in connected above (except that base might care about region value)
+    # nonbase: is this cell not a base cell? not always the negation of base
+    # bc you can sometimes do tricks, like require the base to be minimal in the region in some way
+    # and thus require nonbase cells to be "greater" than the base.
+    # cs: as above
+    # same_size: does the size have to be the same for all cells in the same region?
+    # This should be true generally. Though sometimes (read: in fillomino) it's wise to
+    # number non-adjacent regions the same, in the specific case of fillomino they have the same size.
+    # However, this follows from other constraints there so is redundant and slows things down.
+    # This function is generally slower than other options. I've sped up islands and nurikabe
+    # by replacing it by a sum.
+    # Also, it's important to note that if there's no region number specification,
+    # and some cells don't belong to regions, then the cells not in regions
+    # can have the same region numbers as cells in regions.
+    # Every included cell that isn't a base uses exactly one edge (edge_use) towards its base,
+    # and edge_size is the number of cells on the far side of a used edge.
+    # encoding: by default ('int', or 'lazy', which has nothing to check lazily here) there are no distances
+    # (dist is None): going around a cycle of used edges, each edge size would have to be bigger
+    # than the next, so the sizes themselves rule out cycles, apart from two cells using the edge
+    # between them both ways. The others (see distances above) also require distances
+    # to decrease along edge_use.
+    def get_sizes(self, included, base, nonbase, cs, same_size=True, encoding=None, bound=None, sink=None):
+        encoding = encoding or self.encoding
+        shape = (self.height, self.width)
+        adj = self.topology().neighbors
+        edges = self.topology().edges
+        rv = self.construct_vars(Int, cs + 'r', shape)
+        edge_use = self.construct_edge_vars(Bool, cs + 'e', edges)
+        edge_size = self.construct_edge_vars(Int, cs + 'es', edges)
+        size = self.construct_vars(Int, cs + 's', shape)
+        if encoding in ('int', 'lazy'):
+            dist = None
+            cons = (Not(And(edge_use[(i, j)], edge_use[(j, i)])) for (i, j) in edges if i < j)
+            less = lambda i, j: True
+        else:
+            dist, less, cons = self.distances(cs + 'd', encoding, bound)
+        cells = self.topology().cells
+        cons = chain(cons, (Implies(included(i, at(rv, i)), If(Or(*[edge_use[(i, j)] for j in adj(i)]),
+        And(nonbase(i, at(rv, i)), ExactlyOne(*[edge_use[(i, j)] for j in adj(i)])), base(i, at(rv, i))))
+        for i in cells))
+        cons = chain(cons, (Implies(edge_use[(i, j)], And(included(i, at(rv, i)), included(j, at(rv, j)),
+        less(j, i), eq(at(rv, i), at(rv, j))))
+        for (i, j) in edges))
+        cons = chain(cons, (edge_size[(i, j)] == If(Or(edge_use[(i, j)], edge_use[(j, i)]),
+        1 + sum(edge_size[(j, k)] for k in adj(j) if i != k), 0) for (i, j) in edges))
+        cons = chain(cons, (edge_size[(i, j)] >= 0 for (i, j) in edges))
+        cons = chain(cons, (at(size, i) == 1 + sum(edge_size[(i, j)] for j in adj(i)) for i in cells))
+        # The i < j condition here avoids duplication. This condition speeds stuff up quite a bit, except when it doesn't.
+        if same_size:
+            cons = chain(cons, (Implies(eq(at(rv, i), at(rv, j)), eq(at(size, i), at(size, j))) for i in cells for j in adj(i) if i < j))
+        # Redundant: the cells at either end of a used edge are in the same tree, so have the same size.
+        if self.redundant:
+            cons = chain(cons, (Implies(edge_use[(i, j)], at(size, i) == at(size, j)) for (i, j) in edges))
+        return self.emit(cons, sink), rv, dist, edge_use, edge_size, size
+
+    # Define a path.
+    # circ: does the path make a loop (True), or have a potentially different start and end (False)
+    # cs: as above
+    # return_dist: do we return distances along the path?
+    # encoding: 'int', 'bv' and 'order' give cells on the path distances (see distances above)
+    # that decrease along the path to the root (which is any cell on a loop), which rules out
+    # separate loops; 'tree' has every cell on the path other than the root pick a parent
+    # along the path, with a smaller depth; 'lazy' only has the degree constraints up front
+    # and rules out separate loops during search (then there are no distances to return,
+    # and the root is unused).
+    # bound: for 'order', the bound on distances.
+    def path(self, circ, cs, return_dist=False, encoding=None, bound=None, sink=None):
+        encoding = encoding or self.encoding
+        topo = self.topology()
+        adj = topo.neighbors
+        edge_vars = self.construct_edge_vars(Bool, cs, topo.edges)
+        if circ:
+            root = self.var(Int, cs + 'rx'), self.var(Int, cs + 'ry')
+            cons = [self.InBounds(root)]
+        else:
+            start = self.var(Int, cs + 'sx'), self.var(Int, cs + 'sy')
+            end = self.var(Int, cs + 'ex'), self.var(Int, cs + 'ey')
+            cons = [self.InBounds(start), self.InBounds(end)]
+        r = root if circ else start
+        if circ:
+            cons = chain(cons, (Or(PbEq([(edge_vars[(i, j)], 1) for j in adj(i)], 0), PbEq([(edge_vars[(i, j)], 1) for j in adj(i)], 2)) for i in topo.cells))
+        else:
+            cons = chain(cons, (Or(PbEq([(edge_vars[(i, j)], 1) for j in adj(i)], 0), If(Or(eq(i, start), eq(i, end)),
+            PbEq([(edge_vars[(i, j)], 1) for j in adj(i)], 1), PbEq([(edge_vars[(i, j)], 1) for j in adj(i)], 2))) for i in topo.cells))
+        if encoding == 'lazy':
+            literal = self.lazy.literal
+            self.lazy.add(Loop(topo, [literal(edge_vars[min(e), max(e)]) for e in topo.edges], circ))
+            dist = None
+        elif encoding == 'tree':
+            dist, less, c = self.distances(cs + 'd', encoding, bound)
+            parent = self.construct_edge_vars(Bool, cs + 'p', topo.edges)
+            cons = chain(cons, c, (Implies(parent[(i, j)], And(edge_vars[(i, j)], less(j, i))) for (i, j) in topo.edges),
+            (Implies(self.some_edge(edge_vars, i), Or(eq(i, r), *[parent[(i, j)] for j in adj(i)])) for i in topo.cells),
+            (AtMost(*[parent[(i, j)] for j in adj(i)], 1) for i in topo.cells))
+        else:
+            dist, less, c = self.distances(cs + 'd', encoding, bound)
+            cons = chain(cons, c, (Implies(self.some_edge(edge_vars, i),
+            Or(eq(i, r), *[And(edge_vars[(i, j)], less(j, i)) for j in adj(i)])) for i in topo.cells))
+        cons = chain(cons, self.symmetric_edges(edge_vars, sink=False))
+        # Redundant: color the grid like a checkerboard. Steps along the path alternate colors,
+        # so a loop has as many cells of each color, and a path at most one more of one than the other.
+        if self.redundant:
+            d = sum(If(self.some_edge(edge_vars, i), 1 - 2 * (sum(i) % 2), 0) for i in topo.cells)
+            cons = chain(cons, [d == 0] if circ else [d <= 1, d >= -1])
+        cons = self.emit(cons, sink)
+        if circ:
+            return (cons, edge_vars, root) + (dist,) * return_dist
+        else:
+            return (cons, edge_vars, start, end) + (dist,) * return_dist
+
+    # Does some edge around x in this edge-variable table e have a True variable?
+    def some_edge(self, e, x, diag=False):
+        return Or(*[e[(x, y)] for y in self.topology(diag).neighbors(x)])
+
+    # Propagate stuff in various directions. Useful for e.g. Cave, Skyscraper, Yajilin.
+    def look(self, f, tf, cs, sink=None):
+        findings = self.construct_vars(tf, cs, (4, self.height, self.width))
+        cons = (at(findings[di], i) == f(i, d, False, plus(i, d), at(findings[di], plus(i, d)))
+        if self.in_bounds(plus(i, d)) else (at(findings[di], i) == f(i, d, True, i, 0))
+        for i in self.inds() for (di, d) in enumerate(orth_dir))
+        return self.emit(cons, sink), findings
+
+    # look makes a variable for every cell and direction, chained along the grid, which is right
+    # when the genre needs them all. When only some cells' rays are needed (e.g. those of clues),
+    # these build just those, over the ray's cells (see Topology.ray), with no new variables.
+
+    def ray(self, x, d):
+        return list(self.topology().ray(x, d))
+
+    # Bool terms for the ray from x in direction d, as many of them true as cells counted along it:
+    # those where counted holds (all of them if it's None), up to the first one where stop holds
+    # (if given, which isn't counted either). Only the first limit cells are looked at.
+    def ray_terms(self, x, d, counted=None, stop=None, limit=None):
+        terms = []
+        clear = True
+        for i in self.topology().ray(x, d)[:limit]:
+            if stop is not None:
+                clear = Not(stop(i)) if clear is True else And(clear, Not(stop(i)))
+            terms.append(clear if counted is None else (counted(i) if clear is True else And(clear, counted(i))))
+        return terms
+
+    # Constraint that the number of cells counted (as in ray_terms) along the rays from x
+    # in the directions ds is n ('==' in cmp), at least n ('>=') or at most n ('<=').
+    # For a number n, this is a PbEq, AtLeast or AtMost. When every cell up to stop counts,
+    # no cell further along a ray than n + 1 is looked at (one that far already makes the count more than n).
+    def ray_count(self, x, ds, n, counted=None, stop=None, cmp='=='):
+        limit = n + 1 if type(n) == int and counted is None else None
+        terms = [t for d in ds for t in self.ray_terms(x, d, counted, stop, limit)]
+        if not terms:
+            # The rays run straight off the grid, so the count is 0 (and PbEq, AtLeast and AtMost need terms).
+            holds = {'==': 0 == n, '>=': 0 >= n, '<=': 0 <= n}[cmp]
+            return BoolVal(holds, self.ctx) if type(n) == int else holds
+        if type(n) != int:
+            total = sum(If(t, 1, 0) for t in terms)
+            return {'==': total == n, '>=': total >= n, '<=': total <= n}[cmp]
+        elif cmp == '>=':
+            return AtLeast(*terms, n) if n > 0 else BoolVal(True, self.ctx)
+        elif cmp == '<=':
+            return AtMost(*terms, n) if n >= 0 else BoolVal(False, self.ctx)
+        return PbEq([(t, 1) for t in terms], n) if n >= 0 else BoolVal(False, self.ctx)
+
+    # List of constraints about whether all neighbor pairs i and j have a certain property f
+    # (should be symmetric, because we only include i < j).
+    def all_neighbors(self, f, diag=False, sink=None):
+        return self.emit((f(i, j) for (i, j) in self.topology(diag).edges if i < j), sink)
+
+    # Similar to above, list of constraints about whether all 2x2 groups of 4 cells have a certain property f.
+    def all_2x2(self, f, sink=None):
+        return self.emit((f(*i) for i in self.topology().windows), sink)
+
+    # Checks whether a region is rectangular.
+    def rectangular_regions(self, rv, included=lambda _: True, sink=None):
+        return self.all_2x2(lambda *a: self.rectangular_window(rv, included, a), sink)
+
+    # The rectangular_regions constraint for one 2x2 window a.
+    def rectangular_window(self, rv, included, a):
+        return And(
+        Implies(And(included(a[0]), included(a[3]), eq(at(rv, a[0]), at(rv, a[3]))), And(eq(at(rv, a[0]), at(rv, a[1])), eq(at(rv, a[0]), at(rv, a[2])))),
+        Implies(And(included(a[1]), included(a[2]), eq(at(rv, a[1]), at(rv, a[2]))), And(eq(at(rv, a[1]), at(rv, a[0])), eq(at(rv, a[1]), at(rv, a[3])))))
+
+    # Checks whether each edge is the same as its reverse in some edge table. Useful for e.g.
+    # undirected loop genres. With sink=False, this gives the constraints lazily (as a generator)
+    # rather than emitting them.
+    def symmetric_edges(self, x, sink=None):
+        cons = (eq(x[i], x[i[::-1]]) for i in self.topology().edges)
+        return cons if sink is False else self.emit(cons, sink)
+
+# The module-level helpers below work on the current problem, which set_problem sets.
+# The current problem is per-thread, so separate threads can each work on their own puzzle
+# (though each thread then needs its own z3 context; see Problem above).
+_local = threading.local()
+
+# These mirror the current problem, for older code that reads them directly.
+grid = None
+height = None
+width = None
+
+# Initializes problem global data so functions from this file can use it
+def set_problem(g, **kwargs):
+    return use_problem(Problem(g, **kwargs))
+
+# Make an existing problem the current one.
+def use_problem(problem):
+    global grid
+    global height
+    global width
+    _local.problem = problem
+    grid = problem.grid
+    height = problem.height
+    width = problem.width
+    return problem
+
+# Most of a genre's constraints often don't depend on the clues, just on the size of the grid.
+# A genre module can split its build into template (run with the problem set, returns the constraints
+# that hold for every puzzle of that size, and whatever variables the clues need) and clues
+# (puzzle data and those variables to the clue constraints, the primary variables and show, as build returns).
+# A Template is the first half, built once into a solver; each puzzle's clue constraints then go
+# in their own scope on that solver, so puzzles of the same size skip building the rest, and keep
+# what z3 learned from it on earlier puzzles. This is only for genres whose puzzle data is the grid itself.
+# Any lazily-checked constraints (e.g. connected with the 'lazy' encoding) have to be in the template,
+# and every variable made through the problem, so it's in the problem's context.
+class Template:
+    def __init__(self, module, height, width):
+        tm = time.time()
+        self.problem = set_problem([[None] * width for _ in range(height)])
+        self.cons, self.vars = module.template()
+        self.solver = self.problem.solver()
+        self.solver.add(*self.cons)
+        self.time = time.time() - tm
+        self.uses = 0
+
+# Templates are kept per thread (like the current problem), for each genre, size and setting
+# that changes the constraints.
+def get_template(module, height, width):
+    if not hasattr(_local, 'templates'):
+        _local.templates = {}
+    k = (module.__name__, height, width, default_encoding, default_redundant)
+    if k not in _local.templates:
+        _local.templates[k] = Template(module, height, width)
+    return _local.templates[k]
+
+def solver():
+    return current_problem().solver()
+
+# Constraint ruling out model m, as far as the primary variables (anything variables takes) go.
+# Auxiliary variables (distances, roots and so on) are left out, since different values
+# of them don't make a different solution.
+def block(m, primary):
+    return Or(*[i != m.eval(i, model_completion=True) for i in variables(primary) if not given(i)])
+
+# Look for a solution other than m (a model from solver s) in s, blocking m on the primary variables.
+# This happens in s itself, so what z3 learned finding m is reused; the blocking clause is removed
+# afterwards. Returns the check result and the other solution (None if there isn't one).
+def another_solution(s, m, primary):
+    s.push()
+    s.add(block(m, primary))
+    r = s.check()
+    m2 = s.model() if r == sat else None
+    s.pop()
+    return r, m2
+
+# Check whether the constraints in solver s have exactly one solution (on the primary variables).
+# Returns 'unique', 'multiple' or 'none' ('unknown' if z3 gives up), and the models found.
+def uniqueness(s, primary):
+    r = s.check()
+    if r != sat:
+        return ('none' if r == unsat else 'unknown'), []
+    m = s.model()
+    r, m2 = another_solution(s, m, primary)
+    if r == sat:
+        return 'multiple', [m, m2]
+    return ('unique' if r == unsat else 'unknown'), [m]
+
+# Yield the solutions of the constraints in solver s one at a time, read from the primary variables
+# (as read_model_raw does), up to limit of them if given. Each solution is blocked on the primary
+# variables only, so it isn't found again with just different auxiliary variables. The blocking
+# clauses go in a scope that's popped once the generator is done with (or closed).
+def iter_solutions(s, primary, limit=None):
+    s.push()
+    try:
+        n = 0
+        while (limit is None or n < limit) and s.check() == sat:
+            m = s.model()
+            yield read_model_raw(m, primary)
+            s.add(block(m, primary))
+            n += 1
+    finally:
+        s.pop()
+
+# Of the (variable, value) pairs in cands (Bool variables, and their values in some solution of
+# the constraints in solver s), find those that hold in every solution. Each check asks for a solution
+# differing from the candidates somewhere; that solution rules out every candidate it differs on,
+# and once there's none, all the remaining candidates are forced. With a unique solution,
+# that's just one check.
+def forced_values(s, cands):
+    while cands:
+        s.push()
+        s.add(Or(*[Not(v) if val else v for (v, val) in cands]))
+        r = s.check()
+        m = s.model() if r == sat else None
+        s.pop()
+        if r != sat:
+            return cands if r == unsat else []
+        cands = [(v, val) for (v, val) in cands if is_true(m.eval(v, model_completion=True)) == val]
+    return []
+
+# forced_values in another process, on constraints given as SMT-LIB text and candidates given by name.
+def forced_values_from(smt2, cands):
+    s = Solver()
+    s.from_string(smt2)
+    return [(str(v), val) for (v, val) in forced_values(s, [(Bool(n), val) for (n, val) in cands])]
+
+# Work out which of a grid (or other collection) of Bool primary variables, e.g. from shaded_vars,
+# have the same value in every solution of the constraints in solver s. Returns the grid
+# with each variable replaced by its forced value, or None if it isn't forced
+# (or None altogether if there's no solution). With workers, the candidates are split between
+# that many processes; this needs the constraints in SMT-LIB form, so not lazy ones.
+def backbone(s, grid, workers=None):
+    if s.check() != sat:
+        return None
+    m = s.model()
+    cands = [(v, is_true(m.eval(v, model_completion=True))) for v in variables(grid) if not given(v)]
+    if workers:
+        assert getattr(s, 'propagator', None) is None, 'lazy constraints can\'t be sent to other processes'
+        smt2 = s.sexpr()
+        with multiprocessing.get_context('spawn').Pool(workers) as pool:
+            parts = pool.starmap(forced_values_from, [(smt2, [(str(v), val) for (v, val) in cands[i::workers]])
+            for i in range(workers)])
+        forced = dict(i for p in parts for i in p)
+    else:
+        forced = {str(v): val for (v, val) in forced_values(s, cands)}
+    return deep_map(lambda v: is_true(v) if given(v) else forced.get(str(v)), grid)
+
+# Genre modules each have a parse function (puzzle text to puzzle data) and a build function
+# (puzzle data to constraints), which sets the problem and returns the constraints, the variables
+# the solution is read from, and a function displaying a model as text. solve runs these
+# on one puzzle; the times are for building the constraints and for solving.
+# With stats, z3's statistics for the solve are included too. With unique, a solution
+# is checked to be the only one (see uniqueness), and the result is 'unique', 'multiple'
+# (with the second solution too) or 'none'; checked is the time that took.
+# Results are looked up in, and saved to, cache (a cache.SolutionCache), or cache.default_cache()
+# if that's not given; a result from the cache has cached set. Runs with stats don't use the cache,
+# and neither do results z3 can't decide. With template, genres that have one (see Template)
+# are solved from it; then template is how long building that took, the first time it's used.
+# With deduce (default_deduce if not given), the cells a genre's rules settle (see deduce.py)
+# are added as unit constraints on primary; deduced is how many there were (None if the rules found
+# a contradiction, which is left for z3 to find too) and deduction the time the rules took.
+def solve(build, puzzle, stats=False, unique=False, cache=None, template=False, deduce=None):
+    module = sys.modules[build.__module__]
+    key = None
+    if not stats:
+        if cache is None:
+            cache = default_cache()
+        if cache is not None:
+            genre = os.path.splitext(os.path.basename(module.__file__))[0]
+            key = puzzle_key(genre, puzzle, getattr(module, 'canonical', None),
+            default_encoding, default_redundant, unique)
+            out = cache.get(key)
+            if out is not None:
+                out['cached'] = True
+                return out
+    template = template and hasattr(module, 'template')
+    if template:
+        t = get_template(module, len(puzzle), len(puzzle[0]))
+        tm = time.time()
+        t.problem.grid = puzzle
+        use_problem(t.problem)
+        # The scope starts before clues, since with stream its helpers add to the solver as they go.
+        s = t.solver
+        s.push()
+        lazy = len(t.problem.lazy.constraints)
+        cons, primary, show = module.clues(puzzle, t.vars)
+        # The template's solver watches only the lazy constraints there were when it was made.
+        assert len(t.problem.lazy.constraints) == lazy, module.__name__ + '.clues added lazy constraints'
+    else:
+        tm = time.time()
+        cons, primary, show = build(puzzle)
+        s = solver()
+    problem = current_problem()
+    deduce = (default_deduce if deduce is None else deduce) and hasattr(module, 'rules')
+    if deduce:
+        td = time.time()
+        fixed = settled(module, puzzle)
+        cell = (lambda k: at(primary, k)) if type(primary) in (list, tuple) else primary.__getitem__
+        cons = chain(cons, [cell(k) if v else Not(cell(k)) for (k, v) in (fixed or {}).items()])
+        td = time.time() - td
+    cons = list(problem.prune(cons))
+    t0 = time.time()
+    s.add(*cons)
+    r = s.check()
+    t1 = time.time()
+    out = {'result': str(r), 'constructed': t0 - tm, 'solved': t1 - t0,
+    'solution': show(problem.model(s.model())) if r == sat else None}
+    if deduce:
+        out['deduced'] = None if fixed is None else len(fixed)
+        out['deduction'] = td
+    if template:
+        if not t.uses:
+            out['template'] = t.time
+        t.uses += 1
+    if unique:
+        if r == sat:
+            r2, m2 = another_solution(s, s.model(), primary)
+            out['result'] = 'multiple' if r2 == sat else ('unique' if r2 == unsat else 'unknown')
+            out['checked'] = time.time() - t1
+            if m2 is not None:
+                out['second'] = show(problem.model(m2))
+        elif r == unsat:
+            out['result'] = 'none'
+    if stats:
+        st = s.statistics()
+        out['statistics'] = {k: st.get_key_value(k) for k in st.keys()}
+    if template:
+        s.pop()
+    if key is not None and out['result'] != 'unknown':
+        cache.put(key, out)
+    return out
+
+# The running profiler, if any (see profiler.py); family labels constraints for it.
+profiler = None
+
+_no_family = contextlib.nullcontext()
+
+# Label the constraints a genre adds to the list cons inside a with block, e.g.
+# with family('clue sizes', cons): cons += [...]
+# so the profiler reports the time, constraints and memory they take under that name.
+# Without a profiler running this does nothing.
+def family(name, cons=None):
+    return _no_family if profiler is None else profiler.family(name, cons)
+
+# Solve one puzzle and print the results, the way genre scripts do when run directly.
+def run(build, puzzle):
+    r = solve(build, puzzle)
+    print('constructed', r['constructed'])
+    print(r['result'])
+    print('done', r['solved'])
+    if r['solution'] is not None:
+        print(r['solution'])
+
+def current_problem():
+    problem = getattr(_local, 'problem', None)
+    assert problem is not None, 'set_problem must be called first'
+    return problem
+
+def inds(flat=True):
+    return current_problem().inds(flat)
+
+def sym_op(x):
+    return current_problem().sym_op(x)
+
+def column(x):
+    return current_problem().column(x)
+
+def row(x):
+    return current_problem().row(x)
+
+def rows():
+    return current_problem().rows()
+
+def columns():
+    return current_problem().columns()
+
+def row_or_column(start, pos=None):
+    return current_problem().row_or_column(start, pos)
+
+def edges(diag=False):
+    return current_problem().edges(diag)
+
+def edges_around(x, diag=False):
+    return current_problem().edges_around(x, diag)
+
+def neighbors(x, diag=False):
+    return current_problem().neighbors(x, diag)
+
+def in_bounds(x):
+    return current_problem().in_bounds(x)
+
+def InBounds(x):
+    return current_problem().InBounds(x)
+
+def is_perimeter(x):
+    return current_problem().is_perimeter(x)
+
+def show_full_path(edges, blank=' '):
+    return current_problem().show_full_path(edges, blank)
+
 def positioning(locs, refl=True):
-    pos = [locs, rot_locs(locs), rot_locs(rot_locs(locs)),
-    rot_locs(rot_locs(rot_locs(locs)))]
-    if refl:
-        pos += [refl_locs(i) for i in pos]
-    r = [tuple(plus(j, k) for k in i) for i in pos for j in inds()]
-    return sorted(set(i for i in r if all(in_bounds(j) for j in i)))
-
-# A special case of construct_vars, typically used when certain cells are shaded.
+    return current_problem().positioning(locs, refl)
+
 def shaded_vars(s):
-    return construct_vars(Bool, s, (height, width))
-
-# checks that regions are connected.
-# rv: table of regions (generally for genres like fillomino,
-# where this is computed by z3).
-# included: is this cell in a region at all, or is it somehow not in any regions?
-# base: is this cell a "region base"? Generally you want to somehow make sure each region
-# has only one base.
-# cs: string to name z3 variables using.
-# diag: are diagonal connections allowed?
-# rect: must regions be rectangles? (like in shikaku)
+    return current_problem().shaded_vars(s)
+
+def var(f, name):
+    return current_problem().var(f, name)
+
+def give(prefix, values):
+    return current_problem().give(prefix, values)
+
 def connected(rv, included, base, cs, **kwargs):
-    diag = bool(kwargs.get('diag'))
-    rect = bool(kwargs.get('rect'))
-    dist = construct_vars(Int, cs, (height, width))
-    cons = [Implies(included(i), Or(base(i), *[And(
-    included(j), eq(at(rv, i), at(rv, j)), at(dist, i) < at(dist, j)
-    ) for j in neighbors(i, diag)])) for i in inds()]
-    if rect:
-        cons += rectangular_regions(rv, included)
-    return cons, dist
-
-# Do two z3 region grids agree about which regions everything is in, except for naming of course?
+    return current_problem().connected(rv, included, base, cs, **kwargs)
+
 def same_regions(r1, r2):
-    return [eq(at(r1, i), at(r1, j)) == eq(at(r2, i), at(r2, j)) for (i, j) in edges()]
-
-# Get sizes of regions (defined by rv).
-# included, base: as in connected above (except that base might care about region value)
-# nonbase: is this cell not a base cell? not always the negation of base
-# bc you can sometimes do tricks, like require the base to be minimal in the region in some way
-# and thus require nonbase cells to be "greater" than the base.
-# cs: as above
-# same_size: does the size have to be the same for all cells in the same region?
-# This should be true generally. Though sometimes (read: in fillomino) it's wise to
-# number non-adjacent regions the same, in the specific case of fillomino they have the same size.
-# However, this follows from other constraints there so is redundant and slows things down.
-# This function is generally slower than other options. I've sped up islands and nurikabe
-# by replacing it by a sum.
-# Also, it's important to note that if there's no region number specification,
-# and some cells don't belong to regions, then the cells not in regions
-# can have the same region numbers as cells in regions.
-def get_sizes(included, base, nonbase, cs, same_size=True):
-    rv = construct_vars(Int, cs + 'r', (height, width))
-    dist = construct_vars(Int, cs + 'd', (height, width))
-    edge_use = construct_edge_vars(Bool, cs + 'e', edges())
-    edge_size = construct_edge_vars(Int, cs + 'es', edges())
-    size = construct_vars(Int, cs + 's', (height, width))
-    cons = [at(dist, i) >= 0 for i in inds()]
-    cons += [Implies(included(i, at(rv, i)), If(at(dist, i) == 0, base(i, at(rv, i)),
-    And(nonbase(i, at(rv, i)), ExactlyOne(*[edge_use[(i, j)] for j in neighbors(i)]))))
-    for i in inds()]
-    cons += [Implies(edge_use[(i, j)], And(included(i, at(rv, i)), included(j, at(rv, j)),
-    at(dist, i) == at(dist, j) + 1, eq(at(rv, i), at(rv, j))))
-    for (i, j) in edges()]
-    cons += [edge_size[(i, j)] == If(Or(edge_use[(i, j)], edge_use[(j, i)]),
-    1 + sum(edge_size[(j, k)] for k in neighbors(j) if i != k), 0) for (i, j) in edges()]
-    cons += [edge_size[(i, j)] >= 0 for (i, j) in edges()]
-    cons += [at(size, i) == 1 + sum(edge_size[(i, j)] for j in neighbors(i)) for i in inds()]
-    # The i < j condition here avoids duplication. This condition speeds stuff up quite a bit, except when it doesn't.
-    if same_size:
-        cons += [Implies(eq(at(rv, i), at(rv, j)), eq(at(size, i), at(size, j))) for i in inds() for j in neighbors(i) if i < j]
-    return cons, rv, dist, edge_use, edge_size, size
-
-# Define a path.
-# circ: does the path make a loop (True), or have a potentially different start and end (False)
-# cs: as above
-# return_dist: do we return distances along the path?
-def path(circ, cs, return_dist=False):
-    edge_vars = construct_edge_vars(Bool, cs, edges())
-    cons = []
-    if circ:
-        root = Int(cs + 'rx'), Int(cs + 'ry')
-        cons += [InBounds(root)]
-    else:
-        start = Int(cs + 'sx'), Int(cs + 'sy')
-        end = Int(cs + 'ex'), Int(cs + 'ey')
-        cons += [InBounds(start), InBounds(end)]
-    r = root if circ else start
-    if circ:
-        cons += [Or(PbEq([(edge_vars[(i, j)], 1) for j in neighbors(i)], 0), PbEq([(edge_vars[(i, j)], 1) for j in neighbors(i)], 2)) for i in inds()]
-    else:
-        cons += [Or(PbEq([(edge_vars[(i, j)], 1) for j in neighbors(i)], 0), If(Or(eq(i, start), eq(i, end)),
-        PbEq([(edge_vars[(i, j)], 1) for j in neighbors(i)], 1), PbEq([(edge_vars[(i, j)], 1) for j in neighbors(i)], 2))) for i in inds()]
-    dist = construct_vars(Int, cs + 'd', (height, width))
-    cons += [Implies(some_edge(edge_vars, i),
-    Or(eq(i, r), *[And(edge_vars[(i, j)], at(dist, j) < at(dist, i)) for j in neighbors(i)])) for i in inds()]
-    cons += symmetric_edges(edge_vars)
-    if circ:
-        return (cons, edge_vars, root) + (dist,) * return_dist
-    else:
-        return (cons, edge_vars, start, end) + (dist,) * return_dist
+    return current_problem().same_regions(r1, r2)
+
+def get_sizes(included, base, nonbase, cs, same_size=True, encoding=None, bound=None, sink=None):
+    return current_problem().get_sizes(included, base, nonbase, cs, same_size, encoding, bound, sink)
+
+def path(circ, cs, return_dist=False, encoding=None, bound=None, sink=None):
+    return current_problem().path(circ, cs, return_dist, encoding, bound, sink)
 
-# Does some edge around x in this edge-variable table e have a True variable?
 def some_edge(e, x, diag=False):
-    return Or(*[e[(x, y)] for y in neighbors(x, diag)])
-
-# Propagate stuff in various directions. Useful for e.g. Cave, Skyscraper, Yajilin.
-def look(f, tf, cs):
-    findings = construct_vars(tf, cs, (4, height, width))
-    cons = [at(findings[di], i) == f(i, d, False, plus(i, d), at(findings[di], plus(i, d)))
-    if in_bounds(plus(i, d)) else (at(findings[di], i) == f(i, d, True, i, 0))
-    for i in inds() for (di, d) in enumerate(orth_dir)]
-    return cons, findings
-
-# List of constraints about whether all neighbor pairs i and j have a certain property f
-# (should be symmetric, because we only include i < j).
-def all_neighbors(f, diag=False):
-    return [f(i, j) for i in inds() for j in neighbors(i, diag) if i < j]
-
-# Similar to above, list of constraints about whether all 2x2 groups of 4 cells have a certain property f.
-def all_2x2(f):
-    near = lambda x: [plus(x, (i, j)) for i in (0, 1) for j in (0, 1)]
-    return [f(*near(i)) for i in inds() if all(in_bounds(j) for j in near(i))]
-
-# Checks whether a region is rectangular.
-def rectangular_regions(rv, included=lambda _: True):
-    return all_2x2(lambda *a: And(
-    Implies(And(included(a[0]), included(a[3]), eq(at(rv, a[0]), at(rv, a[3]))), And(eq(at(rv, a[0]), at(rv, a[1])), eq(at(rv, a[0]), at(rv, a[2])))),
-    Implies(And(included(a[1]), included(a[2]), eq(at(rv, a[1]), at(rv, a[2]))), And(eq(at(rv, a[1]), at(rv, a[0])), eq(at(rv, a[1]), at(rv, a[3]))))))
-
-# Checks whether each edge is the same as its reverse in some edge table. Useful for e.g.
-# undirected loop genres
-def symmetric_edges(x):
-    return [eq(x[i], x[i[::-1]]) for i in edges()]
+    return current_problem().some_edge(e, x, diag)
+
+def look(f, tf, cs, sink=None):
+    return current_problem().look(f, tf, cs, sink)
+
+def ray(x, d):
+    return current_problem().ray(x, d)
+
+def ray_terms(x, d, counted=None, stop=None, limit=None):
+    return current_problem().ray_terms(x, d, counted, stop, limit)
+
+def ray_count(x, ds, n, counted=None, stop=None, cmp='=='):
+    return current_problem().ray_count(x, ds, n, counted, stop, cmp)
+
+def all_neighbors(f, diag=False, sink=None):
+    return current_problem().all_neighbors(f, diag, sink)
+
+def all_2x2(f, sink=None):
+    return current_problem().all_2x2(f, sink)
+
+def rectangular_regions(rv, included=lambda _: True, sink=None):
+    return current_problem().rectangular_regions(rv, included, sink)
 
+def symmetric_edges(x, sink=None):
+    return current_problem().symmetric_edges(x, sink)
@@ -1,10 +1,10 @@
-from z3 import Int, And, Not, Or, Solver, is_true
-from lib import set_problem, parse_regions, all_2x2, all_neighbors, at, connected, \
-construct_vars, eq, get_rtable, positioning, shaded_vars
-import time
+from z3 import Int, And, Not, Or, is_true
+from lib import set_problem, parse_regions, relabel, all_2x2, all_neighbors, at, connected, \
+construct_vars, eq, get_rtable, neighbors, positioning, run, shaded_vars
+from dlx import ExactCover
 
 # Note: I think that for human solving, this LITS requires a decent amount of brute force.
-regions, g = parse_regions('''
+example = '''
 AAABBBCCDDDDEEFF
 AAABGGCCDDDDFEEF
 HHHBBGGCCFFFFEEF
@@ -14,57 +14,104 @@ KKILLLBBGGCCJJFJ
 KLLLMLLBBGGNNJJJ
 KKLLMMMOOOGONJNN
 MMMMMMMMMOOONNNN
-''')
+'''
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+def parse(x):
+    return parse_regions(x)
+
+# The region letters don't matter (see cache.puzzle_key).
+def canonical(puzzle):
+    regions, g = puzzle
+    return regions, relabel(g)
 
 # LITS shapes (non-square tetrominos, as lists of positions)
 lits_shapes = [((0, 0), (0, 1), (0, 2), (0, 3)), ((0, 0), (0, 1), (0, 2), (1, 0)),
 ((0, 0), (0, 1), (0, 2), (1, 1)), ((0, 0), (0, 1), (1, 1), (1, 2))]
 
-# all LITS shape positions in the grid, together with which shape they are (ind)
-lits_shapes = [(ind, j) for (ind, i) in enumerate(lits_shapes) for j in positioning(i)]
-
-rtable = get_rtable(regions)
-
-# Group tetrominos by region they're fully in (eliminating all those split between regions)
-def group_by_region(x):
+# All LITS shape positions in the grid, together with which shape they are (ind), grouped by the region
+# they're fully in (eliminating all those split between regions).
+def group_by_region(regions):
+    rtable = get_rtable(regions)
     r = [[] for _ in range(len(regions))]
-    for i in x:
+    for i in [(ind, j) for (ind, i) in enumerate(lits_shapes) for j in positioning(i)]:
         if len({rtable[j] for j in i[1]}) == 1:
             r[rtable[i[1][0]]].append(i)
     return r
 
-cons = []
+def build(puzzle):
+    regions, g = puzzle
+
+    set_problem(g)
+
+    rtable = get_rtable(regions)
+
+    cons = []
+
+    shaded = shaded_vars('s')
+
+    # Standard root-connected setup
+    root = Int('r1'), Int('r2')
+
+    cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: eq(root, x)), 'a')[0]
 
-shaded = shaded_vars('s')
+    # table of shape type for each region (as number)
+    ty = construct_vars(Int, 't', (len(regions),))
 
-# Standard root-connected setup
-root = Int('r1'), Int('r2')
+    # Each region must have some LITS shape
+    cons += [Or(*[And(ty[ind] == p1, *[at(shaded, v) == (v in p2) for v in i]) for (p1, p2) in j])
+    for (ind, (i, j)) in enumerate(zip(regions, group_by_region(regions)))]
 
-cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: eq(root, x)), 'a')[0]
+    # Two different regions with adjacent shaded cells cannot have the same LITS shape
+    cons += all_neighbors(lambda i, j: Not(And(rtable[i] != rtable[j], at(shaded, i), at(shaded, j), ty[rtable[i]] == ty[rtable[j]])))
 
-# table of shape type for each region (as number)
-ty = construct_vars(Int, 't', (len(regions),))
+    # No 2x2 can be fully shaded.
+    cons += all_2x2(lambda *a: Or(*[Not(at(shaded, i)) for i in a]))
 
-# Each region must have some LITS shape
-cons += [Or(*[And(ty[ind] == p1, *[at(shaded, v) == (v in p2) for v in i]) for (p1, p2) in j])
-for (ind, (i, j)) in enumerate(zip(regions, group_by_region(lits_shapes)))]
+    def show(m):
+        return '\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded)
 
-# Two different regions with adjacent shaded cells cannot have the same LITS shape
-cons += all_neighbors(lambda i, j: Not(And(rtable[i] != rtable[j], at(shaded, i), at(shaded, j), ty[rtable[i]] == ty[rtable[j]])))
+    return cons, shaded, show
 
-# No 2x2 can be fully shaded.
-cons += all_2x2(lambda *a: Or(*[Not(at(shaded, i)) for i in a]))
+# As an exact cover problem (see dlx.py): each shape a region could have covers the region,
+# each 2x2 block it has cells in (which can have at most three shaded cells), and for each of its cells
+# and each neighbouring cell in another region, that pair of cells with its shape (which can only
+# be covered once, so touching regions have different shapes). The search gives up on shaded cells
+# that can't be connected through the cells shapes could still go in (which once every region has
+# its shape is just the shaded cells being connected), and z3 checks each cover against the rest.
+def cover(puzzle):
+    regions, g = puzzle
+    height, width = len(g), len(g[0])
+    set_problem(g)
+    rtable = get_rtable(regions)
+    blocks = [(i, j) for i in range(height - 1) for j in range(width - 1)]
+    pairs = [(i, j) for i in rtable for j in neighbors(i) if rtable[i] != rtable[j] and i < j]
+    secondary = {('b',) + i: 3 for i in blocks}
+    secondary.update({(i, j, k): 1 for (i, j) in pairs for k in range(len(lits_shapes))})
+    adjacent = {i: neighbors(i) for i in rtable}
+    def feasible(taken, available):
+        if not taken:
+            return True
+        shaded = {i for (_, cells) in taken for i in cells}
+        room = shaded.union(*[cells for (_, cells) in available])
+        todo = [taken[0][1][0]]
+        room.discard(todo[0])
+        shaded.discard(todo[0])
+        while todo:
+            for j in adjacent[todo.pop()]:
+                if j in room:
+                    room.discard(j)
+                    shaded.discard(j)
+                    todo.append(j)
+        return not shaded
+    ec = ExactCover(range(len(regions)), secondary, feasible)
+    for (ind, options) in enumerate(group_by_region(regions)):
+        for (k, cells) in options:
+            ec.add((ind, cells), [ind] + [('b', i[0] - a, i[1] - b) for i in cells for a in range(2) for b in range(2)
+            if 0 <= i[0] - a < height - 1 and 0 <= i[1] - b < width - 1]
+            + [(min(i, j), max(i, j), k) for i in cells for j in neighbors(i) if rtable[i] != rtable[j]])
+    values = lambda shapes: {i: any(i in cells for (_, cells) in shapes) for i in rtable}
+    show = lambda v: '\n'.join(''.join('.#'[v[(i, j)]] for j in range(width)) for i in range(height))
+    return ec, values, True, show
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded))
+if __name__ == '__main__':
+    run(build, parse(example))
@@ -1,11 +1,7 @@
-from z3 import Int, And, If, Or, Solver, is_true
-from lib import set_problem, deep_map, to_grid, at, inds, look, path, read_model, show_full_path, some_edge
-import time
+from z3 import Int, And, If, Or, is_true
+from lib import set_problem, deep_map, to_grid, at, inds, look, path, read_model, run, show_full_path, some_edge
 
-def parse(g):
-    return deep_map(lambda x: x if x != '.' else None, to_grid(g), depth=2)
-
-g = parse('''
+example = '''
 ...W...W..
 ...W......
 B....B.W..
@@ -16,38 +12,48 @@ B....B.W..
 .W........
 WW.W.WW..B
 ..........
-''')
-
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
-
-cons = []
-
-# Create a path
-c, link, _ = path(True, 'l')
-cons += c
-
-# Find length of line segment visible from a point in each direction.
-c, vis = look((lambda p, d, edge, n, v: 0 if edge else If(link[(p, n)], v + 1, 0)), Int, 'v')
-cons += c
-
-# Add black cell constraints (must have path, must have either horizontal or vertical segment (not both),
-# must not have any segment of length 1)
-cons += [And(some_edge(link, i), (at(vis[0], i) == 0) != (at(vis[2], i) == 0),
-And(*[at(vis[j], i) != 1 for j in range(4)])) for i in inds() if at(g, i) == 'B']
-
-# Add white cell constraints (must have path, must have either both horizontal or vertical segment or neither of them,
-# must have some segment of length 1)
-cons += [And(some_edge(link, i), (at(vis[0], i) == 0) == (at(vis[2], i) == 0),
-Or(*[at(vis[j], i) == 1 for j in range(4)])) for i in inds() if at(g, i) == 'W']
-
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print(show_full_path(deep_map(is_true, read_model(m, link))))
+'''
+
+def parse(g):
+    return deep_map(lambda x: x if x != '.' else None, to_grid(g), depth=2)
+
+# The constraints that don't depend on the clues (see lib.Template).
+def template():
+    cons = []
+
+    # Create a path
+    c, link, _ = path(True, 'l')
+    cons += c
+
+    # Find length of line segment visible from a point in each direction.
+    c, vis = look((lambda p, d, edge, n, v: 0 if edge else If(link[(p, n)], v + 1, 0)), Int, 'v')
+    cons += c
+
+    return cons, (link, vis)
+
+def clues(g, v):
+    link, vis = v
+
+    # Add black cell constraints (must have path, must have either horizontal or vertical segment (not both),
+    # must not have any segment of length 1)
+    cons = [And(some_edge(link, i), (at(vis[0], i) == 0) != (at(vis[2], i) == 0),
+    And(*[at(vis[j], i) != 1 for j in range(4)])) for i in inds() if at(g, i) == 'B']
+
+    # Add white cell constraints (must have path, must have either both horizontal or vertical segment or neither of them,
+    # must have some segment of length 1)
+    cons += [And(some_edge(link, i), (at(vis[0], i) == 0) == (at(vis[2], i) == 0),
+    Or(*[at(vis[j], i) == 1 for j in range(4)])) for i in inds() if at(g, i) == 'W']
+
+    def show(m):
+        return show_full_path(deep_map(is_true, read_model(m, link)))
+
+    return cons, link, show
+
+def build(g):
+    set_problem(g)
+    cons, v = template()
+    c, link, show = clues(g, v)
+    return cons + c, link, show
+
+if __name__ == '__main__':
+    run(build, parse(example))
@@ -1,19 +1,8 @@
-from z3 import Int, And, Or, Solver, is_true
-from lib import set_problem, parse_int, to_grid, at, inds, shaded_vars
-import time
+from z3 import Int, And, Or, is_true
+from lib import set_problem, parse_int, to_grid, at, inds, run, shaded_vars
+from deduce import Count, Line
 
-# Nonograms with this input format are a bit nontrivial to parse
-def parse(g, clue_h, clue_w):
-    t = to_grid(g)
-    # Clues at top of columns (for columns)
-    v_clues = [[parse_int(t[i][j]) for i in range(clue_h) if t[i][j] not in '.#X0'] for j in range(clue_w, len(t[0]))]
-    # Clues at left of rows (for rows)
-    h_clues = [[parse_int(t[i][j]) for j in range(clue_w) if t[i][j] not in '.#X0'] for i in range(clue_h, len(t))]
-    # Given cells in the nonogram itself
-    t = [[True if j in 'xX#1' else (False if j in 'oO0' else None) for j in i[clue_w:]] for i in t[clue_h:]]
-    return v_clues, h_clues, t
-
-v_clues, h_clues, g = parse('''
+example = '''
 XXX.......1.....
 XXX..224.11..11.
 XXX.31524115.313
@@ -32,54 +21,82 @@ XXX334214444B263
 .26.............
 ..7.............
 ..3.............
-''', 4, 3)
+'''
+
+# Nonograms with this input format are a bit nontrivial to parse.
+# The top-left block of Xs is clue_h rows (of column clues) by clue_w columns (of row clues);
+# if they're not given, they're worked out from it.
+def parse(g, clue_h=None, clue_w=None):
+    t = to_grid(g)
+    if clue_h is None:
+        clue_h = len([i for i in t if i[0] == 'X'])
+    if clue_w is None:
+        clue_w = len(''.join(t[0])) - len(''.join(t[0]).lstrip('X'))
+    # Clues at top of columns (for columns)
+    v_clues = [[parse_int(t[i][j]) for i in range(clue_h) if t[i][j] not in '.#X0'] for j in range(clue_w, len(t[0]))]
+    # Clues at left of rows (for rows)
+    h_clues = [[parse_int(t[i][j]) for j in range(clue_w) if t[i][j] not in '.#X0'] for i in range(clue_h, len(t))]
+    # Given cells in the nonogram itself
+    t = [[True if j in 'xX#1' else (False if j in 'oO0' else None) for j in i[clue_w:]] for i in t[clue_h:]]
+    return v_clues, h_clues, t
+
+def build(puzzle):
+    v_clues, h_clues, g = puzzle
+
+    height = len(g)
+    width = len(g[0])
+    set_problem(g)
+
+    cons = []
+
+    shaded = shaded_vars('s')
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+    # We can't use construct_vars for the below because rows and columns have different numbers of clues
+    # from each other.
 
-cons = []
+    # Where each column clue starts and ends (row numbers; first/last shaded cells)
+    v_bounds = [[(Int('vbs-' + str(ind1) + '-' + str(ind2)), Int('vbe-' + str(ind1) + '-' + str(ind2)))
+    for ind2 in range(len(i))] for (ind1, i) in enumerate(v_clues)]
 
-shaded = shaded_vars('s')
+    # Where each row clue starts and ends (column numbers; first/last shaded cells)
+    h_bounds = [[(Int('hbs-' + str(ind1) + '-' + str(ind2)), Int('hbe-' + str(ind1) + '-' + str(ind2)))
+    for ind2 in range(len(i))] for (ind1, i) in enumerate(h_clues)]
 
-# We can't use construct_vars for the below because rows and columns have different numbers of clues
-# from each other.
+    # The start-end differences must be the right size
+    cons += [k - j == c - 1 for i in list(zip(v_bounds, v_clues)) + list(zip(h_bounds, h_clues)) for ((j, k), c) in zip(*i)]
 
-# Where each column clue starts and ends (row numbers; first/last shaded cells)
-v_bounds = [[(Int('vbs-' + str(ind1) + '-' + str(ind2)), Int('vbe-' + str(ind1) + '-' + str(ind2)))
-for ind2 in range(len(i))] for (ind1, i) in enumerate(v_clues)]
+    # Each end must be at least 2 before the next start (so that there's an empty cell in between)
+    cons += [j + 1 < k for i in v_bounds + h_bounds for ((_, j), (k, _)) in zip(i[:-1], i[1:])]
 
-# Where each row clue starts and ends (column numbers; first/last shaded cells)
-h_bounds = [[(Int('hbs-' + str(ind1) + '-' + str(ind2)), Int('hbe-' + str(ind1) + '-' + str(ind2)))
-for ind2 in range(len(i))] for (ind1, i) in enumerate(h_clues)]
+    # All starts/ends must be greater than 0
+    cons += [i[0][0] >= 0 for i in v_bounds + h_bounds if i]
 
-# The start-end differences must be the right size
-cons += [k - j == c - 1 for i in list(zip(v_bounds, v_clues)) + list(zip(h_bounds, h_clues)) for ((j, k), c) in zip(*i)]
+    # All starts/ends must be less than height/width
+    cons += [i[-1][1] < b for (i, b) in [(k, height) for k in v_bounds] + [(k, width) for k in h_bounds] if i]
 
-# Each end must be at least 2 before the next start (so that there's an empty cell in between)
-cons += [j + 1 < k for i in v_bounds + h_bounds for ((_, j), (k, _)) in zip(i[:-1], i[1:])]
+    # The starts/ends on a column actually tell us which cells are shaded in that column
+    cons += [at(shaded, i) == Or(*[And(j[0] <= i[0], i[0] <= j[1]) for j in v_bounds[i[1]]]) for i in inds()]
 
-# All starts/ends must be greater than 0
-cons += [i[0][0] >= 0 for i in v_bounds + h_bounds if i]
+    # The starts/ends on a row actually tell us which cells are shaded in that row
+    cons += [at(shaded, i) == Or(*[And(j[0] <= i[1], i[1] <= j[1]) for j in h_bounds[i[0]]]) for i in inds()]
 
-# All starts/ends must be less than height/width
-cons += [i[-1][1] < b for (i, b) in [(k, height) for k in v_bounds] + [(k, width) for k in h_bounds] if i]
+    # If there are given cells in the grid, we have to follow those too.
+    cons += [at(shaded, i) == at(g, i) for i in inds() if at(g, i) != None]
 
-# The starts/ends on a column actually tell us which cells are shaded in that column
-cons += [at(shaded, i) == Or(*[And(j[0] <= i[0], i[0] <= j[1]) for j in v_bounds[i[1]]]) for i in inds()]
+    def show(m):
+        return '\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded)
 
-# The starts/ends on a row actually tell us which cells are shaded in that row
-cons += [at(shaded, i) == Or(*[And(j[0] <= i[1], i[1] <= j[1]) for j in h_bounds[i[0]]]) for i in inds()]
+    return cons, shaded, show
 
-# If there are given cells in the grid, we have to follow those too.
-cons += [at(shaded, i) == at(g, i) for i in inds() if at(g, i) != None]
+# Deduction rules (see deduce.py): each row and column as a line of blocks, which settles the cells
+# every placement of its blocks agrees on (overlaps of long blocks to begin with), and the given cells.
+def rules(puzzle):
+    v_clues, h_clues, g = puzzle
+    height, width = len(g), len(g[0])
+    r = [Line([(i, j) for j in range(width)], c) for (i, c) in enumerate(h_clues)]
+    r += [Line([(i, j) for i in range(height)], c) for (j, c) in enumerate(v_clues)]
+    r += [Count([(i, j)], int(g[i][j])) for i in range(height) for j in range(width) if g[i][j] != None]
+    return [(i, j) for i in range(height) for j in range(width)], r
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded))
+if __name__ == '__main__':
+    run(build, parse(example))
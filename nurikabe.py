@@ -1,9 +1,8 @@
-from z3 import Int, And, If, Not, Or, Solver, is_true
+from z3 import Int, And, If, Not, Or, is_true
 from lib import set_problem, parse_int_grid, all_2x2, all_neighbors, at, connected, \
-construct_vars, eq, inds, shaded_vars
-import time
+construct_vars, eq, family, give, inds, run, shaded_vars
 
-g = parse_int_grid('''
+example = '''
 I.5....4..3.6..........1
 ........................
 ..............1...1.....
@@ -18,57 +17,64 @@ I.5....4..3.6..........1
 ...3......5.........H...
 .................4....6.
 .1...3.4................
-''', exc='?')
+'''
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+def parse(x):
+    return parse_int_grid(x, exc='?')
 
-cons = []
+def build(g):
+    height = len(g)
+    width = len(g[0])
+    set_problem(g)
 
-shaded = shaded_vars('s')
+    cons = []
 
-# The shaded cells are connected
-root = Int('r1'), Int('r2')
+    clues = [i for i in inds() if at(g, i) != None]
 
-clues = [i for i in inds() if at(g, i) != None]
+    # Clues are known to be unshaded.
+    give('s', {i: False for i in clues})
 
-cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: eq(root, x)), 'uc')[0]
+    shaded = shaded_vars('s')
 
-# Regions of unshaded cells (one per clue)
-rs = construct_vars(Int, 'r', (height, width))
+    # The shaded cells are connected
+    root = Int('r1'), Int('r2')
 
-# Each region of unshaded cells must all connect to its clue
-cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: at(rs, x) == clues.index(x) if x in clues else False), 'c')[0]
+    cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: eq(root, x)), 'uc')[0]
 
-# Check if clue at i is in range of cell at j
-in_range = lambda i, j: sum(abs(k1 - k2) for (k1, k2) in zip(i, j)) < at(g, i) or at(g, i) == -1
+    # Regions of unshaded cells (one per clue, which is known to be in its own)
+    give('r', {i: ind for (ind, i) in enumerate(clues)})
+    rs = construct_vars(Int, 'r', (height, width))
 
-# Straightforwardly compute number of black squares in each region, by summing
-cons += [sum(If(And(Not(at(shaded, i)), at(rs, i) == ind), 1, 0) for i in inds() if in_range(j, i)) == at(g, j)
-for (ind, j) in enumerate(clues) if at(g, j) != -1]
+    # Each region of unshaded cells must all connect to its clue
+    cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: at(rs, x) == clues.index(x) if x in clues else False), 'c')[0]
 
-# Cells can each only be part of certain (close enough) clues
-cons += [Or(at(shaded, i), *[at(rs, i) == ind for (ind, j) in enumerate(clues) if in_range(j, i)]) for i in inds()]
+    # Check if clue at i is in range of cell at j
+    in_range = lambda i, j: sum(abs(k1 - k2) for (k1, k2) in zip(i, j)) < at(g, i) or at(g, i) == -1
 
-# Clues cannot be shaded
-cons += [Not(at(shaded, i)) for i in clues]
+    # Straightforwardly compute number of black squares in each region, by summing
+    with family('clue sizes', cons):
+        cons += [sum(If(And(Not(at(shaded, i)), at(rs, i) == ind), 1, 0) for i in inds() if in_range(j, i)) == at(g, j)
+        for (ind, j) in enumerate(clues) if at(g, j) != -1]
 
-# Clues must be part of their regions
-cons += [at(rs, i) == ind for (ind, i) in enumerate(clues)]
+    # Cells can each only be part of certain (close enough) clues
+    cons += [Or(at(shaded, i), *[at(rs, i) == ind for (ind, j) in enumerate(clues) if in_range(j, i)]) for i in inds()]
 
-# Adjacent unshaded neighbors must be in same region
-cons += all_neighbors(lambda x, y: Or(at(shaded, x), at(shaded, y), eq(at(rs, x), at(rs, y))))
+    # Clues cannot be shaded
+    cons += [Not(at(shaded, i)) for i in clues]
 
-# No 2x2 is fully shaded
-cons += all_2x2(lambda *a: Not(And(*(at(shaded, i) for i in a))))
+    # Clues must be part of their regions
+    cons += [at(rs, i) == ind for (ind, i) in enumerate(clues)]
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded))
+    # Adjacent unshaded neighbors must be in same region
+    cons += all_neighbors(lambda x, y: Or(at(shaded, x), at(shaded, y), eq(at(rs, x), at(rs, y))))
+
+    # No 2x2 is fully shaded
+    cons += all_2x2(lambda *a: Not(And(*(at(shaded, i) for i in a))))
+
+    def show(m):
+        return '\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded)
+
+    return cons, shaded, show
+
+if __name__ == '__main__':
+    run(build, parse(example))
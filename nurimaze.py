@@ -1,12 +1,9 @@
-from z3 import And, Implies, Not, Or, Solver, is_true
-from lib import set_problem, parse_regions, deep_map, to_grid, all_2x2, at, connected, \
-eq, inds, is_perimeter, only, path, shaded_vars, some_edge
-import time
+from z3 import And, Implies, Not, Or, is_true
+from lib import set_problem, blocks, parse_regions, deep_map, to_grid, all_2x2, at, connected, \
+eq, inds, is_perimeter, only, path, run, shaded_vars, some_edge
 
-def parse_clues(x):
-    return deep_map(lambda j: j if j != '.' else None, to_grid(x), depth=2)
-
-regions = parse_regions('''
+# Regions, then clues.
+example = '''
 ...A.B...C
 DD.A.B...C
 .....B....
@@ -17,9 +14,7 @@ HH...I.JKK
 .....I.J..
 .....L..MM
 .....L....
-''', periods=True, grid=False)
 
-g = parse_clues('''
 ..o.o..t.t
 ......t...
 ....t....o
@@ -30,57 +25,63 @@ o..t...o..
 o.o....t..
 .S........
 t.G...o.o.
-''')
+'''
+
+def parse_clues(x):
+    return deep_map(lambda j: j if j != '.' else None, to_grid(x), depth=2)
+
+def parse(x):
+    r, c = blocks(x)
+    return parse_regions(r, periods=True, grid=False), parse_clues(c)
+
+def build(puzzle):
+    regions, g = puzzle
+
+    set_problem(g)
+
+    cons = []
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+    # Get start and goal locations
+    tstart, tgoal = only([i for i in inds() if at(g, i) == 'S']), only([i for i in inds() if at(g, i) == 'G'])
 
-cons = []
+    # Set up a path from start to goal
+    c, edge_vars, start, goal = path(False, 'l')
+    cons += c
 
-# Get start and goal locations
-tstart, tgoal = only([i for i in inds() if at(g, i) == 'S']), only([i for i in inds() if at(g, i) == 'G'])
+    # Set up a shading
+    shaded = shaded_vars('s')
 
-# Set up a path from start to goal
-c, edge_vars, start, goal = path(False, 'l')
-cons += c
+    # Everything unshaded must connect to the start
+    cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: eq(start, x)), 'ca')[0]
 
-# Set up a shading
-shaded = shaded_vars('s')
+    # Everything shaded must connect to the edge via diagonals (this is equivalent to having no unshaded loops)
+    cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: is_perimeter(x)), 'cb', diag=True)[0]
 
-# Everything unshaded must connect to the start
-cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: eq(start, x)), 'ca')[0]
+    # No 2x2 can be all one thing
+    cons += all_2x2(lambda *a: And(Or(*[at(shaded, i) for i in a]), Or(*[Not(at(shaded, i)) for i in a])))
 
-# Everything shaded must connect to the edge via diagonals (this is equivalent to having no unshaded loops)
-cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: is_perimeter(x)), 'cb', diag=True)[0]
+    # Every non-first cell in a region must have the same shading as the first
+    cons += [at(shaded, i[0]) == at(shaded, j) for i in regions for j in i[1:]]
 
-# No 2x2 can be all one thing
-cons += all_2x2(lambda *a: And(Or(*[at(shaded, i) for i in a]), Or(*[Not(at(shaded, i)) for i in a])))
+    # Cells with symbols cannot be shaded
+    cons += [Not(at(shaded, i)) for i in inds() if at(g, i) != None]
 
-# Every non-first cell in a region must have the same shading as the first
-cons += [at(shaded, i[0]) == at(shaded, j) for i in regions for j in i[1:]]
+    # Start and goal must match
+    cons += [eq(start, tstart), eq(goal, tgoal)]
 
-# Cells with symbols cannot be shaded
-cons += [Not(at(shaded, i)) for i in inds() if at(g, i) != None]
+    # Points on the path can't be shaded
+    cons += [Implies(some_edge(edge_vars, i), Not(at(shaded, i))) for i in inds()]
 
-# Start and goal must match
-cons += [eq(start, tstart), eq(goal, tgoal)]
+    # Points with circles are on the path
+    cons += [some_edge(edge_vars, i) for i in inds() if at(g, i) == 'o']
 
-# Points on the path can't be shaded
-cons += [Implies(some_edge(edge_vars, i), Not(at(shaded, i))) for i in inds()]
+    # Points with triangles are not on the path
+    cons += [Not(some_edge(edge_vars, i)) for i in inds() if at(g, i) == 't']
 
-# Points with circles are on the path
-cons += [some_edge(edge_vars, i) for i in inds() if at(g, i) == 'o']
+    def show(m):
+        return '\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded)
 
-# Points with triangles are not on the path
-cons += [Not(some_edge(edge_vars, i)) for i in inds() if at(g, i) == 't']
+    return cons, shaded, show
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded))
+if __name__ == '__main__':
+    run(build, parse(example))
@@ -1,9 +1,8 @@
-from z3 import Int, And, Not, Or, Solver, is_true
+from z3 import Int, And, Not, Or, is_true
 from lib import set_problem, parse_int_grid, ExactlyOne, all_2x2, at, connected, \
-eq, in_bounds, inds, minus, neighbors, plus, shaded_vars, times
-import time
+eq, in_bounds, inds, minus, neighbors, plus, run, shaded_vars, times
 
-g = parse_int_grid('''
+example = '''
 .........5.....
 .......3......X
 ..X.........4..
@@ -19,52 +18,52 @@ g = parse_int_grid('''
 ..2.........3..
 X......2.......
 .....X.........
-''', exc={'X': -1})
+'''
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+def parse(x):
+    return parse_int_grid(x, exc={'X': -1})
 
-cons = []
+def build(g):
+    set_problem(g)
 
-# set up a shading
-shaded = shaded_vars('s')
+    cons = []
 
-# root of the unshaded cells (which must be connected)
-root = Int('r1'), Int('r2')
+    # set up a shading
+    shaded = shaded_vars('s')
 
-cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: eq(root, x)), 'uc')[0]
+    # root of the unshaded cells (which must be connected)
+    root = Int('r1'), Int('r2')
 
-# No 2x2 can be all one thing
-cons += all_2x2(lambda *a: And(Or(*[at(shaded, i) for i in a]), Or(*[Not(at(shaded, i)) for i in a])))
+    cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: eq(root, x)), 'uc')[0]
 
-# Any unshaded cell without clues must have at least two unshaded neighbors
-cons += [Or(at(shaded, i), Not(ExactlyOne(Not(at(shaded, j)) for j in neighbors(i)))) for i in inds() if at(g, i) == None]
+    # No 2x2 can be all one thing
+    cons += all_2x2(lambda *a: And(Or(*[at(shaded, i) for i in a]), Or(*[Not(at(shaded, i)) for i in a])))
 
-# Add conditions for clue cells with no number...
-cons += [And(Not(at(shaded, i)), ExactlyOne(Not(at(shaded, j)) for j in neighbors(i))) for i in inds() if at(g, i) == -1]
+    # Any unshaded cell without clues must have at least two unshaded neighbors
+    cons += [Or(at(shaded, i), Not(ExactlyOne(Not(at(shaded, j)) for j in neighbors(i)))) for i in inds() if at(g, i) == None]
 
-follow = lambda i, j, k: plus(i, times(k, minus(j, i)))
+    # Add conditions for clue cells with no number...
+    cons += [And(Not(at(shaded, i)), ExactlyOne(Not(at(shaded, j)) for j in neighbors(i))) for i in inds() if at(g, i) == -1]
 
-# ...and, with more difficulty, for clue cells with numbers.
-# Our approach here is to consider each option for a direction the clue could extend in.
-# For each such option, there are three types of contraints:
-# (1) None of the cells in that direction can be shaded
-# (2) All the other neighbors not in that direction must be shaded
-# (3) The cell at distance (clue number) in that direction, if it exists, must be shaded
-cons += [And(Not(at(shaded, i)), Or(
-*[And(*[Not(at(shaded, follow(i, j, k))) for k in range(1, at(g, i))],
-*[at(shaded, k) for k in neighbors(i) if k != j],
-*([at(shaded, follow(i, j, at(g, i)))] if in_bounds(follow(i, j, at(g, i))) else []))
-for j in neighbors(i) if in_bounds(follow(i, j, at(g, i) - 1))]
-)) for i in inds() if at(g, i) not in (None, -1)]
+    follow = lambda i, j, k: plus(i, times(k, minus(j, i)))
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded))
+    # ...and, with more difficulty, for clue cells with numbers.
+    # Our approach here is to consider each option for a direction the clue could extend in.
+    # For each such option, there are three types of contraints:
+    # (1) None of the cells in that direction can be shaded
+    # (2) All the other neighbors not in that direction must be shaded
+    # (3) The cell at distance (clue number) in that direction, if it exists, must be shaded
+    cons += [And(Not(at(shaded, i)), Or(
+    *[And(*[Not(at(shaded, follow(i, j, k))) for k in range(1, at(g, i))],
+    *[at(shaded, k) for k in neighbors(i) if k != j],
+    *([at(shaded, follow(i, j, at(g, i)))] if in_bounds(follow(i, j, at(g, i))) else []))
+    for j in neighbors(i) if in_bounds(follow(i, j, at(g, i) - 1))]
+    )) for i in inds() if at(g, i) not in (None, -1)]
+
+    def show(m):
+        return '\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded)
+
+    return cons, shaded, show
+
+if __name__ == '__main__':
+    run(build, parse(example))
@@ -0,0 +1,100 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from bench import genres
+
+# Solve one puzzle with several solver configurations at once, each in its own process,
+# and take the first answer. How long z3 takes varies a lot with its random seed, its settings
+# and the encoding, so racing a few of them cuts down on the worst cases.
+# A configuration is a dict: seed (z3's random seeds), encoding (see lib.default_encoding),
+# redundant (see lib.default_redundant), and any z3 parameters (keys with dots in them,
+# e.g. 'smt.arith.solver'). Every one of these builds on the biggest of bench.py's examples
+# (yajilin and simple_loop); 'order' doesn't without a bound (see lib.Problem.distances).
+configs = [
+    {'seed': 0, 'encoding': 'int'},
+    {'seed': 1, 'encoding': 'bv'},
+    {'seed': 2, 'encoding': 'int', 'redundant': True},
+    {'seed': 3, 'encoding': 'int', 'smt.arith.solver': 2},
+    {'seed': 4, 'encoding': 'int', 'sat.cardinality.solver': False},
+    {'seed': 5, 'encoding': 'tree'},
+    {'seed': 6, 'encoding': 'bv', 'redundant': True},
+    {'seed': 7, 'encoding': 'bv', 'smt.arith.solver': 2}
+]
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def work(genre, text, config, results, index):
+    sys.path.insert(0, here)
+    import z3
+    import lib
+    seed = config.get('seed', 0)
+    z3.set_param('smt.random_seed', seed, 'sat.random_seed', seed)
+    for (k, v) in config.items():
+        if '.' in k:
+            z3.set_param(k, v)
+    lib.default_encoding = config.get('encoding', lib.default_encoding)
+    lib.default_redundant = config.get('redundant', False)
+    try:
+        module = importlib.import_module(genre)
+        r = lib.solve(module.build, module.parse(text))
+    except Exception as e:
+        r = {'result': 'error', 'error': repr(e)}
+    results.put((index, r))
+
+# Race the configurations on a puzzle (text in the format of the genre module's example;
+# the genre has to be one of bench.genres), returning the first sat or unsat answer,
+# with the configuration that gave it.
+# The other processes are killed as soon as there's an answer. If no configuration answers
+# within timeout seconds (None for no limit), or none can (they all give unknown or an error),
+# the result is the last of those, or a timeout.
+def solve(genre, text, configs=configs, timeout=None):
+    if genre not in genres:
+        raise ValueError('unknown genre: %r' % (genre,))
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=work, args=(genre, text, c, results, ind), daemon=True)
+    for (ind, c) in enumerate(configs)]
+    for p in procs:
+        p.start()
+    end = None if timeout is None else time.time() + timeout
+    r = {'result': 'timeout'}
+    try:
+        for _ in procs:
+            try:
+                ind, r = results.get(timeout=None if end is None else max(0, end - time.time()))
+            except queue.Empty:
+                r = {'result': 'timeout'}
+                break
+            r['config'] = configs[ind]
+            if r['result'] in ('sat', 'unsat'):
+                break
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.join()
+    return r
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('genre', choices=genres)
+    parser.add_argument('file', nargs='?', help='puzzle file (default: the genre\'s example)')
+    parser.add_argument('-k', type=int, default=os.cpu_count(), help='number of configurations to race')
+    parser.add_argument('--timeout', type=float)
+    args = parser.parse_args()
+    if args.file:
+        with open(args.file) as f:
+            text = f.read()
+    else:
+        text = importlib.import_module(args.genre).example
+    start = time.time()
+    r = solve(args.genre, text, configs[:max(1, args.k)], args.timeout)
+    r['total'] = time.time() - start
+    print(json.dumps(r))
+
+if __name__ == '__main__':
+    main()
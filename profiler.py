@@ -0,0 +1,210 @@
+import argparse
+import contextlib
+import functools
+import importlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+from z3 import is_ast
+import lib
+
+# Find out which part of building a genre's constraints is expensive, before solving even starts.
+# While a Profiler runs, each of lib's helpers (connected, get_sizes, path, ...) is timed as
+# a family of constraints named after it, as is each block a genre labels with lib.family. For each
+# family (nested in whatever family it was called from) this records the number of calls, wall time,
+# the number of constraints made, the number of distinct z3 term nodes in them, and (with memory,
+# using tracemalloc) the Python memory allocated and still held at the end, and the peak on top
+# of what was held at the start. z3's own memory is outside Python, so isn't counted;
+# tracemalloc also slows allocation down, so times are best compared with memory off.
+# The time spent counting nodes is left out of the times. Run one puzzle with
+# python profiler.py genre [file] (--json for JSON rather than a table).
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# The Problem helpers that are profiled.
+helpers = ['construct_vars', 'construct_edge_vars', 'distances', 'connected', 'same_regions', 'get_sizes',
+'path', 'look', 'all_neighbors', 'all_2x2', 'rectangular_regions', 'symmetric_edges']
+
+# Number of distinct term nodes in the constraints cons that aren't already in seen (their ids are added to it).
+def count_nodes(cons, seen):
+    n = 0
+    todo = [i for i in cons if is_ast(i)]
+    while todo:
+        e = todo.pop()
+        k = e.get_id()
+        if k not in seen:
+            seen.add(k)
+            n += 1
+            todo.extend(e.children())
+    return n
+
+# One family being profiled. Constraints are counted from the list cons (the ones added to it
+# since the start) if it's given, and otherwise from those passing through Problem.emit inside it
+# (helpers make all theirs that way), including those of the families nested in it.
+class Frame:
+    def __init__(self, path, cons, overhead, memory):
+        self.path = path
+        self.cons = cons
+        self.start_len = len(cons) if cons is not None else 0
+        self.emitted = []
+        self.constraints = 0
+        self.nodes = 0
+        self.overhead = overhead
+        self.memory = memory
+        self.peak = memory
+        self.time = time.perf_counter()
+
+class Profiler:
+    def __init__(self, memory=True):
+        self.memory = memory
+        # Totals for each family, by its path (the names of the families it's nested in, and its own).
+        self.records = {}
+        self.stack = []
+        # Time spent counting, which is taken off the times of the families it happened in.
+        self.overhead = 0
+        self.saved = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        assert lib.profiler is None, 'a profiler is already running'
+        for name in helpers + ['emit']:
+            self.saved[name] = getattr(lib.Problem, name)
+        for name in helpers:
+            setattr(lib.Problem, name, self.wrap(name, self.saved[name]))
+        emit = self.saved['emit']
+        def counted_emit(problem, cons, sink=None):
+            if not self.stack:
+                return emit(problem, cons, sink)
+            return emit(problem, self.collect(self.stack[-1], cons), sink)
+        lib.Problem.emit = counted_emit
+        lib.profiler = self
+        if self.memory:
+            tracemalloc.start()
+
+    def stop(self):
+        for (name, method) in self.saved.items():
+            setattr(lib.Problem, name, method)
+        self.saved = {}
+        lib.profiler = None
+        if self.memory:
+            tracemalloc.stop()
+
+    def wrap(self, name, method):
+        @functools.wraps(method)
+        def wrapped(*args, **kwargs):
+            with self.family(name):
+                return method(*args, **kwargs)
+        return wrapped
+
+    # Keep the constraints passing through emit, to be counted once the family is done.
+    def collect(self, frame, cons):
+        for i in cons:
+            frame.emitted.append(i)
+            yield i
+
+    def traced(self):
+        return tracemalloc.get_traced_memory() if self.memory else (0, 0)
+
+    # The peak tracemalloc reports is reset at the start and end of each family, so the peak
+    # seen so far in each family still going is kept in its frame.
+    def reset_peak(self, peak):
+        if self.stack:
+            self.stack[-1].peak = max(self.stack[-1].peak, peak)
+        if self.memory:
+            tracemalloc.reset_peak()
+
+    @contextlib.contextmanager
+    def family(self, name, cons=None):
+        path = (self.stack[-1].path if self.stack else ()) + (name,)
+        current, peak = self.traced()
+        self.reset_peak(peak)
+        f = Frame(path, cons, self.overhead, current)
+        self.stack.append(f)
+        try:
+            yield f
+        finally:
+            self.finish(f)
+
+    def finish(self, f):
+        t = time.perf_counter()
+        elapsed = t - f.time - (self.overhead - f.overhead)
+        current, peak = self.traced()
+        f.peak = max(f.peak, peak)
+        self.stack.pop()
+        self.reset_peak(f.peak)
+        if f.cons is not None:
+            new = f.cons[f.start_len:]
+            constraints = len(new)
+            nodes = count_nodes(new, set())
+        else:
+            constraints = f.constraints + len(f.emitted)
+            nodes = f.nodes + count_nodes(f.emitted, set())
+        # Pass the counts on to a family this one is in that counts what's emitted.
+        if self.stack and self.stack[-1].cons is None:
+            self.stack[-1].constraints += constraints
+            self.stack[-1].nodes += nodes
+        r = self.records.setdefault(f.path, {'calls': 0, 'time': 0, 'constraints': 0, 'nodes': 0, 'allocated': 0, 'peak': 0})
+        r['calls'] += 1
+        r['time'] += elapsed
+        r['constraints'] += constraints
+        r['nodes'] += nodes
+        r['allocated'] += current - f.memory
+        r['peak'] = max(r['peak'], f.peak - f.memory)
+        self.overhead += time.perf_counter() - t
+
+    # The records in order, each family followed by those nested in it.
+    def report(self):
+        order = sorted(self.records, key=lambda p: [list(self.records).index(p[:i]) for i in range(1, len(p) + 1)])
+        return [dict(family=' > '.join(p), depth=len(p) - 1, **self.records[p]) for p in order]
+
+    def table(self):
+        lines = ['%-40s %6s %9s %11s %11s %11s %11s' % ('family', 'calls', 'time', 'constraints', 'nodes', 'alloc KiB', 'peak KiB')]
+        for r in self.report():
+            lines.append('%-40s %6d %9.3f %11d %11d %11.1f %11.1f' % ('  ' * r['depth'] + r['family'].split(' > ')[-1],
+            r['calls'], r['time'], r['constraints'], r['nodes'], r['allocated'] / 1024, r['peak'] / 1024))
+        return '\n'.join(lines)
+
+# Build one puzzle of a genre (and add its constraints to a solver) under a profiler; returns the profiler.
+# Streamed constraints (see lib.Problem.emit) are in the solver rather than the list build returns.
+def profile(module, puzzle, memory=True):
+    with Profiler(memory) as p:
+        with p.family('build') as f:
+            cons, primary, show = module.build(puzzle)
+            f.cons = cons
+        with p.family('add'):
+            s = lib.solver()
+            s.add(*lib.current_problem().prune(cons))
+    p.total = len(s.assertions())
+    return p
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('genre')
+    parser.add_argument('file', nargs='?', help='puzzle file (default: the genre\'s example)')
+    parser.add_argument('--json', action='store_true', help='print the records as JSON')
+    parser.add_argument('--no-memory', action='store_true', help='don\'t trace memory (which slows construction down)')
+    args = parser.parse_args()
+    sys.path.insert(0, here)
+    module = importlib.import_module(args.genre)
+    if args.file:
+        with open(args.file) as f:
+            text = f.read()
+    else:
+        text = module.example
+    p = profile(module, module.parse(text), not args.no_memory)
+    if args.json:
+        print(json.dumps({'constraints': p.total, 'families': p.report()}))
+    else:
+        print(p.table())
+        print('constraints in the solver:', p.total)
+
+if __name__ == '__main__':
+    main()
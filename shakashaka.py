@@ -1,8 +1,8 @@
-from z3 import Bool, And, Or, PbEq, Solver, is_true
-from lib import set_problem, parse_int_grid, at, construct_vars, eq, in_bounds, inds, neighbors
-import time
+from z3 import Bool, is_true
+from lib import set_problem, parse_int_grid, at, in_bounds, inds, neighbors, run
+from smt2 import Smt2, terms
 
-g = parse_int_grid('''
+example = '''
 .....X....
 ..........
 0.........
@@ -13,19 +13,18 @@ g = parse_int_grid('''
 .....1....
 ..........
 ..........
-''', exc='X')
+'''
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+def parse(x):
+    return parse_int_grid(x, exc='X')
 
 # The general format here is that a space is represented by five variables, the first four of which are whether
 # its top quadrant, right quadrant, bottom quadrant, and left quadrant, in that order, are shaded,
 # and the fifth of which is "is this space all shaded or all unshaded". We then write functions
 # to get the shading around intersections and to determine which shadings around intersections are valid.
 # This is the slowest genre of those here, with it sometimes taking over 5 seconds to set up the constraints
-# (though actually solving from constraints takes 1 second usually, or less).
+# (though actually solving from constraints takes 1 second usually, or less); the text backend
+# (LOGIC_SOLVE_BACKEND=text) cuts that down a lot.
 
 # Get valid shadings around intersections.
 def get_valid_eights():
@@ -40,43 +39,58 @@ def get_valid_fours():
     return [(False, False, False, False, True), (False, False, True, True, False), (False, True, True, False, False),
     (True, False, False, True, False), (True, True, False, False, False), (True, True, True, True, True)]
 
-v = lambda i, j: at(shadings, i)[j] if in_bounds(i) else True
-
-# Get the shading around the intersection with (a, b) at its top left.
-def read_around(a, b):
-    return [v(i, j) for (i, j) in (((a, b), 2), ((a, b), 1), ((a, b + 1), 3), ((a, b + 1), 2),
-    ((a + 1, b + 1), 0), ((a + 1, b + 1), 3), ((a + 1, b), 1), ((a + 1, b), 0))]
-
 eights = get_valid_eights()
 
 fours = get_valid_fours()
 
-cons = []
+def build(g):
+    height = len(g)
+    width = len(g[0])
+    problem = set_problem(g)
+
+    # With the text backend the constraints are written as SMT-LIB2 text (see smt2.py); either way,
+    # And, Or, PbEq and eq make the right kind of term.
+    t = Smt2(problem) if problem.backend == 'text' else None
+    ops = terms(problem)
+    And, Or, PbEq, eq = ops.And, ops.Or, ops.PbEq, ops.eq
+
+    v = lambda i, j: at(shadings, i)[j] if in_bounds(i) else True
+
+    # Get the shading around the intersection with (a, b) at its top left.
+    def read_around(a, b):
+        return [v(i, j) for (i, j) in (((a, b), 2), ((a, b), 1), ((a, b + 1), 3), ((a, b + 1), 2),
+        ((a + 1, b + 1), 0), ((a + 1, b + 1), 3), ((a + 1, b), 1), ((a + 1, b), 0))]
+
+    cons = []
+
+    # Create shadings
+    shadings = t.construct_vars('Bool', 's', (height, width, 5)) if t else problem.construct_vars(Bool, 's', (height, width, 5))
+
+    # Check that intersections are valid
+    cons += [Or(*[eq(read_around(i, j), k) for k in eights]) for i in range(-1, height) for j in range(-1, width)]
 
-# Create shadings
-shadings = construct_vars(Bool, 's', (height, width, 5))
+    # Check that spaces are valid
+    cons += [Or(*[eq(at(shadings, i), j) for j in fours]) for i in inds()]
 
-# Check that intersections are valid
-cons += [Or(*[eq(read_around(i, j), k) for k in eights]) for i in range(-1, height) for j in range(-1, width)]
+    # Check that the only spaces that are fully shaded (all shading true) are clues, and that clues are fully shaded
+    cons += [eq(And(*at(shadings, i)), at(g, i) != None) for i in inds()]
 
-# Check that spaces are valid
-cons += [Or(*[eq(at(shadings, i), j) for j in fours]) for i in inds()]
+    # Check that spaces have the right number of triangles around them (the last of the five shading properties
+    # can be thought of as "no triangle"; the negation ("*no* triangle") gives us the
+    # "len(neighbors(i)) - at(g, i))" rather than "at(g, i)").
+    cons += [PbEq([(v(j, 4), 1) for j in neighbors(i)], len(neighbors(i)) - at(g, i)) for i in inds() if at(g, i) not in (None, -1)]
 
-# Check that the only spaces that are fully shaded (all shading true) are clues, and that clues are fully shaded
-cons += [And(*[at(shadings, i)]) == (at(g, i) != None) for i in inds()]
+    if t:
+        t.add(*cons)
+        cons = t.constraints()
+        # The same variables as in the text, to read the model with.
+        shadings = problem.construct_vars(Bool, 's', (height, width, 5))
 
-# Check that spaces have the right number of triangles around them (the last of the five shading properties
-# can be thought of as "no triangle"; the negation ("*no* triangle") gives us the
-# "len(neighbors(i)) - at(g, i))" rather than "at(g, i)").
-cons += [PbEq([(v(j, 4), 1) for j in neighbors(i)], len(neighbors(i)) - at(g, i)) for i in inds() if at(g, i) not in (None, -1)]
+    # Output format is a bit weird. Period is unshaded and hashmark is fully shaded (clue), but 1-4 are triangles.
+    def show(m):
+        return '\n'.join(''.join('.1234#'[fours.index(tuple(is_true(m[k]) for k in j))] for j in i) for i in shadings)
 
-# Output format is a bit weird. Period is unshaded and hashmark is fully shaded (clue), but 1-4 are triangles.
+    return cons, shadings, show
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join('.1234#'[fours.index(tuple(is_true(m[k]) for k in j))] for j in i) for i in shadings))
+if __name__ == '__main__':
+    run(build, parse(example))
@@ -1,8 +1,9 @@
-from z3 import Int, And, Or, PbEq, Solver, is_true
-from lib import set_problem, parse_int_grid, at, connected, construct_vars, eq, in_bounds, inds
-import time
+from z3 import Int, And, Or, PbEq, is_true
+from lib import set_problem, parse_int_grid, at, connected, construct_vars, eq, family, in_bounds, inds, run
+from dlx import ExactCover
 
-g = parse_int_grid('''
+# The last of these is the one solved when this is run directly.
+examples = ['''
 .....4.4
 .6....4.
 ...8....
@@ -11,9 +12,7 @@ g = parse_int_grid('''
 3....C..
 .6......
 8.......
-''')
-
-g = parse_int_grid('''
+''', '''
 ....4..
 8......
 2.23..3
@@ -21,9 +20,7 @@ g = parse_int_grid('''
 3..92.4
 ......6
 ..3....
-''')
-
-g = parse_int_grid('''
+''', '''
 ...C....64....9...
 .8...6......6...6.
 ..................
@@ -34,9 +31,7 @@ g = parse_int_grid('''
 ..................
 .6...4......9...9.
 ...2....49....6...
-''')
-
-g = parse_int_grid('''
+''', '''
 8.......6.......4
 .....A....4......
 ...2...8....9....
@@ -54,9 +49,7 @@ g = parse_int_grid('''
 ....C....2...6...
 ......2....8.....
 C.......6.......A
-''')
-
-g = parse_int_grid('''
+''', '''
 ......8..........
 ....6....6.......
 ..C....6.........
@@ -74,9 +67,7 @@ g = parse_int_grid('''
 .........6....6..
 .......6....5....
 ..........8......
-''')
-
-g = parse_int_grid('''
+''', '''
 ...?......
 5.........
 .......?..
@@ -87,9 +78,7 @@ g = parse_int_grid('''
 ..?.......
 .........?
 ......?...
-''', {'?': -1})
-
-g = parse_int_grid('''
+''', '''
 ...9.....8.......
 ..............6..
 .....5...........
@@ -107,12 +96,12 @@ G........A.....G.
 ...........6.....
 ..8..............
 .......6.....8...
-''')
+''']
+
+example = examples[-1]
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+def parse(x):
+    return parse_int_grid(x, {'?': -1})
 
 # This gets the options for a rectangle of size n with cell ind and list of clues clues (where ind is in clues
 # and the rectangle can't contain any other clues). It helps a lot when there are no ? clues (for ? clues it's harder to do).
@@ -125,37 +114,67 @@ def rect_options(ind, n, clues):
     # Check rectangles are in bounds and don't have another clue
     return [i for i in r if all(in_bounds(j) for j in i) and len(set(clues) & set(i)) == 1]
 
-cons = []
-
-# Find the clues
-clues = [i for i in inds() if at(g, i) != None]
-
-# Do standard connecteness of each region, except that all the regions have a clue and are rectangles.
-reg_roots = construct_vars(Int, 'r', (height, width))
-
-cons += connected(reg_roots, (lambda x: True),
-(lambda x: at(g, x) != None and eq(at(reg_roots, x), clues.index(x))), 'c', rect=True)[0]
-
-# Check that certain regions are the right size
-cons += [PbEq([(eq(at(reg_roots, j), clues.index(i)), 1) for j in inds()],
-at(g, i)) for i in inds() if at(g, i) not in (None, -1)]
-
-# Check that values at clues are correct
-cons += [at(reg_roots, i) == ind for (ind, i) in enumerate(clues)]
-
-# Check that non-? clues *contain* one of the legal rectangle options.
-# This is implied by other constraints, but is very slow to derive from them.
-# (Requiring them to be exactly one of those options
-# is too slow, because then you have to include all the cells in each constraint,
-# dramatically increasing setup time.)
-cons += [Or(*[And(*[at(reg_roots, k) == ind for k in j]) for j in rect_options(i, at(g, i), clues)])
-for (ind, i) in enumerate(clues) if at(g, i) != -1]
-
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join(chr(ord('A') + m[j].as_long()) for j in i) for i in reg_roots))
+def build(g):
+    height = len(g)
+    width = len(g[0])
+    set_problem(g)
+
+    cons = []
+
+    # Find the clues
+    clues = [i for i in inds() if at(g, i) != None]
+
+    # Do standard connecteness of each region, except that all the regions have a clue and are rectangles.
+    reg_roots = construct_vars(Int, 'r', (height, width))
+
+    cons += connected(reg_roots, (lambda x: True),
+    (lambda x: at(g, x) != None and eq(at(reg_roots, x), clues.index(x))), 'c', rect=True)[0]
+
+    # Check that certain regions are the right size
+    cons += [PbEq([(eq(at(reg_roots, j), clues.index(i)), 1) for j in inds()],
+    at(g, i)) for i in inds() if at(g, i) not in (None, -1)]
+
+    # Check that values at clues are correct
+    cons += [at(reg_roots, i) == ind for (ind, i) in enumerate(clues)]
+
+    # Check that non-? clues *contain* one of the legal rectangle options.
+    # This is implied by other constraints, but is very slow to derive from them.
+    # (Requiring them to be exactly one of those options
+    # is too slow, because then you have to include all the cells in each constraint,
+    # dramatically increasing setup time.)
+    with family('rect options', cons):
+        cons += [Or(*[And(*[at(reg_roots, k) == ind for k in j]) for j in rect_options(i, at(g, i), clues)])
+        for (ind, i) in enumerate(clues) if at(g, i) != -1]
+
+    def show(m):
+        return '\n'.join(''.join(chr(ord('A') + m[j].as_long()) for j in i) for i in reg_roots)
+
+    return cons, reg_roots, show
+
+# Like rect_options, but for any size if n is None, and working out the bounds directly
+# (there are a lot of rectangles of any size, so going through them one cell at a time is slow).
+def rectangles(ind, n, clues, height, width):
+    others = [i for i in clues if i != ind]
+    for h in range(1, height + 1):
+        for w in (range(1, width + 1) if n is None else [n // h] if n % h == 0 and n // h <= width else []):
+            for top in range(max(0, ind[0] - h + 1), min(ind[0], height - h) + 1):
+                for left in range(max(0, ind[1] - w + 1), min(ind[1], width - w) + 1):
+                    if not any(top <= a < top + h and left <= b < left + w for (a, b) in others):
+                        yield [(top + a, left + b) for a in range(h) for b in range(w)]
+
+# As an exact cover problem (see dlx.py): each rectangle option of a clue (any size, for a ?)
+# covers its cells, and every cell is covered once (a clue's cell only by its own rectangles).
+def cover(g):
+    height, width = len(g), len(g[0])
+    cells = [(i, j) for i in range(height) for j in range(width)]
+    clues = [i for i in cells if at(g, i) != None]
+    ec = ExactCover(cells)
+    for (ind, i) in enumerate(clues):
+        for j in rectangles(i, at(g, i) if at(g, i) != -1 else None, clues, height, width):
+            ec.add((ind, j), j)
+    values = lambda rects: {k: ind for (ind, j) in rects for k in j}
+    show = lambda v: '\n'.join(''.join(chr(ord('A') + v[(i, j)]) for j in range(width)) for i in range(height))
+    return ec, values, False, show
+
+if __name__ == '__main__':
+    run(build, parse(example))
@@ -1,12 +1,14 @@
-from z3 import Solver, is_true
-from lib import set_problem, deep_map, to_grid, at, inds, path, read_model, show_full_path, some_edge
-import time
+from z3 import Bool, is_true
+from lib import set_problem, current_problem, deep_map, to_grid, at, edges, inds, path, \
+read_model, run, show_full_path, some_edge
+import smt2
+from smt2 import Smt2
 
 def parse(g):
     return deep_map(lambda x: bool('#.'.index(x)), to_grid(g), depth=2)
 
 # OK this specific puzzle is pretty slow (~1 minute) but that's because it's huge.
-g = parse('''
+example = '''
 ###.....####......####...###....#####.....###....#####..##.....#...#.......
 #.......#...........#....##................#.............#.....#...#.#####.
 #..##.....#...#......................#.....#..........#..##..###..##.......
@@ -82,27 +84,38 @@ g = parse('''
 #........###..##........#....#....#..##.........#....##........##........##
 #.....#...#....#......#.###......##.....#....####...###...##...#......#....
 ###..####......#...####..........##.....####..............###..#...####....
-''')
+'''
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+# The constraints that don't depend on which cells are shaded (see lib.Template).
+def template():
+    # Create a path
+    cons, link, _ = path(True, 'l')
+    return cons, link
 
-cons = []
+def clues(g, link):
+    problem = current_problem()
+    # Points are on the loop if and only if they aren't shaded in the given grid.
+    # With the text backend (LOGIC_SOLVE_BACKEND=text), these are written as SMT-LIB2 text (see smt2.py).
+    if problem.backend == 'text':
+        t = Smt2(problem)
+        link = t.construct_edge_vars('Bool', 'l', edges())
+        t.add(*[smt2.Eq(t.some_edge(link, i), at(g, i)) for i in inds()])
+        cons = t.constraints()
+        # The same variables as in the text, to read the model with.
+        link = problem.construct_edge_vars(Bool, 'l', edges())
+    else:
+        cons = [some_edge(link, i) == at(g, i) for i in inds()]
 
-# Create a path
-c, link, _ = path(True, 'l')
-cons += c
+    def show(m):
+        return show_full_path(deep_map(is_true, read_model(m, link)), blank='#')
 
-# Points are on the loop if and only if they aren't shaded in the given grid
-cons += [some_edge(link, i) == at(g, i) for i in inds()]
+    return cons, link, show
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print(show_full_path(deep_map(is_true, read_model(m, link)), blank='#'))
+def build(g):
+    set_problem(g)
+    cons, link = template()
+    c, link, show = clues(g, link)
+    return cons + c, link, show
+
+if __name__ == '__main__':
+    run(build, parse(example))
@@ -1,9 +1,9 @@
-from z3 import Int, And, Implies, Not, PbEq, Solver, is_true
+from z3 import Int, And, Implies, Not, PbEq, is_true
 from lib import set_problem, parse_int_grid, all_2x2, at, connected, eq, inds, \
-in_bounds, is_perimeter, orth_dir, plus, shaded_vars
-import time
+in_bounds, is_perimeter, orth_dir, plus, run, shaded_vars, var
+from deduce import Contradiction, Rule
 
-g = parse_int_grid('''
+example = '''
 0..1312201.3223
 0..1..........2
 .1.322..2.1.323
@@ -19,43 +19,87 @@ g = parse_int_grid('''
 212..22..2..12.
 3..3...2....1.1
 ....2...02.3...
-''')
+'''
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+def parse(x):
+    return parse_int_grid(x)
 
-# We treat slitherlink as a shading puzzle; as with cave, the area outside the loop is considered shaded
+# The constraints that don't depend on the clues (see lib.Template).
+def template():
+    # We treat slitherlink as a shading puzzle; as with cave, the area outside the loop is considered shaded
 
-cons = []
+    cons = []
 
-shaded = shaded_vars('s')
+    shaded = shaded_vars('s')
 
-# root of the unshaded cells (which must be connected)
-root = Int('r1'), Int('r2')
+    # root of the unshaded cells (which must be connected)
+    root = var(Int, 'r1'), var(Int, 'r2')
 
-cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: eq(root, x)), 'uc')[0]
+    cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: eq(root, x)), 'uc')[0]
 
-# all shaded cells must be connected to the perimeter
-cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: is_perimeter(x)), 'c')[0]
+    # all shaded cells must be connected to the perimeter
+    cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: is_perimeter(x)), 'c')[0]
 
-# no 2x2 checkerboards
-cons += all_2x2(lambda a, b, c, d: Implies(And(at(shaded, a) == at(shaded, d), at(shaded, b) == at(shaded, c)),
-at(shaded, a) == at(shaded, b)))
+    # no 2x2 checkerboards
+    cons += all_2x2(lambda a, b, c, d: Implies(And(at(shaded, a) == at(shaded, d), at(shaded, b) == at(shaded, c)),
+    at(shaded, a) == at(shaded, b)))
 
-# for clues, number of different adjacent cells has to be clue number
-# important note: cells outside the grid can count as adjacent (so we can't use neighbors
-# because that doesn't include cells outside the grid)
-cons += [PbEq([(Not(eq((at(shaded, plus(i, j)) if in_bounds(plus(i, j)) else True),
-at(shaded, i))), 1) for j in orth_dir], at(g, i)) for i in inds() if at(g, i) != None]
+    return cons, shaded
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded))
+def clues(g, shaded):
+    # for clues, number of different adjacent cells has to be clue number
+    # important note: cells outside the grid can count as adjacent (so we can't use neighbors
+    # because that doesn't include cells outside the grid)
+    cons = [PbEq([(Not(eq((at(shaded, plus(i, j)) if in_bounds(plus(i, j)) else True),
+    at(shaded, i))), 1) for j in orth_dir], at(g, i)) for i in inds() if at(g, i) != None]
 
+    def show(m):
+        return '\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded)
+
+    return cons, shaded, show
+
+def build(g):
+    set_problem(g)
+    cons, shaded = template()
+    c, shaded, show = clues(g, shaded)
+    return cons + c, shaded, show
+
+# A deduction rule for a clue n at cell x (see deduce.py): n of its four neighbours (shaded ones,
+# outside the grid) differ from it. Once x is known, the neighbours that must differ or must match
+# are settled, as with every neighbour of a 0; and x is settled if only one value of it can be right.
+def clue_rule(x, n, height, width):
+    around = [plus(x, d) for d in orth_dir]
+    inside = [i for i in around if 0 <= i[0] < height and 0 <= i[1] < width]
+    outside = len(around) - len(inside)
+    def f(state, ns):
+        vs = [state.get(i) for i in ns[1:]]
+        unknown = vs.count(-1)
+        # The neighbours known to differ from x, if x has value v.
+        differing = lambda v: sum(1 for i in vs if i == 1 - v) + outside * (v == 0)
+        # For each value of x, whether the neighbours can still have n differing.
+        ok = [differing(v) <= n <= differing(v) + unknown for v in (0, 1)]
+        v = state.get(ns[0])
+        if v == -1:
+            if ok.count(True) == 1:
+                state.set(ns[0], ok.index(True))
+            elif not any(ok):
+                raise Contradiction(x)
+            return
+        if not ok[v]:
+            raise Contradiction(x)
+        differ = differing(v)
+        for (i, k) in zip(ns[1:], vs):
+            if k == -1 and differ == n:
+                state.set(i, v)
+            elif k == -1 and differ + unknown == n:
+                state.set(i, 1 - v)
+    return Rule([x] + inside, f)
+
+# Deduction rules: the clues (see clue_rule), which settle the cells around 0s to begin with.
+def rules(g):
+    height, width = len(g), len(g[0])
+    r = [clue_rule((i, j), g[i][j], height, width) for i in range(height) for j in range(width) if g[i][j] != None]
+    return [(i, j) for i in range(height) for j in range(width)], r
+
+if __name__ == '__main__':
+    run(build, parse(example))
@@ -0,0 +1,159 @@
+from types import SimpleNamespace
+import sys
+import z3
+import lib
+from z3 import parse_smt2_string
+from lib import construct_vars, construct_edge_vars, flatten
+
+# Building constraints through z3's Python API makes a Python object for every term, which is
+# most of the construction time on big grids. This is an alternative: constraints are written
+# as SMT-LIB2 text, and z3 parses the whole lot in one go (or it's written to a file, to solve elsewhere).
+# Terms are strings, and the functions below mirror the z3 ones (simplifying constants away).
+# Smt2 names variables just as the Problem would, so the z3 variables it makes (e.g. for reading
+# a model) are the same variables as those in the parsed constraints; the Problem's own helpers
+# (such as connected and path) are used as they are, rather than having second copies here.
+
+def const(x):
+    if type(x) == bool:
+        return 'true' if x else 'false'
+    elif type(x) == int:
+        return str(x) if x >= 0 else '(- %d)' % -x
+    return x
+
+def And(*a):
+    a = [const(i) for i in flatten(list(a))]
+    if 'false' in a:
+        return 'false'
+    a = [i for i in a if i != 'true']
+    return 'true' if not a else (a[0] if len(a) == 1 else '(and %s)' % ' '.join(a))
+
+def Or(*a):
+    a = [const(i) for i in flatten(list(a))]
+    if 'true' in a:
+        return 'true'
+    a = [i for i in a if i != 'false']
+    return 'false' if not a else (a[0] if len(a) == 1 else '(or %s)' % ' '.join(a))
+
+def Not(a):
+    a = const(a)
+    return {'true': 'false', 'false': 'true'}.get(a, '(not %s)' % a)
+
+def Implies(a, b):
+    return Or(Not(a), b)
+
+def If(c, a, b):
+    c = const(c)
+    return const(a) if c == 'true' else (const(b) if c == 'false' else '(ite %s %s %s)' % (c, const(a), const(b)))
+
+def Eq(a, b):
+    a, b = const(a), const(b)
+    if a == b:
+        return 'true'
+    if 'true' in (a, b) or 'false' in (a, b):
+        x = b if a in ('true', 'false') else a
+        return x if 'true' in (a, b) else Not(x)
+    return '(= %s %s)' % (a, b)
+
+def Lt(a, b):
+    return '(< %s %s)' % (const(a), const(b))
+
+def Le(a, b):
+    return '(<= %s %s)' % (const(a), const(b))
+
+def Sum(*a):
+    a = [const(i) for i in flatten(list(a))]
+    return '0' if not a else (a[0] if len(a) == 1 else '(+ %s)' % ' '.join(a))
+
+# These take their arguments as z3's do: PbEq a list of (term, weight) pairs.
+def PbEq(a, k):
+    if not a:
+        return const(k == 0)
+    return '((_ pbeq %d %s) %s)' % (k, ' '.join(str(w) for (_, w) in a), ' '.join(const(i) for (i, _) in a))
+
+def AtMost(*a):
+    a, k = [const(i) for i in flatten(list(a[:-1]))], a[-1]
+    return '((_ at-most %d) %s)' % (k, ' '.join(a)) if len(a) > k else 'true'
+
+def ExactlyOne(*a):
+    return PbEq([(i, 1) for i in flatten(list(a))], 1)
+
+# Like lib.eq (on dicts, lists and tuples of terms as well as single ones).
+def eq(a, b):
+    if type(a) == dict:
+        return And(*[eq(a[i], b[i]) for i in a])
+    elif type(a) in (list, tuple):
+        assert len(a) == len(b)
+        return And(*[eq(i, j) for (i, j) in zip(a, b)])
+    return Eq(a, b)
+
+# The z3 versions of the term functions above, for code that can build either kind of term.
+z3_terms = SimpleNamespace(And=z3.And, Or=z3.Or, Not=z3.Not, Implies=z3.Implies, If=z3.If,
+PbEq=z3.PbEq, AtMost=z3.AtMost, ExactlyOne=lib.ExactlyOne, eq=lib.eq)
+
+# The term functions for a problem's backend: this module's for 'text', z3's otherwise.
+def terms(problem):
+    return sys.modules[__name__] if problem.backend == 'text' else z3_terms
+
+# A buffer of SMT-LIB2 declarations and assertions for a Problem. Variables are named by the Problem's
+# own construct_vars and construct_edge_vars (so with its prefix, and as its given values where it has any),
+# and the helpers connected and path are the Problem's, whose z3 constraints are kept alongside the text.
+class Smt2:
+    def __init__(self, problem):
+        self.problem = problem
+        self.parts = []
+        self.declared = set()
+        self.z3 = []
+
+    # Declare a variable (sort 'Bool' or 'Int') by its full name, and get the term for it.
+    def declare(self, sort, name):
+        if name not in self.declared:
+            self.declared.add(name)
+            self.parts.append('(declare-const |%s| %s)' % (name, sort))
+        return '|%s|' % name
+
+    # A single variable, with the problem's prefix.
+    def var(self, sort, name):
+        return self.declare(sort, self.problem.prefix + name)
+
+    def givens(self):
+        return {k: v.sexpr() for (k, v) in self.problem.givens.items()}
+
+    def construct_vars(self, sort, prefix, shape):
+        return construct_vars(lambda name: self.declare(sort, name), self.problem.prefix + prefix, shape, givens=self.givens())
+
+    def construct_edge_vars(self, sort, prefix, edges):
+        return construct_edge_vars(lambda name: self.declare(sort, name), self.problem.prefix + prefix, edges, givens=self.givens())
+
+    def add(self, *cons):
+        self.parts.extend('(assert %s)' % i for i in flatten(list(cons)) if i != 'true')
+
+    def text(self):
+        return '\n'.join(self.parts)
+
+    # The constraints as z3 ones, to add to a solver: those of the text, parsed in one go, then those
+    # of the helpers. They go through the problem's emit (so to its sink, if it has one).
+    def constraints(self):
+        return self.problem.emit(parse_smt2_string(self.text(), ctx=self.problem.ctx)) + self.z3
+
+    # Write a complete SMT-LIB2 script, for solving with some other tool. (With a sink, the helpers'
+    # constraints are already in it, so aren't written.)
+    def write(self, path):
+        s = z3.Solver(ctx=self.problem.ctx)
+        s.add(parse_smt2_string(self.text(), ctx=self.problem.ctx), *self.z3)
+        with open(path, 'w') as f:
+            f.write(s.sexpr() + '(check-sat)\n(get-model)\n')
+
+    # Problem.connected; returns the distances (z3 terms).
+    def connected(self, rv, included, base, cs, **kwargs):
+        cons, dist = self.problem.connected(rv, included, base, cs, **kwargs)
+        self.z3 += cons
+        return dist
+
+    def some_edge(self, e, x, diag=False):
+        return Or(*[e[(x, y)] for y in self.problem.topology(diag).neighbors(x)])
+
+    # Problem.path; returns what it does other than the constraints (z3 terms).
+    def path(self, circ, cs, **kwargs):
+        r = self.problem.path(circ, cs, **kwargs)
+        self.z3 += r[0]
+        return r[1:]
@@ -1,8 +1,10 @@
-from z3 import And, Not, PbEq, Solver, is_true
-from lib import set_problem, parse_regions, all_neighbors, at, columns, rows, shaded_vars
-import time
+from z3 import And, Not, PbEq, is_true
+from lib import set_problem, parse_regions, relabel, all_neighbors, at, columns, get_rtable, rows, run, shaded_vars
+from itertools import combinations
+from deduce import Confined, Contradiction, Count, Rule
+from dlx import ExactCover
 
-regions, g = parse_regions('''
+example = '''
 AAAAABBBB
 AAAAACBBB
 AAACCCCBB
@@ -12,37 +14,104 @@ DFFFFGEEE
 HHFFFGGEI
 HHFGGGGII
 HHHGGGIII
-''')
+'''
 
-star_count = 2
+def parse(x, star_count=2):
+    regions, g = parse_regions(x)
+    return regions, g, star_count
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+# The region letters don't matter (see cache.puzzle_key).
+def canonical(puzzle):
+    regions, g, star_count = puzzle
+    return regions, relabel(g), star_count
 
-cons = []
+def build(puzzle):
+    regions, g, star_count = puzzle
 
-# Set up stars (use shaded_vars even though stars aren't usually shaded because it works the same way)
-stars = shaded_vars('s')
+    set_problem(g)
 
-# Every row has the required number of stars
-cons += [PbEq([(at(stars, j), 1) for j in i], star_count) for i in rows()]
+    cons = []
 
-# Every column has the required number of stars
-cons += [PbEq([(at(stars, j), 1) for j in i], star_count) for i in columns()]
+    # Set up stars (use shaded_vars even though stars aren't usually shaded because it works the same way)
+    stars = shaded_vars('s')
 
-# Every region has the required number of stars
-cons += [PbEq([(at(stars, j), 1) for j in i], star_count) for i in regions]
+    # Every row has the required number of stars
+    cons += [PbEq([(at(stars, j), 1) for j in i], star_count) for i in rows()]
 
-# No pair of neighbors can both have stars
-cons += all_neighbors((lambda x, y: Not(And(at(stars, x), at(stars, y)))), diag=True)
+    # Every column has the required number of stars
+    cons += [PbEq([(at(stars, j), 1) for j in i], star_count) for i in columns()]
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join('.*'[is_true(m[j])] for j in i) for i in stars))
+    # Every region has the required number of stars
+    cons += [PbEq([(at(stars, j), 1) for j in i], star_count) for i in regions]
+
+    # No pair of neighbors can both have stars
+    cons += all_neighbors((lambda x, y: Not(And(at(stars, x), at(stars, y)))), diag=True)
+
+    def show(m):
+        return '\n'.join(''.join('.*'[is_true(m[j])] for j in i) for i in stars)
+
+    return cons, stars, show
+
+# A deduction rule for one region: of the ways to put star_count stars, none touching, in the cells
+# of the region that can still have one (and including those known to have one), cells in none of them
+# can't have a star, cells in all of them have one, and cells touching a star in all of them
+# (in the region or outside it) can't have one. This is what settles regions too small
+# (or too squeezed by what's already known) for more than a few placements.
+def placements(region, star_count, height, width):
+    around = sorted({(i[0] + a, i[1] + b) for i in region for a in (-1, 0, 1) for b in (-1, 0, 1)
+    if 0 <= i[0] + a < height and 0 <= i[1] + b < width} - set(region))
+    cells = region + around
+    touching = lambda x, y: max(abs(x[0] - y[0]), abs(x[1] - y[1])) == 1
+    def f(state, ns):
+        possible = [i for i in range(len(region)) if state.get(ns[i]) != 0]
+        known = {i for i in possible if state.get(ns[i]) == 1}
+        options = [set(p) for p in combinations(possible, star_count) if known <= set(p)
+        and not any(touching(region[a], region[b]) for (a, b) in combinations(p, 2))]
+        if not options:
+            raise Contradiction(region)
+        every = set.intersection(*options)
+        some = set.union(*options)
+        touched = set.intersection(*[{j for j in range(len(cells)) if any(touching(cells[j], region[i]) for i in p)} for p in options])
+        for i in possible:
+            if i not in some:
+                state.set(ns[i], 0)
+            elif i in every:
+                state.set(ns[i], 1)
+        for j in touched:
+            state.set(ns[j], 0)
+    return Rule(cells, f)
+
+# Deduction rules (see deduce.py): the star counts of rows, columns and regions, at most one star
+# in each 2x2 block (which keeps stars from touching), the placements in each region (see above),
+# and, for each region and each row or column it meets, that if the region's stars can only be
+# in that row or column, the row or column has no others (and the same the other way round).
+def rules(puzzle):
+    regions, g, star_count = puzzle
+    height, width = len(g), len(g[0])
+    lines = [[(i, j) for j in range(width)] for i in range(height)] + [[(i, j) for i in range(height)] for j in range(width)]
+    r = [Count(i, star_count) for i in lines + regions]
+    r += [Count([(i + a, j + b) for a in range(2) for b in range(2)], 0, 1) for i in range(height - 1) for j in range(width - 1)]
+    r += [placements(i, star_count, height, width) for i in regions]
+    r += [Confined(i, j) for i in regions for j in lines if set(i) & set(j)]
+    r += [Confined(j, i) for i in regions for j in lines if set(i) & set(j)]
+    return [(i, j) for i in range(height) for j in range(width)], r
+
+# As an exact cover problem (see dlx.py): a star in a cell covers its row, column and region,
+# which each need star_count, and each 2x2 block it's in, which can have at most one.
+def cover(puzzle):
+    regions, g, star_count = puzzle
+    height, width = len(g), len(g[0])
+    rtable = get_rtable(regions)
+    blocks = [(i, j) for i in range(height - 1) for j in range(width - 1)]
+    ec = ExactCover({k: star_count for k in [('r', i) for i in range(height)] + [('c', j) for j in range(width)]
+    + [('g', k) for k in range(len(regions))]}, [('b',) + i for i in blocks])
+    for i in range(height):
+        for j in range(width):
+            ec.add((i, j), [('r', i), ('c', j), ('g', rtable[(i, j)])] + [('b', i - a, j - b) for a in range(2) for b in range(2)
+            if 0 <= i - a < height - 1 and 0 <= j - b < width - 1])
+    values = lambda stars: {(i, j): (i, j) in stars for i in range(height) for j in range(width)}
+    show = lambda v: '\n'.join(''.join('.*'[v[(i, j)]] for j in range(width)) for i in range(height))
+    return ec, values, False, show
+
+if __name__ == '__main__':
+    run(build, parse(example))
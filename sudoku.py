@@ -1,8 +1,8 @@
-from z3 import Int, And, Distinct, Solver, is_true
-from lib import set_problem, parse_int_grid, at, construct_vars, inds, only, write_int
-import time
+from z3 import Bool, Int, And, Distinct, is_true
+from lib import set_problem, parse_int_grid, parse_regions, ExactlyOne, at, construct_vars, give, inds, run, write_int
+from dlx import ExactCover
 
-g = parse_int_grid('''
+example = '''
 .23.164..
 ...8....9
 6.......2
@@ -12,43 +12,111 @@ g = parse_int_grid('''
 2.......7
 9....1...
 ..657.24.
-''')
+'''
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+# Sudokus of any size n by n (with digits 1 to 9 and then A, B, ... as in parse_int).
+# The regions are boxes (3x3 for 9x9, 4x4 for 16x16, 2 rows by 3 columns for 6x6, ...), unless
+# the grid is followed by a blank line and a grid of letters marking out irregular regions (as in parse_regions).
+def parse(x):
+    parts = x.strip().split('\n\n')
+    g = parse_int_grid(parts[0])
+    return g, (parse_regions(parts[1], grid=False) if len(parts) > 1 else boxes(len(g)))
 
-cons = []
+# The boxes of an n by n sudoku: as near square as they can be, and no taller than they are wide.
+def boxes(n):
+    h = max(i for i in range(1, int(n ** 0.5) + 1) if n % i == 0)
+    w = n // h
+    return [[(h * i1 + j1, w * i2 + j2) for j1 in range(h) for j2 in range(w)] for i1 in range(w) for i2 in range(h)]
 
-# Construct the 9 3x3 regions
-regions = [[(3 * i1 + j1, 3 * i2 + j2) for j1 in range(3) for j2 in range(3)] for i1 in range(3) for i2 in range(3)]
+# The digits are a one-hot cube of Bools (cell by digit, with digit d as index d - 1), and each row,
+# column and region has each digit exactly once; z3 handles these as pseudo-Boolean constraints, which is
+# much quicker than Distinct on Ints once grids get big. The clues' digits, and digits ruled out
+# in the cells that see a clue, are known, so those variables are constants (see lib.Problem.give).
+def build(puzzle):
+    g, regions = puzzle
+    n = len(g)
+    set_problem(g)
 
-# height, width, the number of regions, and the size of each region should all be the same
-assert height == width == len(regions) == only(list({len(i) for i in regions}))
+    # height, width, the number of regions, and the size of each region should all be the same
+    assert n == len(g[0]) == len(regions) and all(len(i) == n for i in regions)
 
-vals = construct_vars(Int, 'n', (height, width))
+    rtable = {j: ind for (ind, i) in enumerate(regions) for j in i}
+    clues = [i for i in inds() if at(g, i) != None]
+    known = {i + (at(g, i) - 1,): True for i in clues}
+    known.update({i + (d,): False for i in clues for d in range(n) if d != at(g, i) - 1})
+    known.update({j + (at(g, i) - 1,): False for i in clues for j in inds()
+    if j != i and (j[0] == i[0] or j[1] == i[1] or rtable[j] == rtable[i])})
+    give('d', known)
 
-# Values must be between 1 and 9
-cons += [And(1 <= j, j <= height) for i in vals for j in i]
+    digits = construct_vars(Bool, 'd', (n, n, n))
 
-# Different values in rows
-cons += [Distinct(*i) for i in vals]
+    cons = []
 
-# Different values in columns
-cons += [Distinct(*i) for i in zip(*vals)]
+    # Every cell has exactly one digit
+    cons += [ExactlyOne(j) for i in digits for j in i]
 
-# Different values in regions
-cons += [Distinct(*(at(vals, j) for j in i)) for i in regions]
+    # Every digit is once in each row
+    cons += [ExactlyOne([digits[i][j][d] for j in range(n)]) for i in range(n) for d in range(n)]
 
-# Clues are satisfied
-cons += [at(vals, i) == at(g, i) for i in inds() if at(g, i) != None]
+    # Every digit is once in each column
+    cons += [ExactlyOne([digits[i][j][d] for i in range(n)]) for j in range(n) for d in range(n)]
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join(write_int(m[j].as_long()) for j in i) for i in vals))
+    # Every digit is once in each region
+    cons += [ExactlyOne([digits[i][j][d] for (i, j) in r]) for r in regions for d in range(n)]
+
+    def show(m):
+        return '\n'.join(''.join(write_int(1 + [is_true(m[k]) for k in j].index(True)) for j in i) for i in digits)
+
+    return cons, digits, show
+
+# The old encoding (a grid of Ints, each row, column and region Distinct), kept to compare with
+# (see sudoku_bench.py).
+def build_distinct(puzzle):
+    g, regions = puzzle
+    n = len(g)
+    set_problem(g)
+
+    cons = []
+
+    # The clues' values are known, so they're constants rather than variables.
+    give('n', {i: at(g, i) for i in inds() if at(g, i) != None})
+
+    vals = construct_vars(Int, 'n', (n, n))
+
+    # Values must be between 1 and n
+    cons += [And(1 <= j, j <= n) for i in vals for j in i]
+
+    # Different values in rows
+    cons += [Distinct(*i) for i in vals]
+
+    # Different values in columns
+    cons += [Distinct(*i) for i in zip(*vals)]
+
+    # Different values in regions
+    cons += [Distinct(*(at(vals, j) for j in i)) for i in regions]
+
+    def show(m):
+        return '\n'.join(''.join(write_int(m[j].as_long()) for j in i) for i in vals)
+
+    return cons, vals, show
+
+# As an exact cover problem (see dlx.py): a digit in a cell (only the clue's digit, in a clue's cell)
+# covers the cell, and the digit in its row, its column and its region, which are each covered once.
+def cover(puzzle):
+    g, regions = puzzle
+    n = len(g)
+    rtable = {j: ind for (ind, i) in enumerate(regions) for j in i}
+    ec = ExactCover([('c', i, j) for i in range(n) for j in range(n)] + [(k, i, d) for k in 'rkb' for i in range(n) for d in range(n)])
+    for i in range(n):
+        for j in range(n):
+            for d in ([g[i][j] - 1] if g[i][j] != None else range(n)):
+                ec.add((i, j, d), [('c', i, j), ('r', i, d), ('k', j, d), ('b', rtable[(i, j)], d)])
+    def values(chosen):
+        chosen = set(chosen)
+        return {(i, j, d): (i, j, d) in chosen for i in range(n) for j in range(n) for d in range(n)}
+    def show(v):
+        return '\n'.join(''.join(write_int(1 + [v[(i, j, d)] for d in range(n)].index(True)) for j in range(n)) for i in range(n))
+    return ec, values, False, show
+
+if __name__ == '__main__':
+    run(build, parse(example))
@@ -0,0 +1,91 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+
+# Benchmark sudoku's encodings on big grids: the one-hot Bools that sudoku.build uses,
+# the Ints with Distinct that it used to (sudoku.build_distinct), and exact cover (dlx.solve).
+# Puzzles are made up from a seed: a solved grid, shuffled, with a fraction (--clues) of its cells
+# kept as clues, so they aren't necessarily unique, and only one solution is looked for.
+# Each run is a fresh process, given up on after --timeout seconds; every solution found is checked.
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+methods = ['distinct', 'onehot', 'cover']
+
+# A puzzle with box by box boxes (so box ** 2 rows), as text for sudoku.parse.
+def generate(box, seed, clues):
+    sys.path.insert(0, here)
+    from lib import write_int
+    rnd = random.Random(seed)
+    n = box * box
+    shuffled = lambda x: rnd.sample(list(x), len(x))
+    rows = [b * box + i for b in shuffled(range(box)) for i in shuffled(range(box))]
+    cols = [b * box + i for b in shuffled(range(box)) for i in shuffled(range(box))]
+    digits = shuffled(range(1, n + 1))
+    full = [[digits[(box * (r % box) + r // box + c) % n] for c in cols] for r in rows]
+    kept = set(rnd.sample([(i, j) for i in range(n) for j in range(n)], int(clues * n * n)))
+    return '\n'.join(''.join(write_int(full[i][j]) if (i, j) in kept else '.' for j in range(n)) for i in range(n))
+
+# Is the solution (text, as show gives it) a solution of the puzzle?
+def valid(puzzle, solution):
+    from lib import write_int
+    g, regions = puzzle
+    s = [list(i) for i in solution.split('\n')]
+    n = len(g)
+    groups = [[(i, j) for j in range(n)] for i in range(n)] + [[(i, j) for i in range(n)] for j in range(n)] + regions
+    return all(len({s[i][j] for (i, j) in k}) == n for k in groups) and \
+    all(g[i][j] is None or s[i][j] == write_int(g[i][j]) for i in range(n) for j in range(n))
+
+# One run, in its own process.
+def run(method, text):
+    sys.path.insert(0, here)
+    import dlx
+    import lib
+    import sudoku
+    puzzle = sudoku.parse(text)
+    if method == 'cover':
+        r = dlx.solve(sudoku, puzzle)
+    else:
+        r = lib.solve(sudoku.build if method == 'onehot' else sudoku.build_distinct, puzzle)
+    r['valid'] = r['solution'] is not None and valid(puzzle, r['solution'])
+    return r
+
+def run_isolated(args, timeout):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        try:
+            return pool.apply_async(run, args).get(timeout)
+        except multiprocessing.TimeoutError:
+            return {'result': 'timeout'}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--boxes', type=int, nargs='+', default=[3, 4, 5], help='box sizes (3 for 9x9, 4 for 16x16, ...)')
+    parser.add_argument('--seeds', type=int, default=3, help='puzzles of each size')
+    parser.add_argument('--clues', type=float, default=0.4, help='fraction of cells given')
+    parser.add_argument('--methods', nargs='+', default=methods, choices=methods)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+    results = []
+    print('%-6s %-10s %8s %12s %10s' % ('size', 'method', 'solved', 'constructed', 'solving'))
+    for box in args.boxes:
+        texts = [generate(box, seed, args.clues) for seed in range(args.seeds)]
+        for method in args.methods:
+            runs = [run_isolated((method, t), args.timeout) for t in texts]
+            for (seed, r) in enumerate(runs):
+                results.append(dict(box=box, seed=seed, method=method, **{k: v for (k, v) in r.items() if k != 'solution'}))
+            done = [r for r in runs if r['result'] != 'timeout']
+            assert all(r['valid'] for r in done), 'a wrong solution from %s' % method
+            median = lambda k: statistics.median(r[k] for r in done) if done else float('nan')
+            print('%-6s %-10s %5d/%-2d %12.3f %10.3f' % ('%dx%d' % (box * box, box * box), method, len(done), len(runs),
+            median('constructed'), median('solved')))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,8 @@
-from z3 import Int, If, Not, Or, Solver, is_true
+from z3 import Int, If, Not, Or, is_true
 from lib import set_problem, parse_int_grid, at, connected, construct_vars, \
-eq, flatten, inds, look, neighbors, shaded_vars
-import time
+eq, flatten, inds, look, neighbors, run, shaded_vars
 
-g = parse_int_grid('''
+example = '''
 1..2......
 .....3....
 ..5.......
@@ -14,7 +13,10 @@ g = parse_int_grid('''
 ....9...??
 .?........
 .?...?....
-''', exc='?')
+'''
+
+def parse(x):
+    return parse_int_grid(x, exc='?')
 
 # This function takes a list of values and returns a dictionary mapping
 # number of neighbors of a tasquare clue and the total area of squares
@@ -42,51 +44,49 @@ def get_table(x):
         t[k].append(i)
     return t
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+def build(g):
+    height = len(g)
+    width = len(g[0])
+    set_problem(g)
+
+    # Construct a table of options for satisfying clues.
+    table = get_table(g)
 
-# Construct a table of options for satisfying clues.
-table = get_table(g)
+    cons = []
 
-cons = []
+    shaded = shaded_vars('s')
 
-shaded = shaded_vars('s')
+    size = construct_vars(Int, 'z', (height, width))
 
-size = construct_vars(Int, 'z', (height, width))
+    clues = [i for i in inds() if at(g, i) != None]
 
-clues = [i for i in inds() if at(g, i) != None]
+    # Make sure all the unshaded cells are connected (to the first clue)
+    cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: eq(clues[0], x)), 'c')[0]
 
-# Make sure all the unshaded cells are connected (to the first clue)
-cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: eq(clues[0], x)), 'c')[0]
+    # Count shaded cells in each direction (counting the cell itself, if it's shaded)
+    c, vis = look((lambda pos, d, edge, n, v: If(at(shaded, pos), If(edge, 0, v) + 1, 0)), Int, 'v')
+    cons += c
 
-# Count shaded cells in each direction (counting the cell itself, if it's shaded)
-c, vis = look((lambda pos, d, edge, n, v: If(at(shaded, pos), If(edge, 0, v) + 1, 0)), Int, 'v')
-cons += c
+    # Make sure the horizontal number and vertical number is the same (this ensures square regions)
+    cons += [at(vis[0], i) + at(vis[2], i) == at(vis[1], i) + at(vis[3], i) for i in inds()]
 
-# Make sure the horizontal number and vertical number is the same (this ensures square regions)
-cons += [at(vis[0], i) + at(vis[2], i) == at(vis[1], i) + at(vis[3], i) for i in inds()]
+    # Set variables for the height (or equivalently width) of each shaded region
+    # (we need the -1 since we double-count the cell itself).
+    cons += [at(size, i) == If(at(shaded, i), at(vis[0], i) + at(vis[2], i) - 1, 0) for i in inds()]
 
-# Set variables for the height (or equivalently width) of each shaded region
-# (we need the -1 since we double-count the cell itself).
-cons += [at(size, i) == If(at(shaded, i), at(vis[0], i) + at(vis[2], i) - 1, 0) for i in inds()]
+    # Make sure clues aren't shaded.
+    cons += [Not(at(shaded, i)) for i in clues]
 
-# Make sure clues aren't shaded.
-cons += [Not(at(shaded, i)) for i in clues]
+    # Make sure the sizes are in the above-constrcted table.
+    cons += [Or(*[eq([at(size, k) for k in neighbors(i)], j) for j in table[(len(neighbors(i)), at(g, i))]]) for i in clues if at(g, i) != -1]
 
-# Make sure the sizes are in the above-constrcted table.
-cons += [Or(*[eq([at(size, k) for k in neighbors(i)], j) for j in table[(len(neighbors(i)), at(g, i))]]) for i in clues if at(g, i) != -1]
+    # Make sure all the clues have some shaded neighbor.
+    cons += [Or(*[at(shaded, j) for j in neighbors(i)]) for i in clues if at(g, i) == -1]
 
-# Make sure all the clues have some shaded neighbor.
-cons += [Or(*[at(shaded, j) for j in neighbors(i)]) for i in clues if at(g, i) == -1]
+    def show(m):
+        return '\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded)
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded))
+    return cons, shaded, show
 
+if __name__ == '__main__':
+    run(build, parse(example))
@@ -1,13 +1,12 @@
-from z3 import Int, If, Not, Or, Solver, is_true
+from z3 import Not, Or, is_true
 from lib import set_problem, deep_map, parse_int, to_dir, to_grid, \
-all_neighbors, at, inds, look, path, read_model, shaded_vars, show_full_path, some_edge
-import time
+all_neighbors, at, give, inds, neighbors, path, ray_count, read_model, run, shaded_vars, show_full_path, some_edge
 
 def parse(g):
     return deep_map(lambda x: 1 if x == '##' else ((parse_int(x[0]), to_dir(x[1], num=True))
     if x != '..' else None), to_grid(g, section_size=2), depth=2)
 
-g = parse('''
+example = '''
 ................................................................................
 ................................5>##............................................
 ..........................4<##0^##5>##4v........................................
@@ -48,46 +47,44 @@ g = parse('''
 ......................##########4<9^2>##............9^............##....A^####..
 ......................................##........##..2>..........####..##........
 ......................................##......####..............##........######
-''')
+'''
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+def build(g):
+    set_problem(g)
 
-cons = []
+    cons = []
 
-# Create a loop
-c, link, _ = path(True, 'l')
-cons += c
+    # The loop doesn't go through clues, and they aren't shaded, so those variables are known.
+    clues = [i for i in inds() if at(g, i) != None]
+    give('l', {e: False for i in clues for j in neighbors(i) for e in ((i, j), (j, i))})
+    give('s', {i: False for i in clues})
 
-# Create a shading
-shaded = shaded_vars('s')
+    # Create a loop
+    c, link, _ = path(True, 'l')
+    cons += c
 
-# Force the loop not to go through clues
-cons += [Not(some_edge(link, i)) for i in inds() if at(g, i) != None]
+    # Create a shading
+    shaded = shaded_vars('s')
 
-# Clues cannot be shaded
-cons += [Not(at(shaded, i)) for i in inds() if at(g, i) != None]
+    # Force the loop not to go through clues
+    cons += [Not(some_edge(link, i)) for i in inds() if at(g, i) != None]
 
-# Non-clues either have the loop going through them or are shaded, but never both
-cons += [some_edge(link, i) != at(shaded, i) for i in inds() if at(g, i) == None]
+    # Clues cannot be shaded
+    cons += [Not(at(shaded, i)) for i in inds() if at(g, i) != None]
 
-# No two neighbors can be shaded
-cons += all_neighbors(lambda x, y: Or(Not(at(shaded, x)), Not(at(shaded, y))))
+    # Non-clues either have the loop going through them or are shaded, but never both
+    cons += [some_edge(link, i) != at(shaded, i) for i in inds() if at(g, i) == None]
 
-# Count shaded cells in a direction
-c, vis = look((lambda pos, d, edge, n, v: 0 if edge else v + If(at(shaded, n), 1, 0)), Int, 'v')
-cons += c
+    # No two neighbors can be shaded
+    cons += all_neighbors(lambda x, y: Or(Not(at(shaded, x)), Not(at(shaded, y))))
 
-# Check that the shaded cell counts match the clues
-cons += [at(vis[at(g, i)[1]], i) == at(g, i)[0] for i in inds() if at(g, i) != None and at(g, i) != 1]
+    # Check that the shaded cell counts in the clues' directions match the clues
+    cons += [ray_count(i, [at(g, i)[1]], at(g, i)[0], lambda j: at(shaded, j)) for i in inds() if at(g, i) != None and at(g, i) != 1]
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print(show_full_path(deep_map(is_true, read_model(m, link)), blank='#'))
+    def show(m):
+        return show_full_path(deep_map(is_true, read_model(m, link)), blank='#')
+
+    return cons, link, show
+
+if __name__ == '__main__':
+    run(build, parse(example))
@@ -1,11 +1,10 @@
-from z3 import Int, And, Not, Or, Solver, is_true
-from lib import set_problem, deep_map, to_grid, all_2x2, at, connected, eq, inds, shaded_vars
-import time
+from z3 import Int, And, Not, Or, is_true
+from lib import set_problem, deep_map, to_grid, all_2x2, at, connected, eq, inds, run, shaded_vars, var
 
 def parse(g):
     return deep_map(lambda x: x if x != '.' else None, to_grid(g), depth=2)
 
-g = parse('''
+example = '''
 .........
 .B.W.W.W.
 ..W.B.W..
@@ -15,39 +14,51 @@ g = parse('''
 ..W.B.W..
 .B.W.B.W.
 .........
-''')
+'''
 
-height = len(g)
-width = len(g[0])
-set_problem(g)
-tm = time.time()
+# The constraints that don't depend on the clues (see lib.Template).
+def template():
+    cons = []
 
-cons = []
+    shaded = shaded_vars('s')
 
-shaded = shaded_vars('s')
+    # Ensure both white and black cells are connected to some root
+    wroot = var(Int, 'w1'), var(Int, 'w2')
+    broot = var(Int, 'b1'), var(Int, 'b2')
 
-# Ensure both white and black cells are connected to some root; make this root a clue if possible
-def first_index(x, otherwise):
+    cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: eq(wroot, x)), 'w')[0]
+    cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: eq(broot, x)), 'b')[0]
+
+    # No 2x2 is all one color
+    cons += all_2x2(lambda *a: And(Or(*[at(shaded, i) for i in a]), Or(*[Not(at(shaded, i)) for i in a])))
+
+    return cons, (shaded, wroot, broot)
+
+# The first clue of a color, if there is one
+def first_index(g, x):
     opts = [i for i in inds() if at(g, i) == x]
-    return opts[0] if opts else otherwise
+    return opts[0] if opts else None
+
+def clues(g, v):
+    shaded, wroot, broot = v
+
+    # Make the roots clues if possible
+    cons = [eq(root, first) for (root, first) in
+    ((wroot, first_index(g, 'W')), (broot, first_index(g, 'B'))) if first is not None]
 
-wroot = first_index('W', (Int('w1'), Int('w2')))
-broot = first_index('B', (Int('b1'), Int('b2')))
+    # Black-circle clues are shaded, and white-circle clues aren't
+    cons += [at(shaded, i) == (at(g, i) == 'B') for i in inds() if at(g, i) != None]
 
-cons += connected(shaded, (lambda x: Not(at(shaded, x))), (lambda x: eq(wroot, x)), 'w')[0]
-cons += connected(shaded, (lambda x: at(shaded, x)), (lambda x: eq(broot, x)), 'b')[0]
+    def show(m):
+        return '\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded)
 
-# Black-circle clues are shaded, and white-circle clues aren't
-cons += [at(shaded, i) == (at(g, i) == 'B') for i in inds() if at(g, i) != None]
+    return cons, shaded, show
 
-# No 2x2 is all one color
-cons += all_2x2(lambda *a: And(Or(*[at(shaded, i) for i in a]), Or(*[Not(at(shaded, i)) for i in a])))
+def build(g):
+    set_problem(g)
+    cons, v = template()
+    c, shaded, show = clues(g, v)
+    return cons + c, shaded, show
 
-t0 = time.time()
-print('constructed', t0 - tm)
-s = Solver()
-s.add(*cons)
-print(s.check())
-print('done', time.time() - t0)
-m = s.model()
-print('\n'.join(''.join('.#'[is_true(m[j])] for j in i) for i in shaded))
+if __name__ == '__main__':
+    run(build, parse(example))